@@ -0,0 +1,50 @@
+# compare.py
+#
+# Side by side view of two result files written with --json by load.py or
+# micro.py, e.g. before and after a change.
+#
+#   python -m benchmarks.compare before.json after.json
+import argparse
+import json
+
+# Metric compared for each benchmark, lower is better for all of them.
+METRICS = {'load': ['p50_ms', 'p95_ms', 'p99_ms'], 'micro': ['us_per_call']}
+
+
+def _by_name(results):
+    return {result.get('endpoint') or result['name']: result for result in results}
+
+
+def compare(before, after):
+    if before['benchmark'] != after['benchmark']:
+        raise SystemExit('Can not compare {} results with {} results'.format(before['benchmark'],
+                                                                            after['benchmark']))
+
+    metrics = METRICS[before['benchmark']]
+    old = _by_name(before['results'])
+    new = _by_name(after['results'])
+
+    print('{:<32}'.format('') + ''.join('{:>28}'.format(metric) for metric in metrics))
+    for name in [name for name in new if name in old]:
+        cells = []
+        for metric in metrics:
+            if not old[name][metric] or new[name][metric] is None:
+                cells.append('{:>28}'.format('-'))
+                continue
+            change = (new[name][metric] - old[name][metric]) / old[name][metric] * 100
+            cells.append('{:>12.2f} -> {:>8.2f} {:>+5.0f}%'.format(old[name][metric], new[name][metric], change))
+        print('{:<32}'.format(name) + ''.join(cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare two benchmark result files')
+    parser.add_argument('before')
+    parser.add_argument('after')
+    args = parser.parse_args()
+
+    with open(args.before) as before, open(args.after) as after:
+        compare(json.load(before), json.load(after))
+
+
+if __name__ == '__main__':
+    main()
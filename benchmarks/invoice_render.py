@@ -0,0 +1,75 @@
+# invoice_render.py
+#
+# Render time and peak RSS of the invoice PDF, comparing the single-table
+# renderer (generate_invoice) with the chunked, streamed one
+# (generate_large_invoice). Every measurement runs in a fresh interpreter
+# so ru_maxrss is the peak of that render alone.
+#
+#   python -m benchmarks.invoice_render --rows 100 1000 10000 --json invoice.json
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+from tempfile import SpooledTemporaryFile
+
+from lib.invoice import generate_invoice, generate_large_invoice
+from lib.invoice_jobs import InvoiceRow
+
+MODES = ['table', 'large']
+
+
+def fake_rows(count):
+    for index in range(1, count + 1):
+        yield InvoiceRow(index, 'BRAND {}'.format(index % 40), 'MODEL {}'.format(index % 300),
+                         'Does not turn on after a firmware update, customer reports noise', 'SN{:010d}'.format(index))
+
+
+def measure(mode, rows):
+    start = time.perf_counter()
+    if mode == 'table':
+        size = len(generate_invoice(list(fake_rows(rows)), 'benchmark').getvalue())
+    else:
+        pdf_file = generate_large_invoice(fake_rows(rows), 'benchmark', SpooledTemporaryFile(max_size=4 * 1024 * 1024))
+        size = len(pdf_file.read())
+    elapsed = time.perf_counter() - start
+
+    # ru_maxrss is in kilobytes on Linux.
+    return {'mode': mode, 'rows': rows, 'seconds': round(elapsed, 3), 'pdf_bytes': size,
+            'peak_rss_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0, 1)}
+
+
+def run(rows_list, modes):
+    results = []
+    for rows in rows_list:
+        for mode in modes:
+            output = subprocess.check_output([sys.executable, '-m', 'benchmarks.invoice_render', '--single', mode,
+                                              str(rows)])
+            result = json.loads(output.decode('utf-8'))
+            print('{mode:>6} {rows:>7} rows  {seconds:>8.3f}s  {peak_rss_mb:>7.1f} MB peak RSS'.format(**result))
+            results.append(result)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Invoice rendering benchmark')
+    parser.add_argument('--rows', type=int, nargs='+', default=[100, 1000, 10000])
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=MODES)
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--single', nargs=2, metavar=('MODE', 'ROWS'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        print(json.dumps(measure(args.single[0], int(args.single[1]))))
+        return
+
+    results = run(args.rows, args.modes)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'benchmark': 'invoice_render', 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+# micro.py
+#
+# Micro-benchmarks of the per-request auth check (token_required, with the
+# user cache warm and cold) and of the invoice renderer (generate_invoice)
+# at a few sizes. Each case reports the best of --repeat runs of timeit.
+#
+#   python -m benchmarks.micro --json micro.json
+import argparse
+import json
+import os
+import tempfile
+import timeit
+
+from benchmarks.invoice_render import fake_rows
+from benchmarks.seed import load_app, make_token, seed
+
+
+def bench(name, statement, number, repeat):
+    best = min(timeit.repeat(statement, number=number, repeat=repeat)) / number
+    result = {'name': name, 'us_per_call': round(best * 1e6, 2), 'calls_per_second': round(1 / best, 1)}
+    print('{name:<32} {us_per_call:>12.2f} us/call  {calls_per_second:>10.1f} calls/s'.format(**result))
+    return result
+
+
+def token_required_cases(app, token, public_id, number, repeat):
+    import main
+    from lib.user_cache import invalidate_user
+
+    handler = main.token_required(lambda current_user: current_user)
+    headers = {'x-access-token': token}
+
+    def warm():
+        with app.test_request_context(headers=headers):
+            handler()
+
+    def cold():
+        invalidate_user(public_id)
+        with app.test_request_context(headers=headers):
+            handler()
+
+    def empty_request():
+        # The request context alone, to tell it apart from the auth check.
+        with app.test_request_context(headers=headers):
+            pass
+
+    return [bench('request context only', empty_request, number, repeat),
+            bench('token_required (cached user)', warm, number, repeat),
+            bench('token_required (user lookup)', cold, number, repeat)]
+
+
+def generate_invoice_cases(rows_list, repeat):
+    from lib.invoice import generate_invoice
+
+    results = []
+    for rows in rows_list:
+        data = list(fake_rows(rows))
+        results.append(bench('generate_invoice ({} rows)'.format(rows), lambda: generate_invoice(data, 'benchmark'),
+                             max(1, 1000 // rows), repeat))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Micro-benchmarks of token_required and generate_invoice')
+    parser.add_argument('--number', type=int, default=1000, help='calls per timeit run for token_required')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--invoice-rows', type=int, nargs='+', default=[10, 100, 500])
+    parser.add_argument('--json', help='write the results to this file')
+    args = parser.parse_args()
+
+    app = load_app('sqlite:///' + os.path.join(tempfile.mkdtemp(), 'micro.db'))
+    with app.app_context():
+        public_id = seed(users=5, dist_companies=1, products=0, rma_cases=0)
+
+    results = token_required_cases(app, make_token(app, public_id), public_id, args.number, args.repeat)
+    results.extend(generate_invoice_cases(args.invoice_rows, args.repeat))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'benchmark': 'micro', 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
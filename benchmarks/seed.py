@@ -0,0 +1,115 @@
+# seed.py
+#
+# Synthetic data for the benchmarks and checks in this package. The app is
+# configured through the same SUKKIRI_* environment variables as in
+# production, so load_app() has to run before anything imports main.
+import datetime
+import os
+import random
+import uuid
+
+import jwt
+from werkzeug.security import generate_password_hash
+
+STATUSES = ['to_be_revised', 'to_be_sent', 'sent', 'returned', 'resolved', 'unresolved']
+BATCH_SIZE = 1000
+
+
+def add_seed_arguments(parser, products=2000, rma_cases=10000):
+    parser.add_argument('--users', type=int, default=5)
+    parser.add_argument('--dist-companies', type=int, default=20)
+    parser.add_argument('--products', type=int, default=products)
+    parser.add_argument('--rma-cases', type=int, default=rma_cases)
+    parser.add_argument('--random-seed', type=int, default=0)
+
+
+def seed_volumes(args):
+    return {'users': args.users, 'dist_companies': args.dist_companies, 'products': args.products,
+            'rma_cases': args.rma_cases}
+
+
+def seed_from_args(args):
+    return seed(random_seed=args.random_seed, **seed_volumes(args))
+
+
+def load_app(database_uri):
+    os.environ['SUKKIRI_DATABASE_URI'] = database_uri
+    os.environ.setdefault('SUKKIRI_SECRET_KEY', 'benchmark secret key')
+
+    import main
+    return main.app
+
+
+def make_token(app, public_id):
+    token = jwt.encode({'public_id': public_id, 'exp': datetime.datetime.utcnow() + datetime.timedelta(hours=24)},
+                       app.config['SECRET_KEY'])
+    return token.decode('UTF-8')
+
+
+def _insert(model, rows):
+    from lib.models import db
+
+    for start in range(0, len(rows), BATCH_SIZE):
+        db.session.bulk_insert_mappings(model, rows[start:start + BATCH_SIZE])
+
+
+def seed(users=5, dist_companies=20, products=2000, rma_cases=10000, random_seed=0):
+    # Must run inside an app context. Returns the public_id of an admin user.
+    from lib.models import DistributionCompany, Product, RMACase, RMAStatusEvent, TableVersion, User, db
+    from lib.history import rebuild_status_dates
+    from lib.stats import rebuild_case_counts
+
+    rng = random.Random(random_seed)
+    db.create_all()
+
+    admin_public_id = str(uuid.uuid4())
+    password_hash = generate_password_hash('benchmark', method='sha256')
+    user_rows = [{'id': 1, 'public_id': admin_public_id, 'username': 'admin', 'email': 'admin@example.com',
+                  'first_name': 'Bench', 'last_name': 'Admin', 'password_hash': password_hash, 'role': 'admin'}]
+    user_rows.extend({'public_id': str(uuid.uuid4()), 'username': 'user{}'.format(index),
+                      'email': 'user{}@example.com'.format(index), 'first_name': 'User', 'last_name': str(index),
+                      'password_hash': password_hash, 'role': 'user'} for index in range(1, users))
+    _insert(User, user_rows)
+
+    # Synced tables start at revision 1, like the rows the migration stamped.
+    now = datetime.datetime.now()
+    _insert(TableVersion, [{'name': 'dist_companies', 'version': 1}, {'name': 'products', 'version': 1}])
+
+    company_names = ['DISTRIBUTOR {}'.format(index) for index in range(dist_companies)]
+    _insert(DistributionCompany, [{'id': index + 1, 'name': name, 'email': 'sales@distributor{}.com'.format(index),
+                                   'address': 'Street {}'.format(index), 'hours': '9 to 18',
+                                   'contact_name': 'Contact {}'.format(index), 'phone': '555-{:04d}'.format(index),
+                                   'revision': 1, 'updated_at': now}
+                                  for index, name in enumerate(company_names)])
+
+    brands = ['BRAND {}'.format(index) for index in range(50)]
+    _insert(Product, [{'brand': brands[index % len(brands)], 'model': 'MODEL {}'.format(index),
+                       'description': 'Product {} Description'.format(index), 'stock': rng.randint(0, 100),
+                       'stock_under_control': rng.random() < 0.5,
+                       'distribution_company_id': rng.randint(1, dist_companies),
+                       'ean': '779{:010d}'.format(rng.randint(0, products)), 'revision': 1, 'updated_at': now}
+                      for index in range(products)])
+
+    start = datetime.datetime(2017, 1, 1)
+    rows = []
+    events = []
+    for index in range(rma_cases):
+        created = start + datetime.timedelta(minutes=rng.randint(0, 60 * 24 * 365 * 3))
+        status = rng.choice(STATUSES)
+        rows.append({'id': index + 1, 'brand': rng.choice(brands), 'model': 'MODEL {}'.format(rng.randint(0, products)),
+                     'problem': 'Does not turn on', 'serial_number': 'SN{:08d}'.format(index),
+                     'distribution_company_id': rng.randint(1, dist_companies), 'status': status})
+        events.append({'case_id': index + 1, 'status': 'to_be_revised', 'at': created})
+        if status != 'to_be_revised':
+            events.append({'case_id': index + 1, 'status': status,
+                           'at': created + datetime.timedelta(days=rng.randint(1, 60))})
+    _insert(RMACase, rows)
+    # The history is read in id order, so the events go in by date.
+    events.sort(key=lambda event: event['at'])
+    _insert(RMAStatusEvent, [dict(event, user_id=1, user_name='Bench Admin') for event in events])
+    rebuild_status_dates()
+
+    rebuild_case_counts()
+    db.session.commit()
+
+    return admin_public_id
@@ -0,0 +1,143 @@
+# bulk.py
+import csv
+import datetime
+import io
+
+from sqlalchemy import func
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+
+from lib.dist_companies import NO_DIST_COMPANY, dist_company_ids
+from lib.models import Product, db
+
+CHUNK_SIZE = 500
+
+PRODUCT_FIELDS = ['brand', 'model', 'description', 'stock', 'stock_under_control', 'distribution_company', 'ean']
+# Columns an upsert overwrites on an existing product.
+UPDATED_COLUMNS = ['description', 'stock', 'stock_under_control', 'distribution_company_id', 'ean', 'revision',
+                   'updated_at']
+
+
+def _parse_bool(value):
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 't', 'yes', 'y')
+    return bool(value)
+
+
+def read_csv(text):
+    return list(csv.DictReader(io.StringIO(text)))
+
+
+def product_values(data):
+    # Same normalization as create_new_product.
+    missing = [field for field in PRODUCT_FIELDS if field not in data]
+    if missing:
+        raise ValueError('Missing fields: {}'.format(', '.join(missing)))
+
+    not_text = [field for field in ('brand', 'model', 'description') if not isinstance(data[field], str)]
+    if not_text:
+        raise ValueError('{} must be text!'.format(', '.join(not_text)))
+    if data['distribution_company'] is not None and not isinstance(data['distribution_company'], str):
+        raise ValueError('distribution_company must be text!')
+
+    if not data['brand'] or not data['model']:
+        raise ValueError('brand and model can not be empty!')
+
+    try:
+        stock = int(data['stock'])
+    except (TypeError, ValueError):
+        raise ValueError('stock must be an integer!')
+
+    # The company name, resolved to its id by upsert_products.
+    dist_company = data['distribution_company'] if data['distribution_company'] not in NO_DIST_COMPANY else None
+
+    return {'brand': data['brand'].upper(), 'model': data['model'].upper(),
+            'description': data['description'].title(), 'stock': stock,
+            'stock_under_control': _parse_bool(data['stock_under_control']),
+            'distribution_company': dist_company, 'ean': data['ean'] or None}
+
+
+def _existing_ids(chunk):
+    brands = set(values['brand'] for values in chunk)
+    models = set(values['model'] for values in chunk)
+    brand_column, model_column = Product.brand, Product.model
+    if db.engine.dialect.name != 'mysql':
+        # MySQL compares case-insensitively already (and keeps using the
+        # indexes), elsewhere the legacy mixed-case rows need the upper().
+        brand_column, model_column = func.upper(brand_column), func.upper(model_column)
+    rows = db.session.query(Product.id, Product.brand, Product.model).filter(
+        brand_column.in_(brands), model_column.in_(models))
+    # Keyed like product_values, so legacy rows stored before the brand and
+    # model were uppercased are updated instead of reported as created.
+    return {(brand.upper(), model.upper()): product_id for product_id, brand, model in rows}
+
+
+def _write_chunk(chunk, existing):
+    if db.engine.dialect.name == 'mysql':
+        # One multi-row INSERT ... ON DUPLICATE KEY UPDATE per chunk against
+        # the (brand, model) unique key.
+        stmt = mysql_insert(Product.__table__).values(chunk)
+        stmt = stmt.on_duplicate_key_update({column: stmt.inserted[column] for column in UPDATED_COLUMNS})
+        db.session.execute(stmt)
+        return
+
+    # Fallback for SQLite and other dialects: one executemany INSERT for the
+    # new keys and one executemany UPDATE for the existing ones.
+    new_rows = [values for values in chunk if (values['brand'], values['model']) not in existing]
+    updated_rows = [dict(values, id=existing[(values['brand'], values['model'])]) for values in chunk
+                    if (values['brand'], values['model']) in existing]
+    if new_rows:
+        db.session.bulk_insert_mappings(Product, new_rows)
+    if updated_rows:
+        db.session.bulk_update_mappings(Product, updated_rows)
+
+
+def upsert_products(rows, revision):
+    # revision: stamped on every written row, see lib/sync.py.
+    results = []
+    pending = []
+    seen = {}
+
+    for index, data in enumerate(rows):
+        try:
+            if not isinstance(data, dict):
+                raise ValueError('Each product must be an object!')
+            values = product_values(data)
+        except ValueError as e:
+            results.append({'row': index, 'result': 'rejected', 'message': str(e)})
+            continue
+
+        key = (values['brand'], values['model'])
+        result = {'row': index, 'brand': key[0], 'model': key[1]}
+        results.append(result)
+
+        if key in seen:
+            result.update({'result': 'rejected', 'message': 'Duplicate of row {}'.format(seen[key])})
+            continue
+
+        seen[key] = index
+        pending.append((result, values))
+
+    # Company names are resolved for the whole import at once.
+    ids = dist_company_ids(values['distribution_company'] for result, values in pending)
+    now = datetime.datetime.now()
+    resolved = []
+    for result, values in pending:
+        name = values.pop('distribution_company')
+        if name is not None and name not in ids:
+            result.update({'result': 'rejected', 'message': 'No distribution company named {}'.format(name)})
+            continue
+        values.update(distribution_company_id=ids.get(name), revision=revision, updated_at=now)
+        resolved.append((result, values))
+    pending = resolved
+
+    for start in range(0, len(pending), CHUNK_SIZE):
+        chunk = pending[start:start + CHUNK_SIZE]
+        chunk_values = [values for result, values in chunk]
+        existing = _existing_ids(chunk_values)
+
+        for result, values in chunk:
+            result['result'] = 'updated' if (values['brand'], values['model']) in existing else 'created'
+
+        _write_chunk(chunk_values, existing)
+
+    return results
@@ -0,0 +1,129 @@
+# db_pool.py
+import time
+from threading import Lock
+from weakref import WeakKeyDictionary
+
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError
+from sqlalchemy.pool import QueuePool
+
+# Upper bounds, in seconds, of the checkout wait histogram buckets.
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+
+COUNTERS = ('connects', 'checkouts', 'checkins', 'invalidations', 'timeouts')
+
+_lock = Lock()
+# Counters and checkout wait histogram of each engine's pool, see
+# watch_engine.
+_stats = WeakKeyDictionary()
+
+
+def _new_stats():
+    return {'counters': dict.fromkeys(COUNTERS, 0), 'wait_counts': [0] * (len(WAIT_BUCKETS) + 1), 'wait_sum': 0.0}
+
+
+def _count(stats, name):
+    with _lock:
+        stats['counters'][name] += 1
+
+
+def _observe_wait(stats, seconds):
+    index = 0
+    while index < len(WAIT_BUCKETS) and seconds > WAIT_BUCKETS[index]:
+        index += 1
+    with _lock:
+        stats['wait_counts'][index] += 1
+        stats['wait_sum'] += seconds
+
+
+class InstrumentedQueuePool(QueuePool):
+    # QueuePool that times how long each checkout waits for a connection,
+    # which the pool events can not tell. watch_engine gives it the stats
+    # to record into.
+    stats = None
+
+    def recreate(self):
+        # Engine.dispose() replaces the pool with a copy, which keeps
+        # recording into the same stats (the event listeners are copied too).
+        pool = super(InstrumentedQueuePool, self).recreate()
+        pool.stats = self.stats
+        return pool
+
+    def _do_get(self):
+        if self.stats is None:
+            return super(InstrumentedQueuePool, self)._do_get()
+
+        start = time.time()
+        try:
+            return super(InstrumentedQueuePool, self)._do_get()
+        except TimeoutError:
+            _count(self.stats, 'timeouts')
+            raise
+        finally:
+            _observe_wait(self.stats, time.time() - start)
+
+
+def _parse_bool(value):
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def pool_options(database_uri, pool_size=None, max_overflow=None, pool_timeout=None, pool_recycle=None,
+                 pool_pre_ping=None):
+    # SQLALCHEMY_ENGINE_OPTIONS from the SUKKIRI_DB_POOL_* settings (strings,
+    # or None when not set). Only the given settings are passed, the rest
+    # keep the SQLAlchemy defaults.
+    options = {}
+    if pool_recycle is not None:
+        options['pool_recycle'] = int(pool_recycle)
+    if pool_pre_ping is not None:
+        options['pool_pre_ping'] = _parse_bool(pool_pre_ping)
+
+    # SQLite does not use a QueuePool, so the sizing settings do not apply.
+    if database_uri and not database_uri.startswith('sqlite'):
+        options['poolclass'] = InstrumentedQueuePool
+        if pool_size is not None:
+            options['pool_size'] = int(pool_size)
+        if max_overflow is not None:
+            options['max_overflow'] = int(max_overflow)
+        if pool_timeout is not None:
+            options['pool_timeout'] = int(pool_timeout)
+
+    return options
+
+
+def watch_engine(engine):
+    # Counts the connection events of the engine's pool. Called for every
+    # engine the app creates, one per bind (see RoutingSQLAlchemy).
+    stats = _stats[engine] = _new_stats()
+    if isinstance(engine.pool, InstrumentedQueuePool):
+        engine.pool.stats = stats
+
+    event.listen(engine.pool, 'connect', lambda dbapi_connection, connection_record: _count(stats, 'connects'))
+    event.listen(engine.pool, 'checkout', lambda dbapi_connection, connection_record, connection_proxy:
+                 _count(stats, 'checkouts'))
+    event.listen(engine.pool, 'checkin', lambda dbapi_connection, connection_record: _count(stats, 'checkins'))
+    # Stale connections (found by pre-ping or by a failed query) end up here.
+    event.listen(engine.pool, 'invalidate', lambda dbapi_connection, connection_record, exception:
+                 _count(stats, 'invalidations'))
+
+
+def pool_stats(engine):
+    pool = engine.pool
+    stats = {'class': type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update({'size': pool.size(), 'checked_in': pool.checkedin(), 'checked_out': pool.checkedout(),
+                      'overflow': pool.overflow(), 'timeout': pool.timeout()})
+
+    with _lock:
+        watched = _stats.get(engine) or _new_stats()
+        stats.update(watched['counters'])
+        # Cumulative counts, Prometheus style: each bucket includes the
+        # faster ones.
+        buckets = {}
+        total = 0
+        for bound, count in zip([str(bound) for bound in WAIT_BUCKETS] + ['+Inf'], watched['wait_counts']):
+            total += count
+            buckets[bound] = total
+        stats['checkout_wait'] = {'buckets': buckets, 'count': total, 'sum': watched['wait_sum']}
+
+    return stats
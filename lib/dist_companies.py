@@ -0,0 +1,52 @@
+# dist_companies.py
+from lib.models import DistributionCompany, db
+
+# Names the API has always accepted for "no distribution company".
+NO_DIST_COMPANY = (None, '', 'N/A')
+
+
+class UnknownDistCompanyError(ValueError):
+    pass
+
+
+def dist_company_ids(names):
+    # {name: id} for the given names, in a single query.
+    names = set(name for name in names if name not in NO_DIST_COMPANY)
+    if not names:
+        return {}
+    return dict(db.session.query(DistributionCompany.name, DistributionCompany.id).filter(
+        DistributionCompany.name.in_(names)))
+
+
+def dist_company_id(data):
+    # The distribution company of a request body, by id
+    # (distribution_company_id) or by name (distribution_company). None for
+    # no company.
+    if data.get('distribution_company_id') is not None:
+        try:
+            company_id = int(data['distribution_company_id'])
+        except (TypeError, ValueError):
+            raise UnknownDistCompanyError('distribution_company_id must be an integer!')
+        if db.session.query(DistributionCompany.id).filter(DistributionCompany.id == company_id).first() is None:
+            raise UnknownDistCompanyError('No distribution company found!')
+        return company_id
+
+    name = data.get('distribution_company')
+    if name in NO_DIST_COMPANY:
+        return None
+
+    company_id = dist_company_ids([name]).get(name)
+    if company_id is None:
+        raise UnknownDistCompanyError('No distribution company found!')
+    return company_id
+
+
+def find_dist_company(id_or_name):
+    # (id, name) of the company with that id, or with that name for the URLs
+    # that predate the ids. None when there is no such company.
+    query = db.session.query(DistributionCompany.id, DistributionCompany.name)
+    if id_or_name.isdigit():
+        row = query.filter(DistributionCompany.id == int(id_or_name)).first()
+        if row is not None:
+            return row
+    return query.filter(DistributionCompany.name == id_or_name).first()
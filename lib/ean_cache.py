@@ -0,0 +1,78 @@
+# ean_cache.py
+from threading import Lock
+
+from cachetools import TTLCache
+from sqlalchemy import or_
+
+from lib.models import Product
+from lib.serializers import product_serializer
+
+MAX_BATCH = 1000
+
+# EAN -> tuple of product ids, for known EANs only. An unknown one is looked
+# up again every time: the product may be created by another process, which
+# cannot invalidate this cache.
+_cache = TTLCache(maxsize=10000, ttl=300)
+_lock = Lock()
+
+
+def init_ean_cache(maxsize, ttl):
+    global _cache
+    with _lock:
+        _cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+
+def lookup_eans(eans, fields):
+    # Returns {ean: [product dicts]} for every requested EAN, with a single
+    # query: cached EANs are fetched by primary key, the rest by EAN.
+    eans = list(dict.fromkeys(eans))
+
+    cached_ids = {}
+    missing = []
+    with _lock:
+        for ean in eans:
+            product_ids = _cache.get(ean)
+            if product_ids is None:
+                missing.append(ean)
+            else:
+                cached_ids[ean] = product_ids
+
+    product_ids = set(product_id for ids in cached_ids.values() for product_id in ids)
+    results = {ean: [] for ean in eans}
+    if not product_ids and not missing:
+        return results
+
+    conditions = []
+    if product_ids:
+        conditions.append(Product.id.in_(product_ids))
+    if missing:
+        conditions.append(Product.ean.in_(missing))
+
+    # ean is always selected (after the requested fields) to group the rows.
+    rows = product_serializer.query(fields + ['ean'] if 'ean' not in fields else fields) \
+        .filter(or_(*conditions)).order_by(Product.id).all()
+
+    found = {ean: [] for ean in missing}
+    for row in rows:
+        if row.ean in found:
+            found[row.ean].append(row.id)
+        if row.ean in results and (row.ean in found or row.id in cached_ids.get(row.ean, ())):
+            results[row.ean].append(product_serializer.to_dict(row, fields))
+
+    with _lock:
+        for ean, ids in found.items():
+            if ids:
+                _cache[ean] = tuple(ids)
+
+    return results
+
+
+def invalidate_eans(*eans):
+    with _lock:
+        for ean in eans:
+            _cache.pop(ean, None)
+
+
+def clear_ean_cache():
+    with _lock:
+        _cache.clear()
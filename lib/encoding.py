@@ -0,0 +1,121 @@
+# encoding.py
+import gzip
+import json
+import zlib
+
+from flask import current_app, request
+
+from lib.instrumentation import phase
+
+# The fastest JSON encoder available, the stdlib one as the fallback. Keys
+# are sorted and separators compact, like Flask's jsonify outside debug.
+try:
+    import orjson
+
+    def dumps(data):
+        return orjson.dumps(data, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS)
+except ImportError:
+    try:
+        import ujson
+
+        def dumps(data):
+            return ujson.dumps(data, sort_keys=True, ensure_ascii=False).encode('utf-8')
+    except ImportError:
+        def dumps(data):
+            return json.dumps(data, sort_keys=True, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MIN_COMPRESS_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+# Already compressed, or handled by send_file.
+SKIP_MIMETYPES = ('application/pdf',)
+# Streams whose chunks must reach the client as soon as they are written,
+# a compressor would hold them back.
+LIVE_MIMETYPES = ('text/event-stream',)
+
+
+def jsonify(*args, **kwargs):
+    # Drop-in replacement for flask.jsonify.
+    if args and kwargs:
+        raise TypeError('jsonify() behavior undefined when passed both args and kwargs')
+    if len(args) == 1:
+        data = args[0]
+    else:
+        data = args or kwargs
+
+    with phase('json'):
+        body = dumps(data) + b'\n'
+    return current_app.response_class(body, mimetype='application/json')
+
+
+def init_compression(app, min_size=MIN_COMPRESS_BYTES):
+    app.config['COMPRESS_MIN_BYTES'] = min_size
+    app.after_request(compress_response)
+
+
+def _gzip_chunks(chunks, charset):
+    # The response closes its body once sent, this closes the original one
+    # (stream_with_context ends the request context there).
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    try:
+        for chunk in chunks:
+            data = compressor.compress(chunk.encode(charset) if isinstance(chunk, str) else chunk)
+            if data:
+                yield data
+        yield compressor.flush()
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+
+def compress_response(response):
+    # Compresses /api/* responses larger than COMPRESS_MIN_BYTES with brotli
+    # or gzip, depending on Accept-Encoding. Streamed responses (exports)
+    # are gzipped chunk by chunk, whatever their size. Files (invoices) and
+    # event streams are sent as they are.
+    if not request.path.startswith('/api/') or response.direct_passthrough:
+        return response
+    if response.mimetype in SKIP_MIMETYPES + LIVE_MIMETYPES or 'Content-Encoding' in response.headers:
+        return response
+
+    response.vary.add('Accept-Encoding')
+
+    if response.status_code < 200 or response.status_code in (204, 304):
+        return response
+
+    if response.is_streamed:
+        if request.accept_encodings.best_match(['gzip']) is None:
+            return response
+        response.response = _gzip_chunks(response.response, response.charset)
+        response.headers.pop('Content-Length', None)
+        response.headers['Content-Encoding'] = 'gzip'
+        return response
+
+    encodings = ['br', 'gzip'] if brotli is not None else ['gzip']
+    encoding = request.accept_encodings.best_match(encodings)
+    if encoding is None:
+        return response
+
+    data = response.get_data()
+    if len(data) < current_app.config['COMPRESS_MIN_BYTES']:
+        return response
+
+    if encoding == 'br':
+        response.set_data(brotli.compress(data, quality=BROTLI_QUALITY))
+    else:
+        response.set_data(gzip.compress(data, compresslevel=GZIP_LEVEL))
+    response.headers['Content-Encoding'] = encoding
+
+    # The compressed body is a different representation, so a strong ETag
+    # can not be shared with the uncompressed one.
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+
+    return response
@@ -0,0 +1,274 @@
+# events.py
+import datetime
+import json
+import queue
+import threading
+import time
+
+from sqlalchemy import DateTime, literal, select
+
+from lib.models import DistributionCompany, RMACase, RMACaseEvent, db
+
+BACKFILL_LIMIT = 1000
+QUEUE_SIZE = 1000
+# Autoincrement ids are handed out at insert time but become visible at
+# commit time, so a lower id can show up after a higher one. Missing ids are
+# looked up again for this long before they are taken as rolled back.
+GAP_SECONDS = 30
+PRUNE_EVERY_SECONDS = 600
+
+
+def record_case_events(events):
+    # events: iterable of (case_id, type, status, distribution_company_id),
+    # written in the caller's transaction so they commit with the change.
+    now = datetime.datetime.now()
+    rows = [{'case_id': case_id, 'type': event_type, 'status': status, 'distribution_company_id': dist_company_id,
+             'created_at': now} for case_id, event_type, status, dist_company_id in events]
+    if rows:
+        db.session.execute(RMACaseEvent.__table__.insert(), rows)
+
+
+def record_dist_company_events(dist_company_id):
+    # A 'modified' event for every case of the company, whose name they
+    # carry, in a single INSERT ... SELECT.
+    cases = select([RMACase.id, literal('modified'), RMACase.status, RMACase.distribution_company_id,
+                    literal(datetime.datetime.now(), DateTime)]).where(
+        RMACase.distribution_company_id == dist_company_id)
+    db.session.execute(RMACaseEvent.__table__.insert().from_select(
+        ['case_id', 'type', 'status', 'distribution_company_id', 'created_at'], cases))
+
+
+def _event_dict(row):
+    return {'event_id': row.id, 'id': row.case_id, 'type': row.type, 'status': row.status,
+            'distribution_company': row.distribution_company, 'distribution_company_id': row.distribution_company_id,
+            'at': row.created_at.strftime('%Y-%m-%dT%H:%M:%S')}
+
+
+def _events_query():
+    return db.session.query(RMACaseEvent.id, RMACaseEvent.case_id, RMACaseEvent.type, RMACaseEvent.status,
+                            RMACaseEvent.distribution_company_id,
+                            DistributionCompany.name.label('distribution_company'),
+                            RMACaseEvent.created_at).outerjoin(
+        DistributionCompany, RMACaseEvent.distribution_company_id == DistributionCompany.id)
+
+
+class Subscriber(object):
+    def __init__(self, dist_companies, statuses):
+        self.dist_companies = dist_companies
+        self.statuses = statuses
+        self.queue = queue.Queue(maxsize=QUEUE_SIZE)
+        self.overflowed = False
+
+    def matches(self, event):
+        return (not self.dist_companies or event['distribution_company'] in self.dist_companies) and \
+               (not self.statuses or event['status'] in self.statuses)
+
+
+class Broadcaster(object):
+    # One per process. Polls rma_case_events, which every process writes to,
+    # and fans the new rows out to this process' subscribers. The table is
+    # the broker: no process talks to another one directly.
+
+    def __init__(self, app, poll_interval, retention):
+        self.app = app
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._thread = None
+        self._last_id = None
+        self._gaps = {}
+        self._pruned_at = 0
+
+    def subscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.add(subscriber)
+            # Started with the first subscriber, so processes that never
+            # serve the stream do not poll.
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='rma-case-events')
+                self._thread.daemon = True
+                self._thread.start()
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def _run(self):
+        while True:
+            try:
+                with self.app.app_context():
+                    self._poll()
+                    self._prune()
+                    db.session.remove()
+            except Exception:
+                self.app.logger.exception('Could not poll the RMA case events')
+            time.sleep(self.poll_interval)
+
+    def _poll(self):
+        if self._last_id is None:
+            self._last_id = db.session.query(db.func.max(RMACaseEvent.id)).scalar() or 0
+            return
+
+        rows = _events_query().filter(RMACaseEvent.id > self._last_id).order_by(RMACaseEvent.id).limit(
+            BACKFILL_LIMIT).all()
+        now = time.time()
+        if self._gaps:
+            rows.extend(_events_query().filter(RMACaseEvent.id.in_(list(self._gaps))).all())
+        found = set(row.id for row in rows)
+
+        for gap in [gap for gap, since in self._gaps.items() if gap in found or now - since > GAP_SECONDS]:
+            del self._gaps[gap]
+        if rows:
+            highest = max(found)
+            self._gaps.update((missing, now) for missing in range(self._last_id + 1, highest)
+                              if missing not in found)
+            self._last_id = max(self._last_id, highest)
+
+        self.publish([_event_dict(row) for row in sorted(rows, key=lambda row: row.id)])
+
+    def publish(self, events):
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscriber in subscribers:
+            for event in events:
+                if subscriber.matches(event):
+                    try:
+                        subscriber.queue.put_nowait(event)
+                    except queue.Full:
+                        # Too slow to keep up: its stream ends and the
+                        # client resumes from the table with Last-Event-ID.
+                        subscriber.overflowed = True
+                        break
+
+    def _prune(self):
+        if time.time() - self._pruned_at < PRUNE_EVERY_SECONDS:
+            return
+        self._pruned_at = time.time()
+        cutoff = datetime.datetime.now() - self.retention
+        db.session.query(RMACaseEvent).filter(RMACaseEvent.created_at < cutoff).delete(synchronize_session=False)
+        db.session.commit()
+
+
+_broadcaster = None
+_settings = {'heartbeat': 15, 'max_seconds': 300, 'max_streams': 4, 'poll_wait': 25}
+# Streams and waiting long-polls of this process, each holding a worker.
+_streams_lock = threading.Lock()
+_open_streams = 0
+
+
+def init_events(app, poll_interval, retention_hours, heartbeat, max_seconds, max_streams, poll_wait):
+    # max_streams: 0 for no limit.
+    global _broadcaster
+    _broadcaster = Broadcaster(app, poll_interval, datetime.timedelta(hours=retention_hours))
+    _settings.update(heartbeat=heartbeat, max_seconds=max_seconds, max_streams=max_streams, poll_wait=poll_wait)
+
+
+def open_stream():
+    # Takes one of the max_streams slots, False when they are all taken. The
+    # caller gives it back with close_stream.
+    global _open_streams
+    with _streams_lock:
+        if _settings['max_streams'] and _open_streams >= _settings['max_streams']:
+            return False
+        _open_streams += 1
+        return True
+
+
+def close_stream():
+    global _open_streams
+    with _streams_lock:
+        _open_streams -= 1
+
+
+def _format(event):
+    return 'id: {}\nevent: rma_case\ndata: {}\n\n'.format(event['event_id'], json.dumps(event))
+
+
+def _backfill(last_event_id, subscriber):
+    # Events after last_event_id still in the table. None when the client
+    # is too far behind (pruned or more than BACKFILL_LIMIT events) and has
+    # to reload the cases instead.
+    oldest = db.session.query(db.func.min(RMACaseEvent.id)).scalar()
+    if oldest is not None and last_event_id < oldest - 1:
+        return None
+
+    query = _events_query().filter(RMACaseEvent.id > last_event_id)
+    if subscriber.dist_companies:
+        query = query.filter(DistributionCompany.name.in_(subscriber.dist_companies))
+    if subscriber.statuses:
+        query = query.filter(RMACaseEvent.status.in_(subscriber.statuses))
+    rows = query.order_by(RMACaseEvent.id).limit(BACKFILL_LIMIT + 1).all()
+
+    if len(rows) > BACKFILL_LIMIT:
+        return None
+    return [_event_dict(row) for row in rows]
+
+
+def event_stream(dist_companies, statuses, last_event_id=None):
+    # Generator of the text/event-stream body. Ends after max_seconds (and
+    # when the subscriber falls behind) so long-lived connections do not
+    # pin a worker forever, EventSource reconnects with Last-Event-ID.
+    subscriber = Subscriber(dist_companies, statuses)
+    _broadcaster.subscribe(subscriber)
+
+    try:
+        yield 'retry: 3000\n\n'
+
+        # Subscribed before the backfill, so nothing falls in between. The
+        # overlap is skipped below.
+        sent = set()
+        events = _backfill(last_event_id, subscriber) if last_event_id is not None else []
+        # Give the connection back to the pool for the rest of the stream.
+        db.session.remove()
+        if events is None:
+            yield 'event: reset\ndata: {}\n\n'
+            return
+        for event in events:
+            sent.add(event['event_id'])
+            yield _format(event)
+
+        started = time.time()
+        while time.time() - started < _settings['max_seconds'] and not subscriber.overflowed:
+            try:
+                event = subscriber.queue.get(timeout=_settings['heartbeat'])
+            except queue.Empty:
+                yield ': keep-alive\n\n'
+                continue
+            if event['event_id'] not in sent:
+                yield _format(event)
+    finally:
+        _broadcaster.unsubscribe(subscriber)
+
+
+def poll_events(dist_companies, statuses, last_event_id, wait):
+    # Long-polling alternative to event_stream, for deployments that buffer
+    # whole responses (App Engine standard). Returns the events after
+    # last_event_id, or if there are none and `wait` is set the ones
+    # published within poll_wait seconds, and the id to poll from next. The
+    # events are None when the client is too far behind and has to reload
+    # the cases.
+    subscriber = Subscriber(dist_companies, statuses)
+    _broadcaster.subscribe(subscriber)
+
+    try:
+        # Subscribed before the backfill, like event_stream.
+        if last_event_id is None:
+            last_event_id = db.session.query(db.func.max(RMACaseEvent.id)).scalar() or 0
+        events = _backfill(last_event_id, subscriber)
+        db.session.remove()
+        if events is None:
+            return None, None
+
+        if not events and wait:
+            try:
+                events.append(subscriber.queue.get(timeout=_settings['poll_wait']))
+            except queue.Empty:
+                pass
+            # And whatever was published along with it.
+            while not subscriber.queue.empty():
+                events.append(subscriber.queue.get_nowait())
+
+        return events, max([last_event_id] + [event['event_id'] for event in events])
+    finally:
+        _broadcaster.unsubscribe(subscriber)
@@ -0,0 +1,49 @@
+# export.py
+import csv
+import io
+import json
+
+YIELD_PER = 1000
+CHUNK_SIZE = 64 * 1024
+
+
+def stream_query(query):
+    # stream_results asks the driver for a server-side cursor (SSCursor on
+    # MySQL) and yield_per fetches the rows in batches, so neither the
+    # driver nor the session ever hold the whole table.
+    return query.execution_options(stream_results=True).yield_per(YIELD_PER)
+
+
+def _buffered(lines):
+    # Group lines into ~64KB chunks so the WSGI server is not flushing a
+    # socket write per row.
+    buffer = []
+    size = 0
+    for line in lines:
+        buffer.append(line)
+        size += len(line)
+        if size >= CHUNK_SIZE:
+            yield ''.join(buffer)
+            buffer = []
+            size = 0
+    if buffer:
+        yield ''.join(buffer)
+
+
+def ndjson_lines(rows):
+    return _buffered(json.dumps(row) + '\n' for row in rows)
+
+
+def csv_lines(rows, fieldnames):
+    def lines():
+        line = io.StringIO()
+        writer = csv.DictWriter(line, fieldnames=fieldnames)
+        writer.writeheader()
+        for row in rows:
+            yield line.getvalue()
+            line.seek(0)
+            line.truncate(0)
+            writer.writerow(row)
+        yield line.getvalue()
+
+    return _buffered(lines())
@@ -0,0 +1,79 @@
+# filters.py
+import datetime
+from collections import OrderedDict
+
+from lib.history import STATUS_DATES, STATUSES, went_into
+from lib.models import DistributionCompany, Product, RMACase, db
+from lib.pagination import QueryArgsError
+
+# Sortable lifecycle dates, derived from the status history.
+RMA_CASE_DATE_COLUMNS = OrderedDict((status + '_date', STATUS_DATES[status]) for status in STATUSES)
+
+
+def _parse_date_arg(name, value, end):
+    # end: the bound is exclusive, the start of the next day (or minute), so
+    # the last fraction of a second of the given one is still in range.
+    for date_format, period in (('%d-%m-%Y %H:%M', datetime.timedelta(minutes=1)),
+                                ('%d-%m-%Y', datetime.timedelta(days=1))):
+        try:
+            date = datetime.datetime.strptime(value, date_format)
+        except ValueError:
+            continue
+        return date + period if end else date
+
+    raise QueryArgsError('{} must be a date in dd-mm-yyyy or dd-mm-yyyy hh:mm format!'.format(name))
+
+
+def _filter_dist_company(query, column, args):
+    # By id, or by name through a scalar subquery so the id index is used
+    # either way.
+    if 'distribution_company_id' in args:
+        try:
+            return query.filter(column == int(args['distribution_company_id']))
+        except ValueError:
+            raise QueryArgsError('distribution_company_id must be an integer!')
+    if 'distribution_company' in args:
+        return query.filter(column == db.session.query(DistributionCompany.id).filter(
+            DistributionCompany.name == args['distribution_company']).as_scalar())
+    return query
+
+
+def filter_rma_cases(query, args):
+    if 'status' in args:
+        query = query.filter(RMACase.status == args['status'])
+    query = _filter_dist_company(query, RMACase.distribution_company_id, args)
+    if 'brand' in args:
+        query = query.filter(RMACase.brand == args['brand'])
+
+    # <status>_date_from / _to: the cases that went into status within the
+    # dates.
+    for status in STATUSES:
+        column_name = status + '_date'
+        date_from = args.get(column_name + '_from')
+        date_to = args.get(column_name + '_to')
+        if date_from or date_to:
+            query = query.filter(went_into(
+                status, _parse_date_arg(column_name + '_from', date_from, False) if date_from else None,
+                _parse_date_arg(column_name + '_to', date_to, True) if date_to else None))
+
+    return query
+
+
+def rma_case_ordering(args):
+    sort = args.get('sort', 'id')
+    if sort != 'id' and sort not in RMA_CASE_DATE_COLUMNS:
+        raise QueryArgsError('sort must be id or one of: {}'.format(', '.join(RMA_CASE_DATE_COLUMNS)))
+
+    order = args.get('order', 'asc')
+    if order not in ('asc', 'desc'):
+        raise QueryArgsError('order must be asc or desc!')
+
+    return RMACase.id if sort == 'id' else RMA_CASE_DATE_COLUMNS[sort], order == 'desc'
+
+
+def filter_products(query, args):
+    if 'brand' in args:
+        query = query.filter(Product.brand == args['brand'].upper())
+    query = _filter_dist_company(query, Product.distribution_company_id, args)
+
+    return query
@@ -0,0 +1,91 @@
+# history.py
+import datetime
+
+from sqlalchemy import and_, func, literal_column, select
+from sqlalchemy.orm import aliased
+
+from lib.models import DistributionCompany, RMACase, RMAStatusDate, RMAStatusEvent, db
+
+# Lifecycle statuses. Each one used to have a <status>_date / <status>_by
+# pair of columns on rma_cases, the responses still show them.
+STATUSES = ['to_be_revised', 'to_be_sent', 'sent', 'returned', 'resolved', 'unresolved']
+
+
+def user_name(user):
+    return user.first_name + ' ' + user.last_name
+
+
+def record_status_events(case_ids, status, user):
+    # Written in the caller's transaction, so they commit with the change.
+    # rma_status_dates gets the new last time the cases went into status.
+    now = datetime.datetime.now()
+    rows = [{'case_id': case_id, 'status': status, 'at': now, 'user_id': user.id, 'user_name': user_name(user)}
+            for case_id in case_ids]
+    if rows:
+        db.session.execute(RMAStatusEvent.__table__.insert(), rows)
+        db.session.query(RMAStatusDate).filter(RMAStatusDate.case_id.in_(case_ids)).filter(
+            RMAStatusDate.status == status).delete(synchronize_session=False)
+        db.session.execute(RMAStatusDate.__table__.insert(), [
+            {'case_id': row['case_id'], 'status': status, 'at': now, 'user_name': row['user_name']} for row in rows])
+
+
+def rebuild_status_dates():
+    # Recomputes rma_status_dates from the events, for data written straight
+    # into rma_status_events (the benchmark seed, tests).
+    latest = aliased(RMAStatusEvent)
+    db.session.query(RMAStatusDate).delete(synchronize_session=False)
+    db.session.execute(RMAStatusDate.__table__.insert().from_select(
+        ['case_id', 'status', 'at', 'user_name'],
+        select([RMAStatusEvent.case_id, RMAStatusEvent.status, RMAStatusEvent.at, RMAStatusEvent.user_name]).where(
+            RMAStatusEvent.id == select([func.max(latest.id)]).where(latest.case_id == RMAStatusEvent.case_id).where(
+                latest.status == RMAStatusEvent.status).as_scalar())))
+
+
+# The legacy fields, as columns for the serializer, the filters and sorting,
+# each from its own LEFT JOIN of rma_status_dates on its primary key
+# (STATUS_JOINS). Sorting by a date walks the (status, at) index.
+_status_dates = {status: aliased(RMAStatusDate, name='status_dates_' + status) for status in STATUSES}
+STATUS_DATES = {status: _status_dates[status].at.label(status + '_date') for status in STATUSES}
+STATUS_USERS = {status: _status_dates[status].user_name.label(status + '_by') for status in STATUSES}
+STATUS_JOINS = {status: (_status_dates[status], and_(_status_dates[status].case_id == RMACase.id,
+                                                      _status_dates[status].status == status))
+                for status in STATUSES}
+
+
+def went_into(status, date_from=None, date_to=None):
+    # Filter for the cases that last went into status from date_from up to
+    # (not including) date_to, through the (status, at) index.
+    query = select([RMAStatusDate.case_id]).where(RMAStatusDate.status == status)
+    if date_from is not None:
+        query = query.where(RMAStatusDate.at >= date_from)
+    if date_to is not None:
+        query = query.where(RMAStatusDate.at < date_to)
+    return RMACase.id.in_(query)
+
+
+def _seconds_between(start, end):
+    if db.engine.dialect.name == 'mysql':
+        return func.timestampdiff(literal_column('SECOND'), start, end)
+    return (func.julianday(end) - func.julianday(start)) * 86400
+
+
+def time_in_status():
+    # Average time the cases spent in each status before moving to the next
+    # one, by distribution company. The status a case is in now does not
+    # count, as it is not over yet.
+    event = aliased(RMAStatusEvent)
+    following = aliased(RMAStatusEvent)
+    later = aliased(RMAStatusEvent)
+    next_id = select([func.min(later.id)]).where(later.case_id == event.case_id).where(
+        later.id > event.id).as_scalar()
+
+    rows = db.session.query(RMACase.distribution_company_id, DistributionCompany.name, event.status,
+                            func.avg(_seconds_between(event.at, following.at)), func.count(event.id)).select_from(
+        event).join(following, following.id == next_id).join(RMACase, RMACase.id == event.case_id).outerjoin(
+        DistributionCompany, RMACase.distribution_company_id == DistributionCompany.id).group_by(
+        RMACase.distribution_company_id, DistributionCompany.name, event.status).order_by(
+        RMACase.distribution_company_id, event.status)
+
+    return [{'distribution_company_id': dist_company_id, 'distribution_company': dist_company, 'status': status,
+             'average_seconds': round(float(seconds), 1), 'cases': count}
+            for dist_company_id, dist_company, status, seconds, count in rows]
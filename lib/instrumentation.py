@@ -0,0 +1,245 @@
+# instrumentation.py
+import heapq
+import os
+import sys
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Upper bounds, in seconds, of the request latency histogram buckets.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_lock = threading.Lock()
+# (route, method, status) -> [bucket counts..., +Inf count], sum, statements
+_latency = {}
+
+
+def _timing():
+    return g.get('_timing') if has_request_context() else None
+
+
+@contextmanager
+def phase(name):
+    # Adds the time spent in the block to the named phase of the current
+    # request, reported in its Server-Timing header. Outside of a request it
+    # does nothing.
+    timing = _timing()
+    if timing is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timing['phases'][name] = timing['phases'].get(name, 0.0) + time.perf_counter() - start
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_start'].pop()
+    timing = _timing()
+    if timing is not None:
+        timing['sql_count'] += 1
+        timing['sql_time'] += elapsed
+
+
+@event.listens_for(Engine, 'handle_error')
+def _handle_error(exception_context):
+    # after_cursor_execute does not run for a failed statement.
+    connection = exception_context.connection
+    if connection is not None and connection.info.get('query_start'):
+        connection.info['query_start'].pop()
+
+
+def _observe(route, method, status, seconds, statements):
+    index = 0
+    while index < len(LATENCY_BUCKETS) and seconds > LATENCY_BUCKETS[index]:
+        index += 1
+
+    key = (route, method, status)
+    with _lock:
+        entry = _latency.get(key)
+        if entry is None:
+            entry = _latency[key] = [[0] * (len(LATENCY_BUCKETS) + 1), 0.0, 0]
+        entry[0][index] += 1
+        entry[1] += seconds
+        entry[2] += statements
+
+
+def _route():
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+
+def _before_request():
+    g._timing = {'start': time.perf_counter(), 'sql_count': 0, 'sql_time': 0.0, 'phases': OrderedDict()}
+    if _profiler is not None:
+        _profiler.start_request()
+
+
+def _after_request(response):
+    timing = _timing()
+    if timing is None:
+        return response
+
+    total = time.perf_counter() - timing['start']
+    entries = ['db;dur={:.2f};desc="{} queries"'.format(timing['sql_time'] * 1000, timing['sql_count'])]
+    entries.extend('{};dur={:.2f}'.format(name, seconds * 1000) for name, seconds in timing['phases'].items())
+    entries.append('total;dur={:.2f}'.format(total * 1000))
+    # Phases can overlap (auth includes its own query), total is the whole
+    # request up to here. Streamed bodies are still being produced.
+    response.headers['Server-Timing'] = ', '.join(entries)
+
+    _observe(_route(), request.method, response.status_code, total, timing['sql_count'])
+    return response
+
+
+def _teardown_request(exception):
+    timing = _timing()
+    if timing is not None and _profiler is not None:
+        _profiler.finish_request(_route(), request.method, request.full_path,
+                                 time.perf_counter() - timing['start'])
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def prometheus_metrics(pool_stats=None):
+    # Prometheus text exposition format (version 0.0.4).
+    lines = ['# HELP sukkiri_request_duration_seconds Request latency by route, method and status.',
+             '# TYPE sukkiri_request_duration_seconds histogram']
+    with _lock:
+        latency = sorted((key, [list(entry[0]), entry[1], entry[2]]) for key, entry in _latency.items())
+
+    for (route, method, status), (counts, total, _) in latency:
+        labels = 'route="{}",method="{}",status="{}"'.format(_escape(route), method, status)
+        cumulative = 0
+        for bound, count in zip([str(bound) for bound in LATENCY_BUCKETS] + ['+Inf'], counts):
+            cumulative += count
+            lines.append('sukkiri_request_duration_seconds_bucket{{{},le="{}"}} {}'.format(labels, bound,
+                                                                                          cumulative))
+        lines.append('sukkiri_request_duration_seconds_sum{{{}}} {}'.format(labels, total))
+        lines.append('sukkiri_request_duration_seconds_count{{{}}} {}'.format(labels, cumulative))
+
+    lines.extend(['# HELP sukkiri_sql_statements_total SQL statements executed by route, method and status.',
+                  '# TYPE sukkiri_sql_statements_total counter'])
+    for (route, method, status), (_, _, statements) in latency:
+        lines.append('sukkiri_sql_statements_total{{route="{}",method="{}",status="{}"}} {}'.format(
+            _escape(route), method, status, statements))
+
+    if pool_stats:
+        # pool_stats: {bind: stats}, every family lists its samples for all
+        # the binds together.
+        binds = sorted(pool_stats.items())
+        lines.extend(['# HELP sukkiri_db_pool_checkout_wait_seconds Time spent waiting for a pool connection.',
+                      '# TYPE sukkiri_db_pool_checkout_wait_seconds histogram'])
+        for bind, stats in binds:
+            wait = stats['checkout_wait']
+            lines.extend('sukkiri_db_pool_checkout_wait_seconds_bucket{{bind="{}",le="{}"}} {}'.format(
+                bind, bound, count) for bound, count in wait['buckets'].items())
+            lines.append('sukkiri_db_pool_checkout_wait_seconds_sum{{bind="{}"}} {}'.format(bind, wait['sum']))
+            lines.append('sukkiri_db_pool_checkout_wait_seconds_count{{bind="{}"}} {}'.format(bind, wait['count']))
+        for name in ('checked_out', 'overflow'):
+            samples = [(bind, stats[name]) for bind, stats in binds if name in stats]
+            if samples:
+                lines.append('# TYPE sukkiri_db_pool_{} gauge'.format(name))
+                lines.extend('sukkiri_db_pool_{}{{bind="{}"}} {}'.format(name, bind, value) for bind, value in samples)
+        for name in ('connects', 'checkouts', 'invalidations', 'timeouts'):
+            lines.append('# TYPE sukkiri_db_pool_{}_total counter'.format(name))
+            lines.extend('sukkiri_db_pool_{}_total{{bind="{}"}} {}'.format(name, bind, stats[name])
+                         for bind, stats in binds)
+
+    return '\n'.join(lines) + '\n'
+
+
+class SamplingProfiler(object):
+    # Samples the stack of every thread serving a request each `interval`
+    # seconds and keeps the collapsed stacks of the `keep` slowest requests
+    # (the flamegraph.pl "a;b;c count" format).
+
+    def __init__(self, interval, keep):
+        self.interval = interval
+        self.keep = keep
+        self._lock = threading.Lock()
+        self._samples = {}
+        self._slowest = []
+        self._sequence = 0
+        self._thread = None
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, samples in self._samples.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        samples[self._collapse(frame)] += 1
+
+    @staticmethod
+    def _collapse(frame, max_depth=64):
+        stack = []
+        while frame is not None and len(stack) < max_depth:
+            code = frame.f_code
+            stack.append('{}:{}:{}'.format(os.path.basename(code.co_filename), code.co_name, frame.f_lineno))
+            frame = frame.f_back
+        return ';'.join(reversed(stack))
+
+    def start_request(self):
+        # The sampling thread starts with the first request, not at import,
+        # so processes that import main without serving (the invoice
+        # workers, the CLI) do not run it.
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='sampling-profiler')
+                self._thread.daemon = True
+                self._thread.start()
+            self._samples[threading.get_ident()] = Counter()
+
+    def finish_request(self, route, method, path, seconds):
+        with self._lock:
+            samples = self._samples.pop(threading.get_ident(), None)
+            if not samples:
+                return
+            self._sequence += 1
+            profile = (seconds, self._sequence, {'route': route, 'method': method, 'path': path,
+                                                 'duration_ms': round(seconds * 1000, 2),
+                                                 'samples': sum(samples.values()),
+                                                 'stacks': ['{} {}'.format(stack, count)
+                                                            for stack, count in samples.most_common()]})
+            if len(self._slowest) < self.keep:
+                heapq.heappush(self._slowest, profile)
+            elif profile[0] > self._slowest[0][0]:
+                heapq.heapreplace(self._slowest, profile)
+
+    def slowest(self):
+        with self._lock:
+            return [profile for _, _, profile in sorted(self._slowest, reverse=True)]
+
+
+_profiler = None
+
+
+def init_instrumentation(app, profile_interval=0, profile_keep=20):
+    # profile_interval in seconds, 0 leaves the profiler off.
+    global _profiler
+    _profiler = SamplingProfiler(profile_interval, profile_keep) if profile_interval > 0 else None
+
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+
+
+def slowest_profiles():
+    return _profiler.slowest() if _profiler is not None else None
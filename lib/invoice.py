@@ -7,33 +7,24 @@ import datetime
 from io import BytesIO
 
 
-def generate_invoice(rma_cases, dist_company):
-    # Source: https://stackoverflow.com/questions/48863462/writing-full-csv-table-to-pdf-in-python
-    data = []
-    data.append(["ID", "BRAND", "MODEL", "PROBLEM", "SERIAL NUMBER"])
-    for rma_case in rma_cases:
-        row_data = [rma_case.id, rma_case.brand, rma_case.model, rma_case.problem, rma_case.serial_number]
-        data.append(row_data)
+HEADER_ROW = ["ID", "BRAND", "MODEL", "PROBLEM", "SERIAL NUMBER"]
 
-    elements = []
+# Rows per LongTable when rendering large invoices.
+LARGE_TABLE_CHUNK_ROWS = 100
 
-    # PDF Text
-    # PDF Text - Styles
-    styles = getSampleStyleSheet()
-    styleNormal = styles['Normal']
 
+def _header_elements(dist_company, styleNormal):
     # PDF Text - Content
     line1 = '<font size=10><b>MY COMPANY NAME</b></font>'
     line2 = '<b>DATE: {}</b>'.format(datetime.datetime.now().strftime("%d-%m-%y"))
     line3 = 'RMA INVOICE - <b>{}</b>'.format(dist_company.upper())
 
-    elements.append(Paragraph(line1, styleNormal))
-    elements.append(Paragraph(line2, styleNormal))
-    elements.append(Paragraph(line3, styleNormal))
-    elements.append(Spacer(inch, .25 * inch))
+    return [Paragraph(line1, styleNormal), Paragraph(line2, styleNormal), Paragraph(line3, styleNormal),
+            Spacer(inch, .25 * inch)]
 
-    # PDF Table
-    # PDF Table - Styles
+
+def _table_style(header=True):
+    # PDF Table - Styles. header=False for a table without the header row.
     # [(start_column, start_row), (end_column, end_row)]
     all_cells = [(0, 0), (-1, -1)]
     header = [(0, 0), (-1, 0)]
@@ -42,7 +33,17 @@ def generate_invoice(rma_cases, dist_company):
     column2 = [(2, 0), (2, -1)]
     column3 = [(3, 0), (3, -1)]
     column4 = [(4, 0), (4, -1)]
-    table_style = TableStyle([
+    if not header:
+        return TableStyle([
+            ('VALIGN', all_cells[0], all_cells[1], 'TOP'),
+            ('ALIGN', column0[0], column0[1], 'CENTRE'),
+            ('ALIGN', column1[0], column1[1], 'LEFT'),
+            ('ALIGN', column2[0], column2[1], 'LEFT'),
+            ('ALIGN', column3[0], column3[1], 'LEFT'),
+            ('ALIGN', column4[0], column4[1], 'CENTRE'),
+            ('GRID', all_cells[0], all_cells[1], 0.25, colors.black)
+        ])
+    return TableStyle([
         ('VALIGN', all_cells[0], all_cells[1], 'TOP'),
         ('FONTNAME', header[0], header[1], 'Courier-Bold'),
         ('LINEBELOW', header[0], header[1], 1.2, colors.black),
@@ -55,32 +56,22 @@ def generate_invoice(rma_cases, dist_company):
         ('GRID', (0, 1), (-1, -1), 0.25, colors.black)
     ])
 
-    # PDF Table - Column Widths
-    colWidths = [
-        1.5 * cm,  # Column 0
-        3 * cm,  # Column 1
-        4 * cm,  # Column 2
-        12 * cm,  # Column 4
-        6 * cm,  # Column 5
-    ]
 
-    # PDF Table - Strip '[]() and add word wrap to column 5
-    # count = 0
-    # for index, row in enumerate(data):
-    #     count += 1
-    #     for col, val in enumerate(row):
-    #         data[index][col] = Paragraph(val, styles['Normal'])
+# PDF Table - Column Widths
+TABLE_COL_WIDTHS = [
+    1.5 * cm,  # Column 0
+    3 * cm,  # Column 1
+    4 * cm,  # Column 2
+    12 * cm,  # Column 4
+    6 * cm,  # Column 5
+]
 
-    # Add table to elements
-    t = Table(data, colWidths=colWidths)
-    t.setStyle(table_style)
-    elements.append(t)
 
-    line4 = """<font size=12><b>Total: {}</b></font>""".format(len(data) - 1)
+def _footer_elements(total, styles):
+    styleNormal = styles['Normal']
+    line4 = """<font size=12><b>Total: {}</b></font>""".format(total)
 
-    elements.append(Spacer(inch, .30 * inch))
-    elements.append(Paragraph(line4, styleNormal))
-    elements.append(Spacer(inch, .30 * inch))
+    elements = [Spacer(inch, .30 * inch), Paragraph(line4, styleNormal), Spacer(inch, .30 * inch)]
 
     # Botton part of the file.
     colWidths = [9.5 * cm, 9.5 * cm]
@@ -98,18 +89,145 @@ def generate_invoice(rma_cases, dist_company):
                                        ('GRID', (0, 1), (-1, -1), 0.25, colors.black)])))
     elements.append(bottom_table)
 
-    lWidth, lHeight = A4
+    return elements
 
-    pdf_buffer = BytesIO()
 
-    # Generate PDF
-    archivo_pdf = SimpleDocTemplate(
-        pdf_buffer,
+def _document(output):
+    lWidth, lHeight = A4
+
+    return SimpleDocTemplate(
+        output,
         pagesize=(lHeight, lWidth),
         rightMargin=20,
         leftMargin=20,
         topMargin=40,
         bottomMargin=28)
-    archivo_pdf.build(elements)
+
+
+def generate_invoice(rma_cases, dist_company):
+    # Source: https://stackoverflow.com/questions/48863462/writing-full-csv-table-to-pdf-in-python
+    data = []
+    data.append(HEADER_ROW)
+    for rma_case in rma_cases:
+        row_data = [rma_case.id, rma_case.brand, rma_case.model, rma_case.problem, rma_case.serial_number]
+        data.append(row_data)
+
+    # PDF Text - Styles
+    styles = getSampleStyleSheet()
+    elements = _header_elements(dist_company, styles['Normal'])
+
+    # PDF Table - Strip '[]() and add word wrap to column 5
+    # count = 0
+    # for index, row in enumerate(data):
+    #     count += 1
+    #     for col, val in enumerate(row):
+    #         data[index][col] = Paragraph(val, styles['Normal'])
+
+    # Add table to elements
+    t = Table(data, colWidths=TABLE_COL_WIDTHS)
+    t.setStyle(_table_style())
+    elements.append(t)
+
+    elements.extend(_footer_elements(len(data) - 1, styles))
+
+    pdf_buffer = BytesIO()
+
+    # Generate PDF
+    _document(pdf_buffer).build(elements)
     pdf_buffer.seek(0)
     return pdf_buffer
+
+
+class _ChunkTable(Flowable):
+    # One chunk of the rows of a large invoice. It carries the header row
+    # only where a page starts: when it is the first chunk, when it is laid
+    # out at the top of a frame, and in the part of it a page break pushes to
+    # the next page. Anywhere else it continues the table above it.
+
+    def __init__(self, rows, first=False):
+        Flowable.__init__(self)
+        self._first = first
+        self._with_header = LongTable([HEADER_ROW] + rows, colWidths=TABLE_COL_WIDTHS, style=_table_style(),
+                                      repeatRows=1)
+        self._without_header = None if first else LongTable(rows, colWidths=TABLE_COL_WIDTHS,
+                                                            style=_table_style(header=False))
+        self._table = self._with_header
+
+    def _pick(self):
+        # The frame sets _frame before it wraps or splits a flowable.
+        frame = getattr(self, '_frame', None)
+        if self._first or frame is None or frame._atTop:
+            return self._with_header
+        return self._without_header
+
+    def wrap(self, availWidth, availHeight):
+        self._table = self._pick()
+        return self._table.wrap(availWidth, availHeight)
+
+    def split(self, availWidth, availHeight):
+        table = self._pick()
+        parts = table.splitOn(self.canv, availWidth, availHeight)
+        if table is self._with_header or len(parts) < 2:
+            # repeatRows puts the header on the rest.
+            return parts
+        return [parts[0], _ChunkTable(parts[1]._cellvalues, first=True)]
+
+    def drawOn(self, canvas, x, y, _sW=0):
+        self._table.drawOn(canvas, x, y, _sW)
+
+
+class _LazyStory(list):
+    # Story list that pulls flowables from an iterator only when the doc
+    # template looks at it, so just the table chunk being laid out (and the
+    # rows behind it) are alive at any moment.
+
+    def __init__(self, flowables):
+        list.__init__(self)
+        self._pending = iter(flowables)
+
+    def _fill(self):
+        while self._pending is not None and list.__len__(self) < 2:
+            try:
+                self.append(next(self._pending))
+            except StopIteration:
+                self._pending = None
+
+    def __len__(self):
+        self._fill()
+        return list.__len__(self)
+
+    def __getitem__(self, index):
+        self._fill()
+        return list.__getitem__(self, index)
+
+
+def _large_invoice_story(rma_cases, dist_company):
+    styles = getSampleStyleSheet()
+    for element in _header_elements(dist_company, styles['Normal']):
+        yield element
+
+    total = 0
+    chunk = []
+    for rma_case in rma_cases:
+        chunk.append([rma_case.id, rma_case.brand, rma_case.model, rma_case.problem, rma_case.serial_number])
+        if len(chunk) == LARGE_TABLE_CHUNK_ROWS:
+            yield _ChunkTable(chunk, first=not total)
+            total += len(chunk)
+            chunk = []
+
+    if chunk or not total:
+        yield _ChunkTable(chunk, first=not total)
+        total += len(chunk)
+
+    for element in _footer_elements(total, styles):
+        yield element
+
+
+def generate_large_invoice(rma_cases, dist_company, output):
+    # Same document as generate_invoice, but rma_cases can be any iterable
+    # (e.g. a streamed query) and is consumed while the PDF is laid out, in
+    # table chunks that read as a single table with the header row at the
+    # top of every page.
+    _document(output).build(_LazyStory(_large_invoice_story(rma_cases, dist_company)))
+    output.seek(0)
+    return output
@@ -0,0 +1,58 @@
+# invoice_cache.py
+import datetime
+import hashlib
+from threading import Lock
+
+from cachetools import LRUCache
+
+# Bounded by the total size of the cached PDFs, not by the number of them.
+_cache = LRUCache(maxsize=32 * 1024 * 1024, getsizeof=len)
+_lock = Lock()
+
+
+def init_invoice_cache(max_bytes):
+    global _cache
+    with _lock:
+        _cache = LRUCache(maxsize=max_bytes, getsizeof=len)
+
+
+def fingerprinted(dist_company, rows, digest):
+    # The rendered PDF depends on the company, today's date (printed in the
+    # header) and the content of every listed case, so any change to those
+    # produces a different key and ETag. The rows are hashed as they are
+    # consumed, so a render that streams them gets the fingerprint of what
+    # it actually printed.
+    digest.update(datetime.datetime.now().strftime('%d-%m-%y').encode('utf-8'))
+    digest.update(dist_company.encode('utf-8'))
+    for row in rows:
+        digest.update(repr(tuple(row)).encode('utf-8'))
+        yield row
+
+
+def invoice_fingerprint(dist_company, rows):
+    digest = hashlib.sha1()
+    for _ in fingerprinted(dist_company, rows, digest):
+        pass
+    return digest.hexdigest()
+
+
+def get_cached_invoice(dist_company_id, fingerprint):
+    with _lock:
+        return _cache.get((dist_company_id, fingerprint))
+
+
+def cache_invoice(dist_company_id, fingerprint, pdf):
+    with _lock:
+        try:
+            _cache[(dist_company_id, fingerprint)] = pdf
+        except ValueError:
+            # Larger than the whole cache, serve it without caching.
+            pass
+
+
+def invalidate_invoices(*dist_company_ids):
+    # Entries for outdated contents can never be hit again since the
+    # fingerprint changed, this just gives their memory back right away.
+    with _lock:
+        for key in [key for key in _cache if key[0] in dist_company_ids]:
+            del _cache[key]
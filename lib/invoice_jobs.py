@@ -0,0 +1,194 @@
+# invoice_jobs.py
+import datetime
+import hashlib
+import multiprocessing
+import uuid
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from threading import Lock
+
+from sqlalchemy import and_, create_engine, select
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.pool import NullPool
+
+from lib.invoice import generate_invoice, generate_large_invoice
+from lib.invoice_cache import fingerprinted
+from lib.models import InvoiceJob, RMACase, db
+
+InvoiceRow = namedtuple('InvoiceRow', ['id', 'brand', 'model', 'problem', 'serial_number'])
+INVOICE_COLUMNS = [RMACase.id, RMACase.brand, RMACase.model, RMACase.problem, RMACase.serial_number]
+
+# Jobs live in the invoice_jobs table, which every process reads, and are
+# always read and written on the primary: a job polled right after it was
+# started must be there. The worker process writes the outcome itself.
+FINISHED = ('done', 'failed')
+# A job still pending or running after this long lost its process (a
+# restarted instance, a killed worker) and counts as failed.
+STALE_SECONDS = 600
+
+_executor = None
+_max_workers = 2
+_max_jobs = 100
+_app = None
+_lock = Lock()
+# One engine per database in each worker process.
+_engines = {}
+
+
+def init_invoice_jobs(app, max_workers, max_jobs):
+    global _app, _max_workers, _max_jobs
+    _app = app
+    _max_workers = max_workers
+    _max_jobs = max_jobs
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            # Spawned rather than forked so the workers never inherit the
+            # app's open database connections.
+            _executor = ProcessPoolExecutor(max_workers=_max_workers,
+                                            mp_context=multiprocessing.get_context('spawn'))
+        return _executor
+
+
+def invoice_criteria(dist_company_id):
+    # The cases listed on a company's invoice.
+    return [RMACase.distribution_company_id == dist_company_id, RMACase.status == 'to_be_revised']
+
+
+def _finish(connection, job_id, **values):
+    jobs = InvoiceJob.__table__
+    if values['status'] == 'failed':
+        values['live'] = None
+    connection.execute(jobs.update().where(jobs.c.id == job_id).where(jobs.c.status.notin_(FINISHED)).values(
+        finished_at=datetime.datetime.now(), **values))
+
+
+def render_invoice(database_uri, job_id, dist_company_id, dist_company, large):
+    # Runs in a worker process, which reads the rows itself: nothing but the
+    # ids crosses the process boundary. A large invoice streams them
+    # (server-side cursor) into the chunked renderer.
+    if database_uri not in _engines:
+        _engines[database_uri] = create_engine(database_uri, poolclass=NullPool)
+    jobs = InvoiceJob.__table__
+
+    with _engines[database_uri].connect() as connection:
+        connection.execute(jobs.update().where(jobs.c.id == job_id).values(status='running'))
+        digest = hashlib.sha1()
+        result = connection.execution_options(stream_results=True).execute(
+            select(INVOICE_COLUMNS).where(and_(*invoice_criteria(dist_company_id))).order_by(RMACase.id))
+        try:
+            rows = (InvoiceRow(*row) for row in fingerprinted(dist_company, result, digest))
+            if large:
+                pdf = generate_large_invoice(rows, dist_company, BytesIO()).getvalue()
+            else:
+                pdf = generate_invoice(list(rows), dist_company).getvalue()
+        except Exception:
+            result.close()
+            _finish(connection, job_id, status='failed')
+            raise
+        result.close()
+        # The fingerprint of what was rendered, in case the cases changed
+        # since the job was submitted. The submitted one stays, it is what
+        # the requests for these contents look the job up by.
+        _finish(connection, job_id, status='done', pdf=pdf, rendered_fingerprint=digest.hexdigest())
+
+
+def _job_ended(job_id, future):
+    # The worker records its own outcome, unless it died before it could.
+    if future.exception() is None:
+        return
+    with _app.app_context():
+        with db.engine.connect() as connection:
+            _finish(connection, job_id, status='failed')
+
+
+def _prune(connection):
+    # Keeps the newest max_jobs finished jobs. Unfinished ones are never
+    # dropped, the stale ones go with the finished.
+    jobs = InvoiceJob.__table__
+    cutoff = connection.execute(jobs.select().with_only_columns([jobs.c.created_at]).where(
+        jobs.c.status.in_(FINISHED)).order_by(jobs.c.created_at.desc()).offset(_max_jobs).limit(1)).scalar()
+    if cutoff is not None:
+        connection.execute(jobs.delete().where(jobs.c.status.in_(FINISHED)).where(jobs.c.created_at <= cutoff))
+    stale = datetime.datetime.now() - datetime.timedelta(seconds=STALE_SECONDS)
+    connection.execute(jobs.delete().where(jobs.c.status.notin_(FINISHED)).where(jobs.c.created_at < stale))
+
+
+def submit_invoice_job(dist_company_id, dist_company, fingerprint, row_count, large=False):
+    jobs = InvoiceJob.__table__
+    key = and_(jobs.c.distribution_company_id == dist_company_id, jobs.c.fingerprint == fingerprint)
+    job_id = uuid.uuid4().hex
+    now = datetime.datetime.now()
+    with db.engine.connect() as connection:
+        # A job its process left unfinished gives way to a new one.
+        connection.execute(jobs.update().where(key).where(jobs.c.status.notin_(FINISHED)).where(
+            jobs.c.created_at < now - datetime.timedelta(seconds=STALE_SECONDS)).values(
+            status='failed', live=None, finished_at=now))
+
+        # Identical contents share a single job, whichever process submits
+        # it: the unique key lets a single live job in, and every request
+        # gets that one. Committed before the worker gets it, so it has a row
+        # to update.
+        values = dict(id=job_id, distribution_company_id=dist_company_id, dist_company=dist_company,
+                      fingerprint=fingerprint, rows=row_count, status='pending', live=True, created_at=now)
+        if connection.dialect.name == 'mysql':
+            stmt = mysql_insert(jobs).values(**values)
+            connection.execute(stmt.on_duplicate_key_update(id=jobs.c.id))
+        else:
+            try:
+                connection.execute(jobs.insert().values(**values))
+            except IntegrityError:
+                pass
+
+        live_id = connection.execute(select([jobs.c.id]).where(key).where(jobs.c.live.is_(True))).scalar()
+        if live_id is None:
+            # It failed in the meantime.
+            return submit_invoice_job(dist_company_id, dist_company, fingerprint, row_count, large)
+        if live_id != job_id:
+            return live_id
+        _prune(connection)
+
+    future = _get_executor().submit(render_invoice, _app.config['SQLALCHEMY_DATABASE_URI'], job_id,
+                                    dist_company_id, dist_company, large)
+    future.add_done_callback(lambda f: _job_ended(job_id, f))
+    return job_id
+
+
+def get_invoice_job(job_id):
+    # The job as a dict, without the PDF. None for unknown (or pruned) ids.
+    jobs = InvoiceJob.__table__
+    with db.engine.connect() as connection:
+        row = connection.execute(jobs.select().with_only_columns(
+            [jobs.c.id, jobs.c.distribution_company_id, jobs.c.dist_company, jobs.c.fingerprint,
+             jobs.c.rendered_fingerprint, jobs.c.rows, jobs.c.status, jobs.c.created_at]).where(
+            jobs.c.id == job_id)).first()
+    return dict(row) if row is not None else None
+
+
+def invoice_job_status(job):
+    if job['status'] not in FINISHED and \
+            datetime.datetime.now() - job['created_at'] > datetime.timedelta(seconds=STALE_SECONDS):
+        return 'failed'
+    return job['status']
+
+
+def invoice_job_pdf(job):
+    jobs = InvoiceJob.__table__
+    with db.engine.connect() as connection:
+        return connection.execute(jobs.select().with_only_columns([jobs.c.pdf]).where(
+            jobs.c.id == job['id'])).scalar()
+
+
+def finished_invoice_pdf(dist_company_id, fingerprint):
+    # (PDF, fingerprint of what it shows) of a finished job submitted for
+    # these contents, from any process. None when there is none.
+    jobs = InvoiceJob.__table__
+    with db.engine.connect() as connection:
+        return connection.execute(jobs.select().with_only_columns([jobs.c.pdf, jobs.c.rendered_fingerprint]).where(
+            jobs.c.distribution_company_id == dist_company_id).where(jobs.c.fingerprint == fingerprint).where(
+            jobs.c.status == 'done').limit(1)).first()
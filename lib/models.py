@@ -1,7 +1,10 @@
 # models.py
-from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import DDL, event
+from sqlalchemy.dialects.mysql import LONGBLOB
 
-db = SQLAlchemy()
+from lib.replica import RoutingSQLAlchemy
+
+db = RoutingSQLAlchemy()
 
 
 class User(db.Model):
@@ -27,6 +30,9 @@ class DistributionCompany(db.Model):
     hours = db.Column(db.String(20))
     contact_name = db.Column(db.String(60))
     phone = db.Column(db.String(60))
+    # Table version of the last write, see lib/sync.py.
+    revision = db.Column(db.Integer, index=True)
+    updated_at = db.Column(db.DateTime)
 
 
 class Product(db.Model):
@@ -41,29 +47,161 @@ class Product(db.Model):
     description = db.Column(db.Text)
     stock = db.Column(db.Integer, default=0)
     stock_under_control = db.Column(db.Boolean)
-    distribution_company = db.Column(db.String(120))
-    ean = db.Column(db.String(20))
+    distribution_company_id = db.Column(db.Integer, db.ForeignKey('dist_companies.id'), index=True)
+    ean = db.Column(db.String(20), index=True)
+    # Table version of the last write, see lib/sync.py.
+    revision = db.Column(db.Integer, index=True)
+    updated_at = db.Column(db.DateTime)
+
+
+# FULLTEXT index for the product search. Only MySQL has it, so it is created
+# with DDL instead of a db.Index, which every dialect would get.
+PRODUCT_SEARCH_INDEX = 'ft_products_search'
+
+event.listen(Product.__table__, 'after_create', DDL(
+    'CREATE FULLTEXT INDEX {} ON products (brand, model, description)'.format(PRODUCT_SEARCH_INDEX)
+).execute_if(dialect='mysql'))
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    # Keeps autogenerate from dropping the FULLTEXT index, as it is not part
+    # of the metadata.
+    return not (type_ == 'index' and name == PRODUCT_SEARCH_INDEX)
 
 
 class RMACase(db.Model):
     __tablename__ = 'rma_cases'
+    __table_args__ = (
+        db.Index('ix_rma_cases_distribution_company_id_status', 'distribution_company_id', 'status'),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     brand = db.Column(db.String(60))
     model = db.Column(db.String(60))
     problem = db.Column(db.Text)
     serial_number = db.Column(db.String(120))
-    distribution_company = db.Column(db.String(60), index=True)
-    status = db.Column(db.String(60), default="to_be_revised")
-    to_be_revised_date = db.Column(db.String(60))
-    to_be_revised_by = db.Column(db.String(60))
-    to_be_sent_date = db.Column(db.String(18))
-    to_be_sent_by = db.Column(db.String(60))
-    sent_date = db.Column(db.String(18))
-    sent_by = db.Column(db.String(60))
-    returned_date = db.Column(db.String(18))
-    returned_by = db.Column(db.String(60))
-    resolved_date = db.Column(db.String(18))
-    resolved_by = db.Column(db.String(60))
-    unresolved_date = db.Column(db.String(18))
-    unresolved_by = db.Column(db.String(60))
+    distribution_company_id = db.Column(db.Integer, db.ForeignKey('dist_companies.id'))
+    # Current status, the previous ones are in rma_status_events.
+    status = db.Column(db.String(60), default="to_be_revised", index=True)
+
+
+class RMAStatusEvent(db.Model):
+    # Every status an RMA case went into, see lib/history.py. Ids follow the
+    # order of the transitions.
+    __tablename__ = 'rma_status_events'
+    __table_args__ = (
+        db.Index('ix_rma_status_events_case_id_status', 'case_id', 'status'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    case_id = db.Column(db.Integer, db.ForeignKey('rma_cases.id'), nullable=False)
+    status = db.Column(db.String(60), nullable=False)
+    at = db.Column(db.DateTime, nullable=False)
+    # Not a foreign key, users can be deleted. Their name at the time is
+    # kept, and is all the rows from before this table have.
+    user_id = db.Column(db.Integer)
+    user_name = db.Column(db.String(121))
+
+
+class RMAStatusDate(db.Model):
+    # Last time each case went into each status, kept next to the events by
+    # lib/history.py. The <status>_date fields, and their filters and sort
+    # orders, read it through the (status, at) index.
+    __tablename__ = 'rma_status_dates'
+    __table_args__ = (
+        db.Index('ix_rma_status_dates_status_at_case_id', 'status', 'at', 'case_id'),
+    )
+
+    case_id = db.Column(db.Integer, db.ForeignKey('rma_cases.id'), primary_key=True, autoincrement=False)
+    status = db.Column(db.String(60), primary_key=True)
+    at = db.Column(db.DateTime, nullable=False)
+    user_name = db.Column(db.String(121))
+
+
+class RMACaseCount(db.Model):
+    __tablename__ = 'rma_case_counts'
+
+    # 0 for the cases without a distribution company.
+    distribution_company_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    status = db.Column(db.String(60), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+
+class RMACaseEvent(db.Model):
+    # Change feed behind /api/rma_cases/stream, see lib/events.py. Ids must
+    # never be reused since clients resume from them, hence AUTOINCREMENT on
+    # SQLite (InnoDB never reuses them).
+    __tablename__ = 'rma_case_events'
+    __table_args__ = {'sqlite_autoincrement': True}
+
+    id = db.Column(db.Integer, primary_key=True)
+    case_id = db.Column(db.Integer, nullable=False)
+    type = db.Column(db.String(20), nullable=False)
+    status = db.Column(db.String(60))
+    # Not a foreign key, events outlive the company.
+    distribution_company_id = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, nullable=False, index=True)
+
+
+class Tombstone(db.Model):
+    # Deleted products and distribution companies, for the changes feeds.
+    __tablename__ = 'tombstones'
+    __table_args__ = (
+        db.Index('ix_tombstones_table_name_revision', 'table_name', 'revision'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    table_name = db.Column(db.String(60), nullable=False)
+    row_id = db.Column(db.Integer, nullable=False)
+    revision = db.Column(db.Integer, nullable=False)
+    deleted_at = db.Column(db.DateTime, nullable=False)
+
+
+class TableVersion(db.Model):
+    # Bumped by every write to the named table, see lib/versions.py.
+    __tablename__ = 'table_versions'
+
+    name = db.Column(db.String(60), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+
+class StockMovement(db.Model):
+    # Append-only log of stock adjustments. product_id is not a foreign key,
+    # so the history outlives deleted products.
+    __tablename__ = 'stock_movements'
+
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, nullable=False, index=True)
+    delta = db.Column(db.Integer, nullable=False)
+    stock = db.Column(db.Integer, nullable=False)
+    reason = db.Column(db.String(120))
+    user_id = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime, nullable=False, index=True)
+
+
+class InvoiceJob(db.Model):
+    # Background invoice renders, see lib/invoice_jobs.py. Kept in the
+    # database so any process can answer for a job another one started.
+    __tablename__ = 'invoice_jobs'
+    __table_args__ = (
+        db.UniqueConstraint('distribution_company_id', 'fingerprint', 'live',
+                            name='uq_invoice_jobs_distribution_company_id_fingerprint_live'),
+    )
+
+    id = db.Column(db.String(32), primary_key=True)
+    distribution_company_id = db.Column(db.Integer, nullable=False)
+    dist_company = db.Column(db.String(60), nullable=False)
+    # What the job was submitted for, the key requests find it by.
+    fingerprint = db.Column(db.String(40), nullable=False)
+    # What the worker actually rendered, the ETag of its PDF.
+    rendered_fingerprint = db.Column(db.String(40))
+    # True while pending, running or done, NULL once failed. The unique key
+    # allows any number of NULLs, so there is at most one live job for given
+    # contents while failed ones can be retried.
+    live = db.Column(db.Boolean, default=True)
+    rows = db.Column(db.Integer, nullable=False)
+    status = db.Column(db.String(20), nullable=False)
+    # A plain BLOB tops out at 64KB on MySQL.
+    pdf = db.Column(db.LargeBinary().with_variant(LONGBLOB(), 'mysql'))
+    created_at = db.Column(db.DateTime, nullable=False, index=True)
+    finished_at = db.Column(db.DateTime)
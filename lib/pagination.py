@@ -0,0 +1,100 @@
+# pagination.py
+import datetime
+
+from sqlalchemy import DateTime, and_, or_
+
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+
+# With the microseconds: many rows can share a second (a batch transition
+# stamps all of them with the same time), and a truncated cursor would sort
+# before every one of them and hand the same page out again.
+CURSOR_DATE_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+# Cursors handed out before the microseconds were added.
+OLD_CURSOR_DATE_FORMAT = '%Y-%m-%dT%H:%M:%S'
+
+
+class QueryArgsError(ValueError):
+    pass
+
+
+def page_limit(args, default=DEFAULT_LIMIT, maximum=MAX_LIMIT):
+    try:
+        limit = int(args.get('limit', default))
+    except ValueError:
+        raise QueryArgsError('limit must be an integer!')
+
+    if limit < 1:
+        raise QueryArgsError('limit must be greater than zero!')
+
+    return min(limit, maximum)
+
+
+def _encode_cursor(values):
+    return ','.join(value.strftime(CURSOR_DATE_FORMAT) if isinstance(value, datetime.datetime) else str(value)
+                    for value in values)
+
+
+def _decode_date(part):
+    try:
+        return datetime.datetime.strptime(part, CURSOR_DATE_FORMAT)
+    except ValueError:
+        return datetime.datetime.strptime(part, OLD_CURSOR_DATE_FORMAT)
+
+
+def _decode_cursor(cursor, columns):
+    parts = cursor.split(',')
+    if len(parts) != len(columns):
+        raise QueryArgsError('Invalid cursor!')
+
+    try:
+        return [_decode_date(part) if isinstance(column.type, DateTime) else int(part)
+                for part, column in zip(parts, columns)]
+    except ValueError:
+        raise QueryArgsError('Invalid cursor!')
+
+
+def _after(columns, values, descending):
+    def beyond(column, value):
+        return column < value if descending else column > value
+
+    if len(columns) == 1:
+        return beyond(columns[0], values[0])
+
+    # (sort, key) > (sort_value, key_value), spelled out so every database
+    # can use the index on the sort column.
+    return or_(beyond(columns[0], values[0]), and_(columns[0] == values[0], beyond(columns[1], values[1])))
+
+
+def paginate(query, key_column, args, sort_column=None, descending=False):
+    # Keyset pagination: the cursor holds the sort values of the last row of
+    # the previous page, so every page is an index range scan no matter how
+    # deep the client goes. Ordering by another column uses (column, key) as
+    # the keyset and leaves out the rows where that column is NULL. Requests
+    # with neither limit nor after get every row and no cursor, as they did
+    # before the lists were paginated.
+    paged = 'limit' in args or bool(args.get('after'))
+    limit = page_limit(args) if paged else None
+
+    if sort_column is None or sort_column is key_column:
+        columns = [key_column]
+    else:
+        columns = [sort_column, key_column]
+        query = query.filter(sort_column.isnot(None))
+
+    if args.get('after'):
+        query = query.filter(_after(columns, _decode_cursor(args['after'], columns), descending))
+
+    query = query.order_by(*[column.desc() if descending else column for column in columns])
+    if not paged:
+        return query.all(), None
+
+    # Fetch one extra row to know whether there is a next page.
+    rows = query.limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = _encode_cursor([getattr(rows[-1], column.key) for column in columns])
+
+    return rows, next_cursor
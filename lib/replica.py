@@ -0,0 +1,83 @@
+# replica.py
+import time
+from functools import wraps
+
+from flask import current_app, g, has_app_context, has_request_context, request
+from flask_sqlalchemy import SignallingSession, SQLAlchemy, get_state
+from sqlalchemy import event, orm
+
+from lib.db_pool import watch_engine
+
+REPLICA_BIND = 'replica'
+
+# Read-your-writes: a response to a request that committed a write tells
+# the client when (cookie, and header for clients without cookies), and the
+# client's reads stay on the primary for sticky_seconds after that, until
+# the replica has caught up. The client carries it, so it works whichever
+# process or instance serves the next request.
+WROTE_AT_COOKIE = 'sukkiri_wrote_at'
+WROTE_AT_HEADER = 'X-Sukkiri-Wrote-At'
+
+_sticky_seconds = 10
+
+
+def init_replica(app, sticky_seconds):
+    global _sticky_seconds
+    _sticky_seconds = sticky_seconds
+    app.after_request(_send_wrote_at)
+
+
+def _send_wrote_at(response):
+    if g.get('wrote_at') is not None:
+        value = '{:.3f}'.format(g.wrote_at)
+        response.set_cookie(WROTE_AT_COOKIE, value, max_age=_sticky_seconds, httponly=True)
+        response.headers[WROTE_AT_HEADER] = value
+    return response
+
+
+def _wrote_recently():
+    value = request.headers.get(WROTE_AT_HEADER) or request.cookies.get(WROTE_AT_COOKIE)
+    try:
+        return time.time() - float(value) < _sticky_seconds
+    except (TypeError, ValueError):
+        return False
+
+
+class RoutingSession(SignallingSession):
+    # Sends every statement of a read_only request to the replica bind.
+    # Writes, and anything flushed, always go to the primary.
+
+    def get_bind(self, mapper=None, clause=None):
+        if has_app_context() and g.get('use_replica') and not self._flushing:
+            return get_state(self.app).db.get_engine(self.app, bind=REPLICA_BIND)
+        return super(RoutingSession, self).get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+    def create_engine(self, sa_url, engine_opts):
+        # The pool of every bind is instrumented, see lib/db_pool.py.
+        engine = super(RoutingSQLAlchemy, self).create_engine(sa_url, engine_opts)
+        watch_engine(engine)
+        return engine
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _remember_write(session):
+    if has_request_context():
+        g.wrote_at = time.time()
+
+
+def read_only(f):
+    # For handlers that only read. Goes below token_required, which passes
+    # the current user as the first argument, and above any decorator that
+    # queries (like versioned) so all the reads hit the same database.
+    @wraps(f)
+    def decorated(current_user, *args, **kwargs):
+        if REPLICA_BIND in (current_app.config.get('SQLALCHEMY_BINDS') or {}):
+            g.use_replica = not _wrote_recently()
+        return f(current_user, *args, **kwargs)
+
+    return decorated
@@ -0,0 +1,184 @@
+# search.py
+import re
+import time
+from bisect import bisect_left
+from collections import defaultdict
+from threading import Lock
+
+from sqlalchemy import Float, case, or_, text, type_coerce
+
+from lib.models import Product, db
+
+DEFAULT_LIMIT = 20
+MAX_LIMIT = 100
+
+# brand and model matches rank above description matches, exact tokens
+# above prefixes.
+FIELD_WEIGHTS = (('brand', 3.0), ('model', 3.0), ('description', 1.0))
+PREFIX_FACTOR = 0.5
+
+MYSQL_MATCH = 'MATCH (products.brand, products.model, products.description) AGAINST (:terms IN BOOLEAN MODE)'
+# innodb_ft_min_token_size, read from the server on the first search.
+_min_token_size = None
+
+
+def tokenize(value):
+    return re.findall(r'\w+', (value or '').lower())
+
+
+class ProductIndex(object):
+    # In-process inverted index over brand, model and description, used when
+    # the database has no FULLTEXT support. It is loaded on the first search,
+    # kept current by the product handlers of this process, and reloaded
+    # every `ttl` seconds to pick up writes made by other processes.
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self._lock = Lock()
+        self._loaded_at = None
+        self._documents = {}
+        self._postings = defaultdict(set)
+        self._sorted_tokens = None
+
+    def _add(self, product_id, brand, model, description):
+        document = {'brand': set(tokenize(brand)), 'model': set(tokenize(model)),
+                    'description': set(tokenize(description))}
+        self._documents[product_id] = document
+        for tokens in document.values():
+            for token in tokens:
+                self._postings[token].add(product_id)
+        self._sorted_tokens = None
+
+    def _remove(self, product_id):
+        document = self._documents.pop(product_id, None)
+        if document is None:
+            return
+        for tokens in document.values():
+            for token in tokens:
+                postings = self._postings.get(token)
+                if postings is not None:
+                    postings.discard(product_id)
+                    if not postings:
+                        del self._postings[token]
+        self._sorted_tokens = None
+
+    def _load(self):
+        self._documents = {}
+        self._postings = defaultdict(set)
+        for product_id, brand, model, description in db.session.query(
+                Product.id, Product.brand, Product.model, Product.description):
+            self._add(product_id, brand, model, description)
+        self._loaded_at = time.time()
+
+    def _ensure_loaded(self):
+        if self._loaded_at is None or time.time() - self._loaded_at > self.ttl:
+            self._load()
+
+    def _matching_tokens(self, token):
+        if self._sorted_tokens is None:
+            self._sorted_tokens = sorted(self._postings)
+        index = bisect_left(self._sorted_tokens, token)
+        while index < len(self._sorted_tokens) and self._sorted_tokens[index].startswith(token):
+            yield self._sorted_tokens[index]
+            index += 1
+
+    def search(self, query, limit):
+        terms = tokenize(query)
+        if not terms:
+            return []
+
+        with self._lock:
+            self._ensure_loaded()
+
+            scores = None
+            for term in terms:
+                term_scores = defaultdict(float)
+                for token in self._matching_tokens(term):
+                    factor = 1.0 if token == term else PREFIX_FACTOR
+                    for product_id in self._postings[token]:
+                        document = self._documents[product_id]
+                        score = sum(weight for field, weight in FIELD_WEIGHTS if token in document[field]) * factor
+                        term_scores[product_id] = max(term_scores[product_id], score)
+
+                # Every term has to match (AND), like the '+' terms on MySQL.
+                if scores is None:
+                    scores = term_scores
+                else:
+                    scores = {product_id: scores[product_id] + score for product_id, score in term_scores.items()
+                              if product_id in scores}
+                if not scores:
+                    return []
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:limit]
+
+    def update(self, product_id, brand, model, description):
+        with self._lock:
+            if self._loaded_at is not None:
+                self._remove(product_id)
+                self._add(product_id, brand, model, description)
+
+    def remove(self, product_id):
+        with self._lock:
+            if self._loaded_at is not None:
+                self._remove(product_id)
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = None
+
+
+product_index = ProductIndex()
+
+
+def init_search_index(ttl):
+    product_index.ttl = ttl
+
+
+def _word_prefix(column, term):
+    # term at the start of a word of column. Case insensitive with MySQL's
+    # default collations, like MATCH.
+    pattern = term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    return or_(column.like(pattern + '%', escape='\\'), column.like('% ' + pattern + '%', escape='\\'))
+
+
+def _prefix_score(term):
+    # Weighted like the in-process index, for a prefix match.
+    return sum(case([(_word_prefix(getattr(Product, field), term), weight * PREFIX_FACTOR)], else_=0)
+               for field, weight in FIELD_WEIGHTS)
+
+
+def search_products(query, limit):
+    # Returns (product_id, score) pairs, best match first.
+    if db.engine.dialect.name != 'mysql':
+        return product_index.search(query, limit)
+
+    terms = tokenize(query)
+    if not terms:
+        return []
+
+    global _min_token_size
+    if _min_token_size is None:
+        _min_token_size = int(db.session.execute('SELECT @@innodb_ft_min_token_size').scalar())
+
+    rows = _mysql_query(terms, _min_token_size, limit)
+    return [(product_id, float(score)) for product_id, score in rows]
+
+
+def _mysql_query(terms, min_token_size, limit):
+    # Boolean mode with every term required and prefix-matched. Terms shorter
+    # than innodb_ft_min_token_size are not in the FULLTEXT index and would
+    # never match ("HP", a 2 character model prefix), so those are matched
+    # at the start of a word with LIKE instead.
+    indexed = [term for term in terms if len(term) >= min_token_size]
+    short = [term for term in terms if len(term) < min_token_size]
+
+    score = sum(_prefix_score(term) for term in short)
+    query = db.session.query(Product.id)
+    if indexed:
+        score = type_coerce(text(MYSQL_MATCH), Float) + score
+        query = query.filter(text(MYSQL_MATCH)).params(terms=' '.join('+{}*'.format(term) for term in indexed))
+    for term in short:
+        query = query.filter(or_(*[_word_prefix(getattr(Product, field), term) for field, _ in FIELD_WEIGHTS]))
+
+    return query.add_columns(score).order_by(score.desc(), Product.id).limit(limit)
@@ -0,0 +1,105 @@
+# serializers.py
+from collections import OrderedDict
+
+from sqlalchemy import DateTime
+
+from lib.history import STATUS_DATES, STATUS_JOINS, STATUS_USERS, STATUSES
+from lib.instrumentation import phase
+from lib.models import DistributionCompany, Product, RMACase, RMAStatusEvent, User, db
+from lib.pagination import QueryArgsError
+
+
+# Format the API has always used for dates.
+DATE_FORMAT = '%d-%m-%Y %H:%M'
+
+
+def _format_date(value):
+    return value.strftime(DATE_FORMAT) if value is not None else None
+
+
+class Serializer(object):
+    # Selects only the requested columns and turns the resulting row tuples
+    # into dicts, so no ORM instances are built and nothing lands in the
+    # session identity map. Fields from other tables come from LEFT JOINs
+    # (joins: field -> (table, onclause)), only added when selected.
+
+    def __init__(self, key, columns, joins=None):
+        self.key = key
+        self.columns = OrderedDict((column.key, column) for column in columns)
+        self.formatters = {column.key: _format_date for column in columns if isinstance(column.type, DateTime)}
+        self.joins = joins or {}
+
+    def parse_fields(self, args):
+        if not args.get('fields'):
+            return list(self.columns)
+
+        fields = [field.strip() for field in args['fields'].split(',') if field.strip()]
+        unknown = [field for field in fields if field not in self.columns]
+        if unknown:
+            raise QueryArgsError('Unknown fields: {}'.format(', '.join(unknown)))
+
+        return fields
+
+    def query(self, fields, sort_column=None):
+        columns = [self.columns[field] for field in fields]
+        selected = list(fields)
+        # The key and sort columns are always selected because pagination
+        # needs them.
+        for column in (self.key, sort_column):
+            if column is not None and column.key not in selected:
+                columns.append(column)
+                selected.append(column.key)
+
+        query = db.session.query(*columns)
+        # Several fields can come from the same join, it is added once.
+        joins = OrderedDict((self.joins[field][0], self.joins[field][1]) for field in selected if field in self.joins)
+        if joins:
+            query = query.select_from(self.key.class_)
+            for table, onclause in joins.items():
+                query = query.outerjoin(table, onclause)
+        return query
+
+    def to_dict(self, row, fields):
+        data = dict(zip(fields, row))
+        for field, formatter in self.formatters.items():
+            if field in data:
+                data[field] = formatter(data[field])
+        return data
+
+    def to_dicts(self, rows, fields):
+        with phase('serialize'):
+            return [self.to_dict(row, fields) for row in rows]
+
+
+# The company name is still part of the output, joined from its id, and so
+# are the <status>_date / <status>_by fields, from the status history.
+rma_case_joins = {'distribution_company': (DistributionCompany,
+                                           RMACase.distribution_company_id == DistributionCompany.id)}
+for status in STATUSES:
+    rma_case_joins[status + '_date'] = rma_case_joins[status + '_by'] = STATUS_JOINS[status]
+
+rma_case_serializer = Serializer(RMACase.id, [
+    RMACase.id, RMACase.brand, RMACase.model, RMACase.problem, RMACase.serial_number,
+    DistributionCompany.name.label('distribution_company'), RMACase.distribution_company_id, RMACase.status,
+] + [column for status in STATUSES for column in (STATUS_DATES[status], STATUS_USERS[status])],
+    joins=rma_case_joins)
+
+dist_company_serializer = Serializer(DistributionCompany.id, [
+    DistributionCompany.id, DistributionCompany.name, DistributionCompany.email, DistributionCompany.address,
+    DistributionCompany.hours, DistributionCompany.contact_name, DistributionCompany.phone,
+    DistributionCompany.revision, DistributionCompany.updated_at,
+])
+
+product_serializer = Serializer(Product.id, [
+    Product.id, Product.brand, Product.model, Product.description, Product.stock, Product.stock_under_control,
+    DistributionCompany.name.label('distribution_company'), Product.distribution_company_id, Product.ean,
+    Product.revision, Product.updated_at,
+], joins={'distribution_company': (DistributionCompany, Product.distribution_company_id == DistributionCompany.id)})
+
+rma_status_event_serializer = Serializer(RMAStatusEvent.id, [
+    RMAStatusEvent.status, RMAStatusEvent.at, RMAStatusEvent.user_id, RMAStatusEvent.user_name.label('by'),
+])
+
+user_serializer = Serializer(User.id, [
+    User.public_id, User.username, User.first_name, User.last_name, User.email, User.role,
+])
@@ -0,0 +1,93 @@
+# stats.py
+from collections import Counter
+from threading import Lock
+
+from cachetools import TTLCache
+from sqlalchemy import func
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+
+from lib.models import DistributionCompany, Product, RMACase, RMACaseCount, db
+
+# Other processes update the counters too, so cached results only live for
+# a few seconds even if this process never writes.
+_cache = TTLCache(maxsize=2, ttl=5)
+_lock = Lock()
+
+
+def init_stats_cache(ttl):
+    global _cache
+    with _lock:
+        _cache = TTLCache(maxsize=2, ttl=ttl)
+
+
+def _bump(dist_company_id, status, delta):
+    dist_company_id = dist_company_id or 0
+
+    if db.engine.dialect.name == 'mysql':
+        stmt = mysql_insert(RMACaseCount.__table__).values(distribution_company_id=dist_company_id, status=status,
+                                                           count=delta)
+        db.session.execute(stmt.on_duplicate_key_update(count=RMACaseCount.__table__.c.count + stmt.inserted.count))
+        return
+
+    updated = db.session.query(RMACaseCount).filter_by(distribution_company_id=dist_company_id,
+                                                       status=status).update(
+        {RMACaseCount.count: RMACaseCount.count + delta}, synchronize_session=False)
+    if not updated:
+        db.session.execute(RMACaseCount.__table__.insert().values(distribution_company_id=dist_company_id,
+                                                                  status=status, count=delta))
+
+
+def count_cases(changes):
+    # changes: iterable of (distribution_company_id, status, delta), applied
+    # in the caller's transaction so the counters commit together with the
+    # cases.
+    totals = Counter()
+    for dist_company_id, status, delta in changes:
+        totals[(dist_company_id or 0, status)] += delta
+
+    for (dist_company_id, status), delta in sorted(totals.items()):
+        if delta:
+            _bump(dist_company_id, status, delta)
+
+
+def rebuild_case_counts():
+    db.session.query(RMACaseCount).delete(synchronize_session=False)
+    rows = db.session.query(func.coalesce(RMACase.distribution_company_id, 0), RMACase.status,
+                            func.count(RMACase.id)).group_by(RMACase.distribution_company_id, RMACase.status).all()
+    if rows:
+        db.session.execute(RMACaseCount.__table__.insert(),
+                           [{'distribution_company_id': dist_company_id, 'status': status, 'count': count}
+                            for dist_company_id, status, count in rows])
+    return len(rows)
+
+
+def _cached(key, load):
+    with _lock:
+        value = _cache.get(key)
+    if value is None:
+        value = load()
+        with _lock:
+            _cache[key] = value
+    return value
+
+
+def get_case_counts():
+    # Renaming a company invalidates these, as they carry its name.
+    return _cached('rma_cases', lambda: [
+        {'distribution_company_id': dist_company_id or None, 'distribution_company': dist_company or '',
+         'status': status, 'count': count}
+        for dist_company_id, dist_company, status, count in db.session.query(
+            RMACaseCount.distribution_company_id, DistributionCompany.name, RMACaseCount.status,
+            RMACaseCount.count).outerjoin(
+            DistributionCompany, RMACaseCount.distribution_company_id == DistributionCompany.id).filter(
+            RMACaseCount.count != 0)])
+
+
+def get_product_count():
+    return _cached('products', lambda: db.session.query(func.count(Product.id)).scalar())
+
+
+def invalidate_stats(*keys):
+    with _lock:
+        for key in keys:
+            _cache.pop(key, None)
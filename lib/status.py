@@ -0,0 +1,63 @@
+# status.py
+from collections import namedtuple
+
+from lib.events import record_case_events
+from lib.history import record_status_events
+from lib.models import RMACase, db
+from lib.stats import count_cases
+
+# New status -> status a case must currently be in (None means any status).
+STATUS_TRANSITIONS = {
+    'to_be_sent': 'to_be_revised',
+    'sent': 'to_be_sent',
+    'returned': 'sent',
+    'resolved': None,
+    'unresolved': None,
+}
+
+# Most cases a batch transition takes at once.
+MAX_TRANSITIONS = 1000
+
+Transition = namedtuple('Transition', ['id', 'previous_status', 'distribution_company_id'])
+
+
+def transition_cases(case_ids, new_status, user):
+    # Moves every eligible case to new_status with a single UPDATE and adds
+    # the transitions to their history. Returns the applied transitions and
+    # a list describing the skipped cases.
+    previous_status = STATUS_TRANSITIONS[new_status]
+
+    current = {row.id: row for row in db.session.query(
+        RMACase.id, RMACase.status, RMACase.distribution_company_id).filter(
+        RMACase.id.in_(case_ids)).with_for_update()}
+
+    updated = []
+    skipped = []
+    for case_id in case_ids:
+        row = current.get(case_id)
+        if row is None:
+            skipped.append({'id': case_id, 'reason': 'not_found'})
+        elif row.status == new_status:
+            skipped.append({'id': case_id, 'reason': 'already_in_status', 'status': row.status})
+        elif previous_status is not None and row.status != previous_status:
+            skipped.append({'id': case_id, 'reason': 'invalid_transition', 'status': row.status})
+        else:
+            updated.append(Transition(case_id, row.status, row.distribution_company_id))
+
+    if updated:
+        query = db.session.query(RMACase).filter(RMACase.id.in_([transition.id for transition in updated]))
+        # The allowed previous status is part of the WHERE clause, so a case
+        # that changed concurrently is left untouched.
+        if previous_status is not None:
+            query = query.filter(RMACase.status == previous_status)
+
+        query.update({RMACase.status: new_status}, synchronize_session=False)
+        record_status_events([transition.id for transition in updated], new_status, user)
+
+        count_cases([(transition.distribution_company_id, transition.previous_status, -1)
+                     for transition in updated] +
+                    [(transition.distribution_company_id, new_status, 1) for transition in updated])
+        record_case_events([(transition.id, 'status', new_status, transition.distribution_company_id)
+                            for transition in updated])
+
+    return updated, skipped
@@ -0,0 +1,55 @@
+# stock.py
+import datetime
+from collections import OrderedDict
+
+from sqlalchemy import func, or_
+
+from lib.models import Product, StockMovement, db
+from lib.versions import bump_revision, release_revision
+
+
+def adjust_stock(adjustments, user_id, reason=None):
+    # Applies (product_id, delta) pairs as `stock = stock + delta`, so
+    # concurrent adjustments never overwrite each other, and logs each one
+    # in stock_movements. Products with stock_under_control are not allowed
+    # to go below zero. Returns {product_id: new stock} for the applied
+    # adjustments and a list describing the skipped ones.
+    deltas = OrderedDict()
+    for product_id, delta in adjustments:
+        deltas[product_id] = deltas.get(product_id, 0) + delta
+
+    applied = []
+    skipped = []
+    # One revision for the whole batch, see lib/sync.py. Taken before any
+    # row is locked, in the same order as every other products write, and
+    # given back below if nothing is applied.
+    revision = bump_revision('products')
+    now = datetime.datetime.now()
+    # Sorted so concurrent batches lock the rows in the same order.
+    for product_id in sorted(deltas):
+        delta = deltas[product_id]
+        new_stock = func.coalesce(Product.stock, 0) + delta
+        result = db.session.query(Product).filter(Product.id == product_id).filter(
+            or_(Product.stock_under_control.isnot(True), new_stock >= 0)).update(
+            {Product.stock: new_stock, Product.revision: revision, Product.updated_at: now},
+            synchronize_session=False)
+
+        if result:
+            applied.append(product_id)
+        elif db.session.query(Product.id).filter(Product.id == product_id).first() is None:
+            skipped.append({'id': product_id, 'reason': 'not_found'})
+        else:
+            skipped.append({'id': product_id, 'reason': 'insufficient_stock'})
+
+    if not applied:
+        release_revision('products')
+        return {}, skipped
+
+    # The updated rows stay locked until commit, so this reads our own
+    # results.
+    stock = dict(db.session.query(Product.id, Product.stock).filter(Product.id.in_(applied)))
+    db.session.bulk_insert_mappings(StockMovement, [
+        {'product_id': product_id, 'delta': deltas[product_id], 'stock': stock[product_id], 'reason': reason,
+         'user_id': user_id, 'created_at': now} for product_id in applied])
+
+    return stock, skipped
@@ -0,0 +1,68 @@
+# sync.py
+import datetime
+
+from lib.models import Tombstone, db
+from lib.pagination import QueryArgsError
+from lib.versions import bump_revision, get_versions
+
+# Every write to a synced table (products, dist_companies) bumps the table
+# version and stamps the written rows with it as their revision, deletes
+# leave a tombstone with theirs. A client keeps the revision of its last
+# sync and asks for what changed after it.
+
+
+def stamp(instance, table):
+    instance.revision = bump_revision(table)
+    instance.updated_at = datetime.datetime.now()
+
+
+def record_deletion(table, row_id):
+    db.session.execute(Tombstone.__table__.insert().values(
+        table_name=table, row_id=row_id, revision=bump_revision(table), deleted_at=datetime.datetime.now()))
+
+
+def parse_since(args):
+    try:
+        since = int(args.get('since', 0))
+    except ValueError:
+        raise QueryArgsError('since must be an integer!')
+
+    if since < 0:
+        raise QueryArgsError('since can not be negative!')
+
+    return since
+
+
+def _page(query, revision_column, key_column, since, high_water, limit):
+    # Rows with since < revision <= high_water, at most `limit` of them
+    # unless a single revision has more, as a revision is never split across
+    # pages. Returns the rows and the revision they are complete up to.
+    window = query.filter(revision_column > since, revision_column <= high_water)
+    rows = window.order_by(revision_column, key_column).limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, high_water
+
+    cut = rows[limit].revision
+    rows = [row for row in rows[:limit] if row.revision < cut]
+    if rows:
+        return rows, cut - 1
+    return query.filter(revision_column == cut).order_by(key_column).all(), cut
+
+
+def changes(serializer, model, table, fields, since, limit):
+    # Rows written and ids deleted after `since`, oldest first. The returned
+    # revision is the one to send as `since` next time, `more` tells whether
+    # there is another page.
+    # Read first: rows committed after this are left for the next sync.
+    high_water = get_versions(table)[0]
+
+    rows, rows_upto = _page(serializer.query(fields, model.revision), model.revision, model.id, since,
+                            high_water, limit)
+    deleted, deleted_upto = _page(
+        db.session.query(Tombstone.row_id, Tombstone.revision).filter(Tombstone.table_name == table),
+        Tombstone.revision, Tombstone.id, since, high_water, limit)
+
+    upto = min(rows_upto, deleted_upto)
+    return {table: serializer.to_dicts([row for row in rows if row.revision <= upto], fields),
+            'deleted': [{'id': row.row_id, 'revision': row.revision} for row in deleted if row.revision <= upto],
+            'revision': max(upto, since), 'more': upto < high_water}
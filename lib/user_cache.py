@@ -0,0 +1,53 @@
+# user_cache.py
+from collections import namedtuple
+from threading import Lock
+
+from cachetools import TTLCache
+
+from lib.models import User, db
+
+# Detached, read-only view of the authenticated user handed to the handlers.
+CurrentUser = namedtuple('CurrentUser', ['id', 'public_id', 'username', 'first_name', 'last_name', 'role'])
+
+# Per process: invalidate_user only reaches the process that served the
+# change. On the others a deleted or demoted user keeps the cached row, and
+# its role, until the entry expires, so the TTL is the staleness window and
+# is kept short (SUKKIRI_USER_CACHE_TTL). It still saves the lookup on the
+# bursts of requests a client sends.
+_cache = TTLCache(maxsize=1024, ttl=5)
+_lock = Lock()
+
+
+def init_user_cache(maxsize, ttl):
+    global _cache
+    with _lock:
+        _cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+
+def get_current_user(public_id):
+    # Keyed by public_id rather than by token: the JWT signature and expiry
+    # are still checked on every request (no I/O involved), only the users
+    # table lookup is cached, and invalidation is a single pop.
+    with _lock:
+        current_user = _cache.get(public_id)
+
+    if current_user is not None:
+        return current_user
+
+    row = db.session.query(User.id, User.public_id, User.username, User.first_name, User.last_name,
+                           User.role).filter_by(public_id=public_id).first()
+
+    if row is None:
+        return None
+
+    current_user = CurrentUser(*row)
+
+    with _lock:
+        _cache[public_id] = current_user
+
+    return current_user
+
+
+def invalidate_user(public_id):
+    with _lock:
+        _cache.pop(public_id, None)
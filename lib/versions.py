@@ -0,0 +1,78 @@
+# versions.py
+import hashlib
+from functools import wraps
+
+from flask import current_app, make_response, request
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+
+from lib.models import TableVersion, db
+
+
+def bump_version(*tables):
+    # Runs in the caller's transaction, so the new version commits together
+    # with the write.
+    for table in sorted(set(tables)):
+        if db.engine.dialect.name == 'mysql':
+            stmt = mysql_insert(TableVersion.__table__).values(name=table, version=1)
+            db.session.execute(stmt.on_duplicate_key_update(version=TableVersion.__table__.c.version + 1))
+            continue
+
+        updated = db.session.query(TableVersion).filter_by(name=table).update(
+            {TableVersion.version: TableVersion.version + 1}, synchronize_session=False)
+        if not updated:
+            db.session.execute(TableVersion.__table__.insert().values(name=table, version=1))
+
+
+def bump_revision(table):
+    # Bumps the version of table and returns it, to be used as the revision
+    # of the rows written in this transaction (see lib/sync.py). The version
+    # row stays locked until commit, so the revisions of a table commit in
+    # order.
+    bump_version(table)
+    return get_versions(table)[0]
+
+
+def release_revision(table):
+    # Undoes bump_revision for a transaction that ended up writing no row
+    # with the revision, so the table's ETags and changes feed do not move.
+    # The version row stays locked until commit, so nobody else got a
+    # revision in between.
+    db.session.query(TableVersion).filter_by(name=table).update(
+        {TableVersion.version: TableVersion.version - 1}, synchronize_session=False)
+
+
+def get_versions(*tables):
+    versions = dict(db.session.query(TableVersion.name, TableVersion.version).filter(
+        TableVersion.name.in_(tables)))
+    return [versions.get(table, 0) for table in tables]
+
+
+def versioned(*tables):
+    # ETag / 304 support for read handlers whose response only depends on
+    # the given tables and the request URL. A matching If-None-Match costs a
+    # single lookup of the version counters, the handler is not called.
+    def decorator(f):
+        @wraps(f)
+        def decorated(*args, **kwargs):
+            # Versions and data are read in the same transaction.
+            versions = get_versions(*tables)
+            etag = hashlib.sha1('{}:{}'.format(versions, request.full_path).encode('utf-8')).hexdigest()
+
+            # Weak comparison, compressed responses carry the weak form.
+            if request.if_none_match.contains_weak(etag):
+                response = current_app.response_class(status=304)
+            else:
+                response = make_response(f(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+
+            response.set_etag(etag)
+            # Authenticated data: only the client may keep it, and it has to
+            # revalidate every time.
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+            return response
+
+        return decorated
+
+    return decorator
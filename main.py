@@ -2,74 +2,184 @@ import datetime
 import os
 import uuid
 from functools import wraps
+from io import BytesIO
+from tempfile import SpooledTemporaryFile
 
 import jwt
-from flask import Flask, request, jsonify, make_response, send_file
+from flask import Flask, Response, g, request, make_response, send_file, stream_with_context, url_for
 from flask_migrate import Migrate
 from flask_cors import CORS
+from sqlalchemy.exc import IntegrityError
 from werkzeug.security import generate_password_hash, check_password_hash
 
 from lib.models import *
-from lib.invoice import generate_invoice
+from lib.bulk import read_csv, upsert_products
+from lib.db_pool import pool_options, pool_stats
+from lib.dist_companies import UnknownDistCompanyError, dist_company_id, find_dist_company
+from lib.encoding import init_compression, jsonify
+from lib.ean_cache import MAX_BATCH, clear_ean_cache, init_ean_cache, invalidate_eans, lookup_eans
+from lib.export import csv_lines, ndjson_lines, stream_query
+from lib.instrumentation import init_instrumentation, phase, prometheus_metrics, slowest_profiles
+from lib.events import close_stream, event_stream, init_events, open_stream, poll_events, record_case_events, \
+    record_dist_company_events
+from lib.filters import filter_products, filter_rma_cases, rma_case_ordering
+from lib.history import record_status_events, time_in_status
+from lib.invoice import generate_invoice, generate_large_invoice
+from lib.invoice_cache import cache_invoice, get_cached_invoice, init_invoice_cache, invalidate_invoices, \
+    invoice_fingerprint
+from lib.invoice_jobs import INVOICE_COLUMNS, finished_invoice_pdf, get_invoice_job, init_invoice_jobs, \
+    invoice_criteria, invoice_job_pdf, invoice_job_status, submit_invoice_job
+from lib.pagination import QueryArgsError, page_limit, paginate
+from lib.replica import REPLICA_BIND, WROTE_AT_HEADER, init_replica, read_only
+from lib import search
+from lib.serializers import dist_company_serializer, product_serializer, rma_case_serializer, \
+    rma_status_event_serializer, user_serializer
+from lib.stats import count_cases, get_case_counts, get_product_count, init_stats_cache, invalidate_stats, \
+    rebuild_case_counts
+from lib.status import MAX_TRANSITIONS, STATUS_TRANSITIONS, transition_cases
+from lib.stock import adjust_stock
+from lib.user_cache import get_current_user, init_user_cache, invalidate_user
+from lib.sync import changes, parse_since, record_deletion, stamp
+from lib.versions import bump_revision, versioned
 
 app = Flask(__name__)
 
 app.config['SECRET_KEY'] = os.getenv('SUKKIRI_SECRET_KEY')
 app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('SUKKIRI_DATABASE_URI')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = pool_options(app.config['SQLALCHEMY_DATABASE_URI'],
+                                                       pool_size=os.getenv('SUKKIRI_DB_POOL_SIZE'),
+                                                       max_overflow=os.getenv('SUKKIRI_DB_MAX_OVERFLOW'),
+                                                       pool_timeout=os.getenv('SUKKIRI_DB_POOL_TIMEOUT'),
+                                                       pool_recycle=os.getenv('SUKKIRI_DB_POOL_RECYCLE'),
+                                                       pool_pre_ping=os.getenv('SUKKIRI_DB_POOL_PRE_PING'))
+# Optional read replica, used by the handlers decorated with read_only.
+if os.getenv('SUKKIRI_REPLICA_DATABASE_URI'):
+    app.config['SQLALCHEMY_BINDS'] = {REPLICA_BIND: os.getenv('SUKKIRI_REPLICA_DATABASE_URI')}
 
 db.init_app(app)
 
-CORS(app, supports_credentials=True, resources={r"/api/*": {"origins": "*"}})
-
-migrate = Migrate(app, db)
+init_user_cache(maxsize=int(os.getenv('SUKKIRI_USER_CACHE_SIZE', 1024)),
+                ttl=int(os.getenv('SUKKIRI_USER_CACHE_TTL', 5)))
+init_invoice_cache(max_bytes=int(os.getenv('SUKKIRI_INVOICE_CACHE_BYTES', 32 * 1024 * 1024)))
+init_stats_cache(ttl=int(os.getenv('SUKKIRI_STATS_CACHE_TTL', 5)))
+init_events(app, poll_interval=float(os.getenv('SUKKIRI_EVENTS_POLL_SECONDS', 1)),
+            retention_hours=int(os.getenv('SUKKIRI_EVENTS_RETENTION_HOURS', 24)),
+            heartbeat=int(os.getenv('SUKKIRI_EVENTS_HEARTBEAT_SECONDS', 15)),
+            max_seconds=int(os.getenv('SUKKIRI_EVENTS_MAX_SECONDS', 300)),
+            # Each stream (and waiting long-poll) holds a worker thread.
+            max_streams=int(os.getenv('SUKKIRI_EVENTS_MAX_STREAMS', 4)),
+            poll_wait=int(os.getenv('SUKKIRI_EVENTS_POLL_WAIT_SECONDS', 25)))
+init_replica(app, sticky_seconds=int(os.getenv('SUKKIRI_REPLICA_STICKY_SECONDS', 10)))
+init_ean_cache(maxsize=int(os.getenv('SUKKIRI_EAN_CACHE_SIZE', 10000)),
+               ttl=int(os.getenv('SUKKIRI_EAN_CACHE_TTL', 300)))
+search.init_search_index(ttl=int(os.getenv('SUKKIRI_SEARCH_INDEX_TTL', 300)))
+init_invoice_jobs(app, max_workers=int(os.getenv('SUKKIRI_INVOICE_WORKERS', 2)),
+                  max_jobs=int(os.getenv('SUKKIRI_INVOICE_MAX_JOBS', 100)))
+
+# Invoices with more rows than this are rendered by a background job (0 disables it).
+app.config['INVOICE_ASYNC_ROWS'] = int(os.getenv('SUKKIRI_INVOICE_ASYNC_ROWS', 500))
+# Invoices with more rows than this are rendered from a streamed query in chunked tables, here or in the
+# background job. Below INVOICE_ASYNC_ROWS, so the ones rendered here get it too.
+app.config['INVOICE_LARGE_ROWS'] = int(os.getenv('SUKKIRI_INVOICE_LARGE_ROWS', 250))
+app.config['INVOICE_SPOOL_BYTES'] = int(os.getenv('SUKKIRI_INVOICE_SPOOL_BYTES', 4 * 1024 * 1024))
+# Lifetime of the tokens that open the RMA case stream.
+app.config['STREAM_TOKEN_SECONDS'] = int(os.getenv('SUKKIRI_STREAM_TOKEN_SECONDS', 60))
+
+# Registered before the compression so its timings include it. Set
+# SUKKIRI_PROFILE_INTERVAL_MS to sample the stacks of the slowest requests.
+init_instrumentation(app, profile_interval=float(os.getenv('SUKKIRI_PROFILE_INTERVAL_MS', 0)) / 1000,
+                     profile_keep=int(os.getenv('SUKKIRI_PROFILE_KEEP', 20)))
+init_compression(app, min_size=int(os.getenv('SUKKIRI_COMPRESS_MIN_BYTES', 1024)))
+
+CORS(app, supports_credentials=True, expose_headers=[WROTE_AT_HEADER], resources={r"/api/*": {"origins": "*"}})
+
+migrate = Migrate(app, db, include_object=include_object)
+
+
+# EventSource can not send headers, so the stream also takes a token from
+# the query string. URLs end up in access logs, so that has to be a stream
+# token (see create_stream_token): short-lived, and good for nothing else.
+QUERY_TOKEN_ENDPOINTS = {'stream_rma_cases'}
+STREAM_SCOPE = 'stream'
 
 
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
         token = None
+        from_query = False
 
         if 'x-access-token' in request.headers:
             token = request.headers['x-access-token']
+        elif request.endpoint in QUERY_TOKEN_ENDPOINTS:
+            token = request.args.get('token')
+            from_query = True
 
         if not token:
             return jsonify({'message': 'Token is missing!'}), 401
 
         try:
-            data = jwt.decode(token, app.config['SECRET_KEY'])
-            current_user = db.session.query(User).filter_by(
-                public_id=data['public_id']).first()
+            with phase('auth'):
+                data = jwt.decode(token, app.config['SECRET_KEY'])
+                stream_token = data.get('scope') == STREAM_SCOPE
+                if from_query and not stream_token or stream_token and request.endpoint not in QUERY_TOKEN_ENDPOINTS:
+                    raise jwt.InvalidTokenError('Wrong token scope')
+                current_user = get_current_user(data['public_id'])
         except:
             return jsonify({'message': 'Token is invalid!'}), 401
 
+        if not current_user:
+            return jsonify({'message': 'Token is invalid!'}), 401
+
+        g.current_user = current_user
         return f(current_user, *args, **kwargs)
 
     return decorated
 
 
+def export_response(serializer, query, fields, filename):
+    rows = (serializer.to_dict(row, fields) for row in stream_query(query.order_by(serializer.key)))
+
+    if request.args.get('format') == 'csv':
+        body = csv_lines(rows, fields)
+        mimetype = 'text/csv'
+        filename += '.csv'
+    else:
+        body = ndjson_lines(rows)
+        mimetype = 'application/x-ndjson'
+        filename += '.ndjson'
+
+    return Response(stream_with_context(body), mimetype=mimetype,
+                    headers={'Content-Disposition': 'attachment; filename=' + filename})
+
+
 @app.route('/api/rma_cases', methods=['GET'])
 @token_required
+@read_only
 def get_all_rma_cases(current_user):
-    rma_cases = db.session.query(RMACase).all()
-
-    output = []
-
-    for rma_case in rma_cases:
-        rma_case_data = {'id': rma_case.id, 'brand': rma_case.brand, 'model': rma_case.model,
-                         'problem': rma_case.problem, 'serial_number': rma_case.serial_number,
-                         'distribution_company': rma_case.distribution_company,
-                         'sent_date': rma_case.sent_date, 'returned_date': rma_case.sent_date,
-                         'resolved_date': rma_case.resolved_date, 'status': rma_case.status,
-                         'to_be_revised_date': rma_case.to_be_revised_date,
-                         'unresolved_date': rma_case.unresolved_date,
-                         'to_be_sent_date': rma_case.to_be_sent_date,
-                         'to_be_revised_by': rma_case.to_be_revised_by,
-                         'to_be_sent_by': rma_case.to_be_sent_by, 'sent_by': rma_case.sent_by,
-                         'returned_by': rma_case.returned_by,
-                         'resolved_by': rma_case.resolved_by, 'unresolved_by': rma_case.unresolved_by}
-        output.append(rma_case_data)
-    return jsonify({'rma_cases': output})
+    try:
+        fields = rma_case_serializer.parse_fields(request.args)
+        sort_column, descending = rma_case_ordering(request.args)
+        query = filter_rma_cases(rma_case_serializer.query(fields, sort_column), request.args)
+        rma_cases, next_cursor = paginate(query, RMACase.id, request.args, sort_column, descending)
+    except QueryArgsError as e:
+        return jsonify({'message': str(e)}), 400
+
+    return jsonify({'rma_cases': rma_case_serializer.to_dicts(rma_cases, fields), 'next_cursor': next_cursor})
+
+
+@app.route('/api/rma_cases/export', methods=['GET'])
+@token_required
+@read_only
+def export_rma_cases(current_user):
+    try:
+        fields = rma_case_serializer.parse_fields(request.args)
+        query = filter_rma_cases(rma_case_serializer.query(fields), request.args)
+    except QueryArgsError as e:
+        return jsonify({'message': str(e)}), 400
+
+    return export_response(rma_case_serializer, query, fields, 'rma_cases')
 
 
 @app.route('/api/rma_cases', methods=['POST'])
@@ -85,44 +195,162 @@ def create_new_rma_case(current_user):
         return jsonify({'message': 'You must specify a problem!'})
     if 'serial_number' not in data:
         data['serial_number'] = 'N/A'
-    if 'distribution_company' not in data:
-        data['distribution_company'] = 'N/A'
+
+    try:
+        new_dist_company_id = dist_company_id(data)
+    except UnknownDistCompanyError as e:
+        return jsonify({'message': str(e)})
 
     new_rma_case = RMACase(brand=data['brand'], model=data['model'], problem=data['problem'],
-                           serial_number=data['serial_number'], distribution_company=data['distribution_company'],
-                           to_be_revised_date=datetime.datetime.now().strftime('%d-%m-%Y %H:%M'),
-                           to_be_revised_by=current_user.first_name + ' ' + current_user.last_name)
+                           serial_number=data['serial_number'], distribution_company_id=new_dist_company_id,
+                           status='to_be_revised')
 
     try:
         db.session.add(new_rma_case)
+        count_cases([(new_dist_company_id, 'to_be_revised', 1)])
+        db.session.flush()
+        record_status_events([new_rma_case.id], 'to_be_revised', current_user)
+        record_case_events([(new_rma_case.id, 'created', 'to_be_revised', new_dist_company_id)])
         db.session.commit()
+        invalidate_invoices(new_dist_company_id)
+        invalidate_stats('rma_cases')
         return jsonify({'message': 'New RMA case created!', 'case': new_rma_case.id})
     except:
         return jsonify({'message': 'Could not create the RMA case'})
 
 
+@app.route('/api/rma_cases/stats', methods=['GET'])
+@token_required
+@read_only
+def get_rma_case_stats(current_user):
+    counts = get_case_counts()
+
+    by_status = {}
+    by_dist_company = {}
+    for row in counts:
+        by_status[row['status']] = by_status.get(row['status'], 0) + row['count']
+        by_dist_company[row['distribution_company']] = by_dist_company.get(row['distribution_company'], 0) + \
+            row['count']
+
+    return jsonify({'stats': counts, 'by_status': by_status, 'by_distribution_company': by_dist_company,
+                    'total': sum(by_status.values())})
+
+
+@app.route('/api/rma_cases/stats/time_in_status', methods=['GET'])
+@token_required
+@read_only
+def get_rma_case_time_in_status(current_user):
+    return jsonify({'time_in_status': time_in_status()})
+
+
+def event_args():
+    # The comma separated distribution_company and status filters, and the
+    # id of the last event the client has.
+    dist_companies = set(value for value in request.args.get('distribution_company', '').split(',') if value)
+    statuses = set(value for value in request.args.get('status', '').split(',') if value)
+
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    if last_event_id is not None:
+        try:
+            last_event_id = int(last_event_id)
+        except ValueError:
+            raise QueryArgsError('Last-Event-ID must be an integer!')
+
+    return dist_companies, statuses, last_event_id
+
+
+@app.route('/api/rma_cases/stream', methods=['GET'])
+@token_required
+def stream_rma_cases(current_user):
+    # Server-Sent Events feed of RMA case changes. It needs a server that
+    # sends the response as it is written: App Engine standard buffers it,
+    # clients there use /api/rma_cases/events.
+    try:
+        dist_companies, statuses, last_event_id = event_args()
+    except QueryArgsError as e:
+        return jsonify({'message': str(e)}), 400
+
+    if not open_stream():
+        return jsonify({'message': 'Too many open streams, poll /api/rma_cases/events instead!'}), 503, \
+            {'Retry-After': '30'}
+
+    response = Response(stream_with_context(event_stream(dist_companies, statuses, last_event_id)),
+                        mimetype='text/event-stream', headers={'Cache-Control': 'no-cache',
+                                                               'X-Accel-Buffering': 'no'})
+    # Also when the stream never started.
+    response.call_on_close(close_stream)
+    return response
+
+
+@app.route('/api/rma_cases/events', methods=['GET'])
+@token_required
+def poll_rma_case_events(current_user):
+    # Long-polling version of the stream, with the same filters. Waits for
+    # new events only while a stream slot is free, otherwise it answers
+    # right away.
+    try:
+        dist_companies, statuses, last_event_id = event_args()
+    except QueryArgsError as e:
+        return jsonify({'message': str(e)}), 400
+
+    waiting = open_stream()
+    try:
+        events, last_event_id = poll_events(dist_companies, statuses, last_event_id, wait=waiting)
+    finally:
+        if waiting:
+            close_stream()
+
+    if events is None:
+        return jsonify({'reset': True, 'events': [], 'last_event_id': None})
+    return jsonify({'reset': False, 'events': events, 'last_event_id': last_event_id})
+
+
+@app.route('/api/rma_cases/stream/token', methods=['POST'])
+@token_required
+def create_stream_token(current_user):
+    # The token to send as ?token= to /api/rma_cases/stream. It is only
+    # checked when the stream opens: a client reconnecting after it expired
+    # asks for a new one.
+    token = jwt.encode({'public_id': current_user.public_id, 'scope': STREAM_SCOPE,
+                        'exp': datetime.datetime.utcnow() +
+                        datetime.timedelta(seconds=app.config['STREAM_TOKEN_SECONDS'])},
+                       app.config['SECRET_KEY'])
+    return jsonify({'token': token.decode('UTF-8'), 'expires_in': app.config['STREAM_TOKEN_SECONDS']})
+
+
 @app.route('/api/rma_cases/<rma_case_id>', methods=['GET'])
 @token_required
+@read_only
 def get_rma_case(current_user, rma_case_id):
-    rma_case = db.session.query(RMACase).filter_by(id=rma_case_id).first()
+    try:
+        fields = rma_case_serializer.parse_fields(request.args)
+    except QueryArgsError as e:
+        return jsonify({'message': str(e)}), 400
+
+    rma_case = rma_case_serializer.query(fields).filter(RMACase.id == rma_case_id).first()
 
     if not rma_case:
         return jsonify({'message': 'No RMA case found!'})
 
-    rma_case_data = {'id': rma_case.id, 'brand': rma_case.brand, 'model': rma_case.model,
-                     'problem': rma_case.problem, 'serial_number': rma_case.serial_number,
-                     'distribution_company': rma_case.distribution_company,
-                     'sent_date': rma_case.sent_date, 'returned_date': rma_case.sent_date,
-                     'resolved_date': rma_case.resolved_date, 'status': rma_case.status,
-                     'to_be_revised_date': rma_case.to_be_revised_date,
-                     'unresolved_date': rma_case.unresolved_date,
-                     'to_be_sent_date': rma_case.to_be_sent_date,
-                     'to_be_revised_by': rma_case.to_be_revised_by,
-                     'to_be_sent_by': rma_case.to_be_sent_by, 'sent_by': rma_case.sent_by,
-                     'returned_by': rma_case.returned_by,
-                     'resolved_by': rma_case.resolved_by, 'unresolved_by': rma_case.unresolved_by}
+    return jsonify({'rma_case': rma_case_serializer.to_dict(rma_case, fields)})
+
+
+@app.route('/api/rma_cases/<int:rma_case_id>/history', methods=['GET'])
+@token_required
+@read_only
+def get_rma_case_history(current_user, rma_case_id):
+    try:
+        fields = rma_status_event_serializer.parse_fields(request.args)
+    except QueryArgsError as e:
+        return jsonify({'message': str(e)}), 400
+
+    if not db.session.query(RMACase.id).filter(RMACase.id == rma_case_id).first():
+        return jsonify({'message': 'No RMA case found!'})
+
+    events = rma_status_event_serializer.query(fields).filter(RMAStatusEvent.case_id == rma_case_id).order_by(
+        RMAStatusEvent.id)
 
-    return jsonify({'rma_case': rma_case_data})
+    return jsonify({'history': rma_status_event_serializer.to_dicts(events, fields)})
 
 
 @app.route('/api/rma_cases/<rma_case_id>', methods=['PUT'])
@@ -134,15 +362,30 @@ def modify_rma_case(current_user, rma_case_id):
         return jsonify({'message': 'No RMA case found!'})
 
     data = request.get_json()
+    previous_dist_company_id = rma_case.distribution_company_id
 
+    if 'distribution_company_id' in data or 'distribution_company' in data:
+        try:
+            rma_case.distribution_company_id = dist_company_id(data)
+        except UnknownDistCompanyError as e:
+            return jsonify({'message': str(e)})
     if 'problem' in data:
         rma_case.problem = data['problem']
     if 'serial_number' in data:
         rma_case.serial_number = data['serial_number']
-    if 'distribution_company' in data:
-        rma_case.distribution_company = data['distribution_company']
 
+    if rma_case.distribution_company_id != previous_dist_company_id:
+        count_cases([(previous_dist_company_id, rma_case.status, -1),
+                     (rma_case.distribution_company_id, rma_case.status, 1)])
+
+    # A case moved to another company is announced to both, so screens
+    # filtered by the old one see it leave.
+    record_case_events([(rma_case.id, 'modified', rma_case.status, company_id)
+                        for company_id in sorted(set([previous_dist_company_id, rma_case.distribution_company_id]),
+                                                 key=lambda company_id: company_id or 0)])
     db.session.commit()
+    invalidate_invoices(previous_dist_company_id, rma_case.distribution_company_id)
+    invalidate_stats('rma_cases')
 
     return jsonify({'message': 'RMA case modified successfully!'})
 
@@ -150,62 +393,190 @@ def modify_rma_case(current_user, rma_case_id):
 @app.route('/api/rma_cases/<rma_case_id>/status/<new_status>', methods=['PUT'])
 @token_required
 def modify_rma_case_status(current_user, rma_case_id, new_status):
-    rma_case = db.session.query(RMACase).filter_by(id=rma_case_id).first()
+    if new_status not in STATUS_TRANSITIONS:
+        return jsonify({'message': 'Invalid status!'})
 
-    if not rma_case:
+    try:
+        rma_case_id = int(rma_case_id)
+    except ValueError:
         return jsonify({'message': 'No RMA case found!'})
 
-    if new_status == 'to_be_sent' and rma_case.status == 'to_be_revised':
-        rma_case.status = new_status
-        rma_case.sent_date = datetime.datetime.now().strftime('%d-%m-%Y %H:%M')
-        rma_case.sent_by = current_user.first_name + ' ' + current_user.last_name
-    elif new_status == 'sent' and rma_case.status == 'to_be_sent':
-        rma_case.status = new_status
-        rma_case.returned_date = datetime.datetime.now().strftime('%d-%m-%Y %H:%M')
-        rma_case.returned_by = current_user.first_name + ' ' + current_user.last_name
-    elif new_status == 'returned' and rma_case.status == 'sent':
-        rma_case.status = new_status
-        rma_case.returned_date = datetime.datetime.now().strftime('%d-%m-%Y %H:%M')
-        rma_case.returned_by = current_user.first_name + ' ' + current_user.last_name
-    elif new_status == 'resolved':
-        rma_case.status = new_status
-        rma_case.returned_date = datetime.datetime.now().strftime('%d-%m-%Y %H:%M')
-        rma_case.returned_by = current_user.first_name + ' ' + current_user.last_name
-    elif new_status == 'unresolved':
-        rma_case.status = new_status
-        rma_case.returned_date = datetime.datetime.now().strftime('%d-%m-%Y %H:%M')
-        rma_case.returned_by = current_user.first_name + ' ' + current_user.last_name
-
+    updated, skipped = transition_cases([rma_case_id], new_status, current_user)
     db.session.commit()
+    invalidate_invoices(*[transition.distribution_company_id for transition in updated])
+    invalidate_stats('rma_cases')
+
+    if skipped and skipped[0]['reason'] == 'not_found':
+        return jsonify({'message': 'No RMA case found!'})
+    if skipped:
+        return jsonify({'message': 'RMA case can not go from {} to {}!'.format(skipped[0]['status'], new_status)})
 
     return jsonify({'message': 'RMA case modified successfully!'})
 
 
+@app.route('/api/rma_cases/status/<new_status>', methods=['PUT'])
+@token_required
+def modify_rma_cases_status(current_user, new_status):
+    if new_status not in STATUS_TRANSITIONS:
+        return jsonify({'message': 'Invalid status!'})
+
+    data = request.get_json()
+
+    if not data or not isinstance(data.get('ids'), list):
+        return jsonify({'message': 'You must specify a list of RMA case ids!'}), 400
+    if len(data['ids']) > MAX_TRANSITIONS:
+        return jsonify({'message': 'You can modify at most {} RMA cases at a time!'.format(MAX_TRANSITIONS)}), 400
+
+    try:
+        rma_case_ids = sorted(set(int(rma_case_id) for rma_case_id in data['ids']))
+    except (TypeError, ValueError):
+        return jsonify({'message': 'RMA case ids must be integers!'}), 400
+
+    updated, skipped = transition_cases(rma_case_ids, new_status, current_user)
+    db.session.commit()
+    invalidate_invoices(*[transition.distribution_company_id for transition in updated])
+    invalidate_stats('rma_cases')
+
+    return jsonify({'message': 'RMA cases modified successfully!',
+                    'updated': [transition.id for transition in updated], 'skipped': skipped})
+
+
+def invoice_query(dist_company_id):
+    return db.session.query(*INVOICE_COLUMNS).filter(*invoice_criteria(dist_company_id)).order_by(RMACase.id)
+
+
+def invoice_response(pdf_file, fingerprint):
+    response = send_file(pdf_file, mimetype='application/pdf', attachment_filename="invoice.pdf",
+                         cache_timeout=0)
+    response.cache_control.public = False
+    response.cache_control.private = True
+    response.set_etag(fingerprint)
+    return response
+
+
+def invoice_job_response(job_id):
+    return jsonify({'message': 'The invoice is being generated', 'job': job_id}), 202, \
+        {'Location': url_for('get_invoice_job_status', job_id=job_id)}
+
+
 @app.route('/api/rma_cases/invoice/<dist_company>', methods=['GET'])
 @token_required
 def get_invoice(current_user, dist_company):
-    rma_cases = db.session.query(RMACase).filter_by(distribution_company=dist_company).filter_by(
-        status="to_be_revised").all()
+    # dist_company: the company id, or its name for older clients. Not
+    # read_only: the fingerprint finds the background job for the contents,
+    # and the job renders what the primary has.
+    company = find_dist_company(dist_company)
+
+    if not company:
+        return jsonify({'message': 'No distribution company found!'})
+
+    dist_company_id, dist_company = company
+    query = invoice_query(dist_company_id)
+    row_count = query.order_by(None).count()
+    async_job = app.config['INVOICE_ASYNC_ROWS'] and row_count > app.config['INVOICE_ASYNC_ROWS']
+    large = row_count > app.config['INVOICE_LARGE_ROWS']
 
-    pdf_file = generate_invoice(rma_cases, dist_company)
+    # Large and background invoices never hold every row here: the
+    # fingerprint walks a streamed query, and the rendering streams the rows
+    # again (the job reads them in its own process).
+    rma_cases = stream_query(query) if large or async_job else query.all()
 
-    return send_file(pdf_file, mimetype='application/pdf', attachment_filename="invoice.pdf")
+    fingerprint = invoice_fingerprint(dist_company, rma_cases)
+
+    if request.if_none_match.contains(fingerprint):
+        response = make_response('', 304)
+        response.set_etag(fingerprint)
+        return response
+
+    pdf = get_cached_invoice(dist_company_id, fingerprint)
+    if pdf is not None:
+        return invoice_response(BytesIO(pdf), fingerprint)
+    if async_job:
+        # Rendered by a job, maybe in another process.
+        job = finished_invoice_pdf(dist_company_id, fingerprint)
+        if job is not None:
+            return invoice_response(BytesIO(job.pdf), job.rendered_fingerprint)
+
+    if async_job:
+        return invoice_job_response(submit_invoice_job(dist_company_id, dist_company, fingerprint, row_count,
+                                                       large))
+
+    if large:
+        pdf_file = SpooledTemporaryFile(max_size=app.config['INVOICE_SPOOL_BYTES'])
+        with phase('pdf'):
+            pdf_file = generate_large_invoice(rma_cases, dist_company, pdf_file)
+        return invoice_response(pdf_file, fingerprint)
+
+    with phase('pdf'):
+        pdf = generate_invoice(rma_cases, dist_company).getvalue()
+    cache_invoice(dist_company_id, fingerprint, pdf)
+
+    return invoice_response(BytesIO(pdf), fingerprint)
+
+
+@app.route('/api/rma_cases/invoice/<dist_company>/jobs', methods=['POST'])
+@token_required
+def create_invoice_job(current_user, dist_company):
+    company = find_dist_company(dist_company)
+
+    if not company:
+        return jsonify({'message': 'No distribution company found!'})
+
+    dist_company_id, dist_company = company
+    query = invoice_query(dist_company_id)
+    row_count = query.order_by(None).count()
+
+    return invoice_job_response(submit_invoice_job(dist_company_id, dist_company,
+                                                   invoice_fingerprint(dist_company, stream_query(query)),
+                                                   row_count, row_count > app.config['INVOICE_LARGE_ROWS']))
+
+
+@app.route('/api/rma_cases/invoice/jobs/<job_id>', methods=['GET'])
+@token_required
+def get_invoice_job_status(current_user, job_id):
+    job = get_invoice_job(job_id)
+
+    if not job:
+        return jsonify({'message': 'No invoice job found!'})
+
+    status = invoice_job_status(job)
+    job_data = {'job': job_id, 'status': status, 'dist_company': job['dist_company'],
+                'dist_company_id': job['distribution_company_id'], 'rows': job['rows']}
+    if status == 'done':
+        job_data['pdf'] = url_for('get_invoice_job_pdf', job_id=job_id)
+
+    return jsonify({'invoice_job': job_data})
+
+
+@app.route('/api/rma_cases/invoice/jobs/<job_id>/pdf', methods=['GET'])
+@token_required
+def get_invoice_job_pdf(current_user, job_id):
+    job = get_invoice_job(job_id)
+
+    if not job:
+        return jsonify({'message': 'No invoice job found!'})
+
+    status = invoice_job_status(job)
+    if status != 'done':
+        return jsonify({'message': 'The invoice job is {}!'.format(status)}), 409
+
+    return invoice_response(BytesIO(invoice_job_pdf(job)), job['rendered_fingerprint'])
 
 
 @app.route('/api/dist_companies', methods=['GET'])
 @token_required
+@read_only
+@versioned('dist_companies')
 def get_all_dist_companies(current_user):
-    dist_companies = db.session.query(DistributionCompany).all()
-
-    output = []
+    try:
+        fields = dist_company_serializer.parse_fields(request.args)
+        dist_companies, next_cursor = paginate(dist_company_serializer.query(fields), DistributionCompany.id,
+                                               request.args)
+    except QueryArgsError as e:
+        return jsonify({'message': str(e)}), 400
 
-    for dist_company in dist_companies:
-        dist_company_data = {'id': dist_company.id, 'name': dist_company.name, 'email': dist_company.email,
-                             'address': dist_company.address, 'hours': dist_company.hours,
-                             'contact_name': dist_company.contact_name,
-                             'phone': dist_company.phone}
-        output.append(dist_company_data)
-    return jsonify({'dist_companies': output})
+    return jsonify({'dist_companies': dist_company_serializer.to_dicts(dist_companies, fields),
+                    'next_cursor': next_cursor})
 
 
 @app.route('/api/dist_companies', methods=['POST'])
@@ -219,26 +590,44 @@ def create_new_dist_company(current_user):
 
     try:
         db.session.add(new_dist_company)
+        stamp(new_dist_company, 'dist_companies')
         db.session.commit()
         return jsonify({'message': 'New distribution company created!'})
     except:
         return jsonify({'message': 'Distribution company already exists!'})
 
 
+@app.route('/api/dist_companies/changes', methods=['GET'])
+@token_required
+@read_only
+@versioned('dist_companies')
+def get_dist_company_changes(current_user):
+    try:
+        fields = dist_company_serializer.parse_fields(request.args)
+        since = parse_since(request.args)
+        limit = page_limit(request.args)
+    except QueryArgsError as e:
+        return jsonify({'message': str(e)}), 400
+
+    return jsonify(changes(dist_company_serializer, DistributionCompany, 'dist_companies', fields, since, limit))
+
+
 @app.route('/api/dist_companies/<dist_company_id>', methods=['GET'])
 @token_required
+@read_only
+@versioned('dist_companies')
 def get_dist_company(current_user, dist_company_id):
-    dist_company = db.session.query(
-        DistributionCompany).filter_by(id=dist_company_id).first()
+    try:
+        fields = dist_company_serializer.parse_fields(request.args)
+    except QueryArgsError as e:
+        return jsonify({'message': str(e)}), 400
+
+    dist_company = dist_company_serializer.query(fields).filter(DistributionCompany.id == dist_company_id).first()
 
     if not dist_company:
         return jsonify({'message': 'No distribution company found!'})
 
-    dist_company_data = {'name': dist_company.name, 'email': dist_company.email, 'address': dist_company.address,
-                         'hours': dist_company.hours, 'contact_name': dist_company.contact_name,
-                         'phone': dist_company.phone}
-
-    return jsonify({'dist_company': dist_company_data})
+    return jsonify({'dist_company': dist_company_serializer.to_dict(dist_company, fields)})
 
 
 @app.route('/api/dist_companies/<dist_company_id>', methods=['PUT'])
@@ -251,6 +640,7 @@ def modify_dist_company(current_user, dist_company_id):
         return jsonify({'message': 'No product found!'})
 
     data = request.get_json()
+    renamed = dist_company.name != data['name']
 
     dist_company.name = data['name']
     dist_company.email = data['email']
@@ -259,7 +649,18 @@ def modify_dist_company(current_user, dist_company_id):
     dist_company.contact_name = data['contact_name']
     dist_company.phone = data['phone']
 
+    stamp(dist_company, 'dist_companies')
+    if renamed:
+        # Products and cases show the company by name: its products go back
+        # into the changes feed, its cases into the stream.
+        db.session.query(Product).filter(Product.distribution_company_id == dist_company.id).update(
+            {Product.revision: bump_revision('products'), Product.updated_at: datetime.datetime.now()},
+            synchronize_session=False)
+        record_dist_company_events(dist_company.id)
     db.session.commit()
+    # Cases, counters and invoices show the company by name.
+    invalidate_stats('rma_cases')
+    invalidate_invoices(dist_company.id)
 
     return jsonify({'message': 'Distribution company modified successfully!'})
 
@@ -273,6 +674,11 @@ def delete_dist_company(current_user, dist_company_id):
     if not dist_company:
         return jsonify({'message': 'No distribution company found!'})
 
+    if db.session.query(RMACase.id).filter_by(distribution_company_id=dist_company.id).first() or \
+            db.session.query(Product.id).filter_by(distribution_company_id=dist_company.id).first():
+        return jsonify({'message': 'The distribution company still has RMA cases or products!'}), 409
+
+    record_deletion('dist_companies', dist_company.id)
     db.session.delete(dist_company)
     db.session.commit()
 
@@ -281,18 +687,31 @@ def delete_dist_company(current_user, dist_company_id):
 
 @app.route('/api/products', methods=['GET'])
 @token_required
+@read_only
+@versioned('products', 'dist_companies')
 def get_all_products(current_user):
-    products = db.session.query(Product).all()
+    try:
+        fields = product_serializer.parse_fields(request.args)
+        query = filter_products(product_serializer.query(fields), request.args)
+        products, next_cursor = paginate(query, Product.id, request.args)
+    except QueryArgsError as e:
+        return jsonify({'message': str(e)}), 400
+
+    return jsonify({'products': product_serializer.to_dicts(products, fields), 'next_cursor': next_cursor})
+
 
-    output = []
+@app.route('/api/products/export', methods=['GET'])
+@token_required
+@read_only
+def export_products(current_user):
+    try:
+        fields = product_serializer.parse_fields(request.args)
+    except QueryArgsError as e:
+        return jsonify({'message': str(e)}), 400
 
-    for product in products:
-        product_data = {'id': product.id, 'brand': product.brand, 'model': product.model,
-                        'description': product.description, 'stock': product.stock,
-                        'stock_under_control': product.stock_under_control,
-                        'distribution_company': product.distribution_company, 'ean': product.ean}
-        output.append(product_data)
-    return jsonify({'products': output})
+    query = filter_products(product_serializer.query(fields), request.args)
+
+    return export_response(product_serializer, query, fields, 'products')
 
 
 @app.route('/api/products', methods=['POST'])
@@ -300,65 +719,174 @@ def get_all_products(current_user):
 def create_new_product(current_user):
     data = request.get_json()
 
+    try:
+        new_dist_company_id = dist_company_id(data)
+    except UnknownDistCompanyError as e:
+        return jsonify({'message': str(e)})
+
     new_product = Product(brand=data['brand'].upper(), model=data['model'].upper(),
                           description=data['description'].title(),
                           stock=int(data['stock']), stock_under_control=bool(data['stock_under_control']),
-                          distribution_company=data['distribution_company'], ean=data['ean'])
+                          distribution_company_id=new_dist_company_id, ean=data['ean'])
 
     try:
         db.session.add(new_product)
+        stamp(new_product, 'products')
         db.session.commit()
+        invalidate_stats('products')
+        invalidate_eans(new_product.ean)
+        search.product_index.update(new_product.id, new_product.brand, new_product.model, new_product.description)
         return jsonify({'message': 'New product created!'})
     except:
         return jsonify({'message': 'Product already exists!'})
 
 
+@app.route('/api/products/bulk', methods=['POST'])
+@token_required
+def bulk_upsert_products(current_user):
+    if 'file' in request.files or request.mimetype == 'text/csv':
+        data = request.files['file'].read() if 'file' in request.files else request.get_data()
+        try:
+            rows = read_csv(data.decode('utf-8-sig'))
+        except UnicodeDecodeError:
+            return jsonify({'message': 'The CSV file must be encoded as UTF-8!'}), 400
+    else:
+        rows = request.get_json()
+        if isinstance(rows, dict):
+            rows = rows.get('products')
+
+    if not isinstance(rows, list):
+        return jsonify({'message': 'You must send a list of products or a CSV file!'}), 400
+
+    try:
+        results = upsert_products(rows, bump_revision('products'))
+        db.session.commit()
+        invalidate_stats('products')
+        # An upsert can move an EAN from one product to another.
+        clear_ean_cache()
+        search.product_index.invalidate()
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'message': 'Could not import the products, please retry'}), 409
+
+    summary = {'created': 0, 'updated': 0, 'rejected': 0}
+    for result in results:
+        summary[result['result']] += 1
+
+    return jsonify({'message': 'Products imported!', 'results': results, 'summary': summary})
+
+
 @app.route('/api/products/count', methods=['GET'])
 @token_required
+@read_only
 def count_products(current_user):
-    count = db.session.query(Product).count()
-    return jsonify({'count': count})
+    return jsonify({'count': get_product_count()})
+
+
+@app.route('/api/products/changes', methods=['GET'])
+@token_required
+@read_only
+@versioned('products', 'dist_companies')
+def get_product_changes(current_user):
+    try:
+        fields = product_serializer.parse_fields(request.args)
+        since = parse_since(request.args)
+        limit = page_limit(request.args)
+    except QueryArgsError as e:
+        return jsonify({'message': str(e)}), 400
+
+    return jsonify(changes(product_serializer, Product, 'products', fields, since, limit))
+
+
+@app.route('/api/products/search', methods=['GET'])
+@token_required
+@read_only
+@versioned('products', 'dist_companies')
+def search_products(current_user):
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'message': 'You must send a search query!'}), 400
+
+    try:
+        fields = product_serializer.parse_fields(request.args)
+        limit = page_limit(request.args, default=search.DEFAULT_LIMIT, maximum=search.MAX_LIMIT)
+    except QueryArgsError as e:
+        return jsonify({'message': str(e)}), 400
+
+    ranked = search.search_products(query, limit)
+    if not ranked:
+        return jsonify({'products': []})
+
+    scores = dict(ranked)
+    rows = product_serializer.query(fields).filter(Product.id.in_(scores)).all()
+    products = {row.id: product_serializer.to_dict(row, fields) for row in rows}
+
+    results = []
+    for product_id, score in ranked:
+        if product_id in products:
+            product = products[product_id]
+            product['score'] = score
+            results.append(product)
+
+    return jsonify({'products': results})
 
 
 @app.route('/api/products/<product_id>', methods=['GET'])
 @token_required
+@read_only
+@versioned('products', 'dist_companies')
 def get_product(current_user, product_id):
-    product = db.session.query(Product).filter_by(id=product_id).first()
+    try:
+        fields = product_serializer.parse_fields(request.args)
+    except QueryArgsError as e:
+        return jsonify({'message': str(e)}), 400
+
+    product = product_serializer.query(fields).filter(Product.id == product_id).first()
 
     if not product:
         return jsonify({'message': 'No product found!'})
 
-    product_data = {'id': product.id, 'brand': product.brand, 'model': product.model,
-                    'description': product.description, 'stock': product.stock,
-                    'stock_under_control': product.stock_under_control,
-                    'distribution_company': product.distribution_company, 'ean': product.ean}
-
-    return jsonify({'product': product_data})
+    return jsonify({'product': product_serializer.to_dict(product, fields)})
 
 
 @app.route('/api/products/ean/<ean>', methods=['GET'])
 @token_required
+@read_only
+@versioned('products', 'dist_companies')
 def get_product_with_ean(current_user, ean):
-    products = db.session.query(Product).filter_by(ean=ean).all()
+    try:
+        fields = product_serializer.parse_fields(request.args)
+    except QueryArgsError as e:
+        return jsonify({'message': str(e)}), 400
+
+    products = lookup_eans([ean], fields)[ean]
 
     if len(products) == 0:
         return jsonify({'message': 'No product found with that EAN!'})
     elif len(products) == 1:
-        product_data = {'id': products[0].id, 'brand': products[0].brand, 'model': products[0].model,
-                        'description': products[0].description, 'stock': products[0].stock,
-                        'stock_under_control': products[0].stock_under_control,
-                        'distribution_company': products[0].distribution_company, 'ean': products[0].ean}
-
-        return jsonify({'product': product_data})
+        return jsonify({'product': products[0]})
     else:
-        output = []
-        for product in products:
-            product_data = {'id': product.id, 'brand': product.brand, 'model': product.model,
-                            'description': product.description, 'stock': product.stock,
-                            'stock_under_control': product.stock_under_control,
-                            'distribution_company': product.distribution_company, 'ean': product.ean}
-            output.append(product_data)
-        return jsonify({'products': output})
+        return jsonify({'products': products})
+
+
+@app.route('/api/products/ean/batch', methods=['POST'])
+@token_required
+@read_only
+def get_products_with_eans(current_user):
+    try:
+        fields = product_serializer.parse_fields(request.args)
+    except QueryArgsError as e:
+        return jsonify({'message': str(e)}), 400
+
+    data = request.get_json() or {}
+    eans = data.get('eans')
+
+    if not isinstance(eans, list) or not all(isinstance(ean, str) for ean in eans):
+        return jsonify({'message': 'You must send a list of EANs!'}), 400
+    if len(eans) > MAX_BATCH:
+        return jsonify({'message': 'You can look up at most {} EANs at a time!'.format(MAX_BATCH)}), 400
+
+    return jsonify({'products': lookup_eans(eans, fields)})
 
 
 @app.route('/api/products/<product_id>', methods=['PUT'])
@@ -370,20 +898,78 @@ def modify_product(current_user, product_id):
         return jsonify({'message': 'No product found!'})
 
     data = request.get_json()
+    previous_ean = product.ean
+
+    if 'distribution_company_id' in data or 'distribution_company' in data:
+        try:
+            product.distribution_company_id = dist_company_id(data)
+        except UnknownDistCompanyError as e:
+            return jsonify({'message': str(e)})
 
     product.brand = data['brand']
     product.model = data['model']
     product.description = data['description']
     product.stock = int(data['stock'])
     product.stock_under_control = bool(data['stock_under_control'])
-    product.distribution_company = data['distribution_company']
     product.ean = data['ean']
 
+    stamp(product, 'products')
     db.session.commit()
+    invalidate_eans(previous_ean, product.ean)
+    search.product_index.update(product.id, product.brand, product.model, product.description)
 
     return jsonify({'message': 'Product modified successfully!'})
 
 
+def parse_delta(value):
+    if isinstance(value, bool) or not isinstance(value, int) or value == 0:
+        raise ValueError('delta must be a non-zero integer!')
+    return value
+
+
+@app.route('/api/products/<int:product_id>/stock', methods=['POST'])
+@token_required
+def adjust_product_stock(current_user, product_id):
+    data = request.get_json() or {}
+
+    try:
+        delta = parse_delta(data.get('delta'))
+    except ValueError as e:
+        return jsonify({'message': str(e)}), 400
+
+    stock, skipped = adjust_stock([(product_id, delta)], current_user.id, data.get('reason'))
+    db.session.commit()
+
+    if skipped and skipped[0]['reason'] == 'not_found':
+        return jsonify({'message': 'No product found!'})
+    if skipped:
+        return jsonify({'message': 'Not enough stock!'}), 409
+
+    return jsonify({'message': 'Stock adjusted successfully!', 'stock': stock[product_id]})
+
+
+@app.route('/api/products/stock', methods=['POST'])
+@token_required
+def adjust_products_stock(current_user):
+    data = request.get_json() or {}
+
+    if not isinstance(data.get('adjustments'), list):
+        return jsonify({'message': 'You must specify a list of stock adjustments!'}), 400
+
+    try:
+        adjustments = [(int(adjustment['id']), parse_delta(adjustment['delta']))
+                       for adjustment in data['adjustments']]
+    except (KeyError, TypeError, ValueError):
+        return jsonify({'message': 'Each adjustment needs an integer id and a non-zero integer delta!'}), 400
+
+    stock, skipped = adjust_stock(adjustments, current_user.id, data.get('reason'))
+    db.session.commit()
+
+    return jsonify({'message': 'Stock adjusted successfully!',
+                    'updated': [{'id': product_id, 'stock': stock[product_id]} for product_id in sorted(stock)],
+                    'skipped': skipped})
+
+
 @app.route('/api/products/<product_id>', methods=['DELETE'])
 @token_required
 def delete_product(current_user, product_id):
@@ -392,27 +978,31 @@ def delete_product(current_user, product_id):
     if not product:
         return jsonify({'message': 'No product found!'})
 
+    ean = product.ean
+    record_deletion('products', product.id)
     db.session.delete(product)
     db.session.commit()
+    invalidate_stats('products')
+    invalidate_eans(ean)
+    search.product_index.remove(int(product_id))
 
     return jsonify({'message': 'Product deleted successfully!'})
 
 
 @app.route('/api/users', methods=['GET'])
 @token_required
+@read_only
 def get_all_users(current_user):
     if not current_user.role == 'admin':
         return jsonify({'message': 'Invalid permissions'})
 
-    users = db.session.query(User).all()
-
-    output = []
+    try:
+        fields = user_serializer.parse_fields(request.args)
+        users, next_cursor = paginate(user_serializer.query(fields), User.id, request.args)
+    except QueryArgsError as e:
+        return jsonify({'message': str(e)}), 400
 
-    for user in users:
-        user_data = {'public_id': user.public_id, 'username': user.username, 'first_name': user.first_name,
-                     'last_name': user.last_name, 'email': user.email, 'role': user.role}
-        output.append(user_data)
-    return jsonify({'users': output})
+    return jsonify({'users': user_serializer.to_dicts(users, fields), 'next_cursor': next_cursor})
 
 
 @app.route('/api/users', methods=['POST'])
@@ -435,19 +1025,22 @@ def create_new_user(current_user):
 
 @app.route('/api/users/<user_public_id>', methods=['GET'])
 @token_required
+@read_only
 def get_user(current_user, user_public_id):
     if not current_user.role == 'admin':
         return jsonify({'message': 'Invalid permissions'})
 
-    user = db.session.query(User).filter_by(public_id=user_public_id).first()
+    try:
+        fields = user_serializer.parse_fields(request.args)
+    except QueryArgsError as e:
+        return jsonify({'message': str(e)}), 400
+
+    user = user_serializer.query(fields).filter(User.public_id == user_public_id).first()
 
     if not user:
         return jsonify({'message': 'No user found!'})
 
-    user_data = {'public_id': user.public_id, 'username': user.username, 'first_name': user.first_name,
-                 'last_name': user.last_name, 'email': user.email, 'role': user.role}
-
-    return jsonify({'user': user_data})
+    return jsonify({'user': user_serializer.to_dict(user, fields)})
 
 
 @app.route('/api/users/<user_public_id>', methods=['PUT'])
@@ -476,6 +1069,7 @@ def modify_user(current_user, user_public_id):
         user.password = hashed_password
 
     db.session.commit()
+    invalidate_user(user_public_id)
 
     return jsonify({'message': 'User modified successfully!'})
 
@@ -493,10 +1087,50 @@ def delete_user(current_user, user_public_id):
 
     db.session.delete(user)
     db.session.commit()
+    invalidate_user(user_public_id)
 
     return jsonify({'message': 'User deleted successfully!'})
 
 
+def bind_pool_stats():
+    # The pool of the primary and, when there is one, of the replica.
+    pools = {'primary': pool_stats(db.engine)}
+    if REPLICA_BIND in (app.config.get('SQLALCHEMY_BINDS') or {}):
+        pools['replica'] = pool_stats(db.get_engine(app, bind=REPLICA_BIND))
+    return pools
+
+
+@app.route('/api/db/pool', methods=['GET'])
+@token_required
+def get_db_pool_stats(current_user):
+    if not current_user.role == 'admin':
+        return jsonify({'message': 'Invalid permissions'})
+
+    return jsonify({'pools': bind_pool_stats()})
+
+
+@app.route('/api/metrics', methods=['GET'])
+@token_required
+def get_metrics(current_user):
+    if not current_user.role == 'admin':
+        return jsonify({'message': 'Invalid permissions'})
+
+    return Response(prometheus_metrics(bind_pool_stats()), mimetype='text/plain; version=0.0.4')
+
+
+@app.route('/api/metrics/profiles', methods=['GET'])
+@token_required
+def get_slowest_profiles(current_user):
+    if not current_user.role == 'admin':
+        return jsonify({'message': 'Invalid permissions'})
+
+    profiles = slowest_profiles()
+    if profiles is None:
+        return jsonify({'message': 'The profiler is disabled, set SUKKIRI_PROFILE_INTERVAL_MS to enable it'})
+
+    return jsonify({'profiles': profiles})
+
+
 @app.route('/api/auth')
 def login():
     auth = request.authorization
@@ -519,5 +1153,13 @@ def login():
     return make_response('Could not verify', 401, {'WWW-Authenticate': 'Basic realm="Login Required!"'})
 
 
+@app.cli.command('rebuild-rma-stats')
+def rebuild_rma_stats():
+    """Recount the RMA case counters from the rma_cases table."""
+    groups = rebuild_case_counts()
+    db.session.commit()
+    print('Rebuilt {} RMA case counters'.format(groups))
+
+
 if __name__ == '__main__':
     app.run(debug=True, host="0.0.0.0")
@@ -0,0 +1,121 @@
+"""dist company foreign keys
+
+RMA cases and products point to dist_companies by id instead of by name,
+and so do the RMA case counters and events. Names in cases or products
+without a matching company get one, so no case loses its company.
+
+Revision ID: 383d71290c82
+Revises: de85c96dc07a
+Create Date: 2026-10-18 13:41:46.197928
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '383d71290c82'
+down_revision = 'de85c96dc07a'
+branch_labels = None
+depends_on = None
+
+# Referencing table -> length of its old name column.
+NAME_COLUMNS = {'rma_cases': 60, 'products': 120}
+# Referencing table -> index on its new id column. Created before the
+# foreign key, so MySQL uses it instead of adding one.
+ID_INDEXES = {'rma_cases': ('ix_rma_cases_distribution_company_id_status', ['distribution_company_id', 'status']),
+              'products': ('ix_products_distribution_company_id', ['distribution_company_id'])}
+EVENTS_TABLE_KWARGS = {'sqlite_autoincrement': True}
+
+
+def _foreign_key(table):
+    return 'fk_{}_distribution_company_id_dist_companies'.format(table)
+
+
+def _add_missing_dist_companies():
+    bind = op.get_bind()
+    for table in NAME_COLUMNS:
+        op.execute("INSERT INTO dist_companies (name) SELECT DISTINCT t.distribution_company FROM {} t "
+                   "WHERE t.distribution_company IS NOT NULL AND t.distribution_company NOT IN ('', 'N/A') AND "
+                   "NOT EXISTS (SELECT 1 FROM dist_companies d WHERE d.name = t.distribution_company)".format(table))
+
+    # Stamped like any other write, so the changes feed returns them.
+    if bind.execute(sa.text('SELECT COUNT(*) FROM dist_companies WHERE revision IS NULL')).scalar():
+        version = (bind.execute(sa.text("SELECT version FROM table_versions WHERE name = 'dist_companies'"))
+                   .scalar() or 0) + 1
+        bind.execute(sa.text("DELETE FROM table_versions WHERE name = 'dist_companies'"))
+        bind.execute(sa.text("INSERT INTO table_versions (name, version) VALUES ('dist_companies', :version)"),
+                     version=version)
+        bind.execute(sa.text('UPDATE dist_companies SET revision = :version, updated_at = CURRENT_TIMESTAMP '
+                             'WHERE revision IS NULL'), version=version)
+
+
+def _create_case_counts(column):
+    op.create_table('rma_case_counts',
+    column,
+    sa.Column('status', sa.String(length=60), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint(column.name, 'status')
+    )
+
+
+def upgrade():
+    _add_missing_dist_companies()
+
+    op.drop_index('ix_rma_cases_distribution_company_status', table_name='rma_cases')
+    for table in NAME_COLUMNS:
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.add_column(sa.Column('distribution_company_id', sa.Integer(), nullable=True))
+
+        op.execute('UPDATE {0} SET distribution_company_id = (SELECT d.id FROM dist_companies d '
+                   'WHERE d.name = {0}.distribution_company)'.format(table))
+        op.create_index(ID_INDEXES[table][0], table, ID_INDEXES[table][1], unique=False)
+
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.create_foreign_key(_foreign_key(table), 'dist_companies', ['distribution_company_id'], ['id'])
+            batch_op.drop_column('distribution_company')
+
+    # Events of companies that are gone keep no company.
+    with op.batch_alter_table('rma_case_events', table_kwargs=EVENTS_TABLE_KWARGS) as batch_op:
+        batch_op.add_column(sa.Column('distribution_company_id', sa.Integer(), nullable=True))
+    op.execute('UPDATE rma_case_events SET distribution_company_id = (SELECT d.id FROM dist_companies d '
+               'WHERE d.name = rma_case_events.distribution_company)')
+    with op.batch_alter_table('rma_case_events', table_kwargs=EVENTS_TABLE_KWARGS) as batch_op:
+        batch_op.drop_column('distribution_company')
+
+    op.drop_table('rma_case_counts')
+    _create_case_counts(sa.Column('distribution_company_id', sa.Integer(), autoincrement=False, nullable=False))
+    op.execute('INSERT INTO rma_case_counts (distribution_company_id, status, count) '
+               'SELECT COALESCE(distribution_company_id, 0), status, COUNT(id) FROM rma_cases '
+               'GROUP BY COALESCE(distribution_company_id, 0), status')
+
+
+def downgrade():
+    op.drop_table('rma_case_counts')
+    _create_case_counts(sa.Column('distribution_company', sa.String(length=60), nullable=False))
+
+    with op.batch_alter_table('rma_case_events', table_kwargs=EVENTS_TABLE_KWARGS) as batch_op:
+        batch_op.add_column(sa.Column('distribution_company', sa.String(length=60), nullable=True))
+    op.execute('UPDATE rma_case_events SET distribution_company = (SELECT d.name FROM dist_companies d '
+               'WHERE d.id = rma_case_events.distribution_company_id)')
+    with op.batch_alter_table('rma_case_events', table_kwargs=EVENTS_TABLE_KWARGS) as batch_op:
+        batch_op.drop_column('distribution_company_id')
+
+    for table, length in NAME_COLUMNS.items():
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.add_column(sa.Column('distribution_company', sa.String(length=length), nullable=True))
+            batch_op.drop_constraint(_foreign_key(table), type_='foreignkey')
+
+        op.execute('UPDATE {0} SET distribution_company = (SELECT d.name FROM dist_companies d '
+                   'WHERE d.id = {0}.distribution_company_id)'.format(table))
+        op.drop_index(ID_INDEXES[table][0], table_name=table)
+
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_column('distribution_company_id')
+
+    op.create_index('ix_rma_cases_distribution_company_status', 'rma_cases', ['distribution_company', 'status'],
+                    unique=False)
+
+    op.execute("INSERT INTO rma_case_counts (distribution_company, status, count) "
+               "SELECT COALESCE(distribution_company, ''), status, COUNT(id) FROM rma_cases "
+               "GROUP BY COALESCE(distribution_company, ''), status")
@@ -0,0 +1,42 @@
+"""invoice job dedup
+
+At most one live (pending, running or done) job per company and
+fingerprint, enforced by a unique key, and the fingerprint of what a job
+rendered kept apart from the one it was submitted for. The jobs are a
+cache of renders, so the existing ones are dropped instead of deduplicated.
+
+Revision ID: 54f0e00dd605
+Revises: 81ae2691db89
+Create Date: 2026-10-18 14:21:37.827598
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '54f0e00dd605'
+down_revision = '81ae2691db89'
+branch_labels = None
+depends_on = None
+
+invoice_jobs = sa.table('invoice_jobs', sa.column('id', sa.String))
+
+
+def upgrade():
+    op.execute(invoice_jobs.delete())
+    with op.batch_alter_table('invoice_jobs') as batch_op:
+        batch_op.add_column(sa.Column('live', sa.Boolean(), nullable=True))
+        batch_op.add_column(sa.Column('rendered_fingerprint', sa.String(length=40), nullable=True))
+        batch_op.drop_index('ix_invoice_jobs_distribution_company_id_fingerprint')
+        batch_op.create_unique_constraint('uq_invoice_jobs_distribution_company_id_fingerprint_live',
+                                          ['distribution_company_id', 'fingerprint', 'live'])
+
+
+def downgrade():
+    with op.batch_alter_table('invoice_jobs') as batch_op:
+        batch_op.drop_constraint('uq_invoice_jobs_distribution_company_id_fingerprint_live', type_='unique')
+        batch_op.create_index('ix_invoice_jobs_distribution_company_id_fingerprint',
+                              ['distribution_company_id', 'fingerprint'], unique=False)
+        batch_op.drop_column('rendered_fingerprint')
+        batch_op.drop_column('live')
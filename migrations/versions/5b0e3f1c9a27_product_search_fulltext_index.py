@@ -0,0 +1,30 @@
+"""product search fulltext index
+
+FULLTEXT index over products (brand, model, description) for
+/api/products/search. MySQL only, other databases use the in-process index
+in lib/search.py.
+
+Revision ID: 5b0e3f1c9a27
+Revises: ca92df7c7f48
+Create Date: 2026-10-18 14:02:17.482310
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '5b0e3f1c9a27'
+down_revision = 'ca92df7c7f48'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'mysql':
+        op.create_index('ft_products_search', 'products', ['brand', 'model', 'description'], unique=False,
+                        mysql_prefix='FULLTEXT')
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'mysql':
+        op.drop_index('ft_products_search', table_name='products')
@@ -0,0 +1,57 @@
+"""rma status dates
+
+Last time each RMA case went into each status, filled from the events.
+Sorting and filtering by the <status>_date fields go through its
+(status, at) index, which makes the one on rma_status_events unused.
+
+Revision ID: 81ae2691db89
+Revises: 1075c58fd2b2
+Create Date: 2026-10-18 14:03:59.553973
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '81ae2691db89'
+down_revision = '1075c58fd2b2'
+branch_labels = None
+depends_on = None
+
+rma_status_events = sa.table('rma_status_events', sa.column('id', sa.Integer), sa.column('case_id', sa.Integer),
+                             sa.column('status', sa.String), sa.column('at', sa.DateTime),
+                             sa.column('user_name', sa.String))
+rma_status_dates = sa.table('rma_status_dates', sa.column('case_id', sa.Integer), sa.column('status', sa.String),
+                            sa.column('at', sa.DateTime), sa.column('user_name', sa.String))
+
+
+def upgrade():
+    op.create_table('rma_status_dates',
+    sa.Column('case_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('status', sa.String(length=60), nullable=False),
+    sa.Column('at', sa.DateTime(), nullable=False),
+    sa.Column('user_name', sa.String(length=121), nullable=True),
+    sa.ForeignKeyConstraint(['case_id'], ['rma_cases.id'], ),
+    sa.PrimaryKeyConstraint('case_id', 'status')
+    )
+    op.create_index('ix_rma_status_dates_status_at_case_id', 'rma_status_dates', ['status', 'at', 'case_id'],
+                    unique=False)
+
+    # The last event of each case and status.
+    latest = rma_status_events.alias('latest')
+    op.execute(rma_status_dates.insert().from_select(
+        ['case_id', 'status', 'at', 'user_name'],
+        sa.select([rma_status_events.c.case_id, rma_status_events.c.status, rma_status_events.c.at,
+                   rma_status_events.c.user_name]).where(
+            rma_status_events.c.id == sa.select([sa.func.max(latest.c.id)]).where(
+                latest.c.case_id == rma_status_events.c.case_id).where(
+                latest.c.status == rma_status_events.c.status).as_scalar())))
+
+    op.drop_index('ix_rma_status_events_status_at', table_name='rma_status_events')
+
+
+def downgrade():
+    op.create_index('ix_rma_status_events_status_at', 'rma_status_events', ['status', 'at'], unique=False)
+    op.drop_index('ix_rma_status_dates_status_at_case_id', table_name='rma_status_dates')
+    op.drop_table('rma_status_dates')
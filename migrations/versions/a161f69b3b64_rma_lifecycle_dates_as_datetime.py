@@ -0,0 +1,100 @@
+"""rma lifecycle dates as datetime
+
+Converts the '%d-%m-%Y %H:%M' strings of the RMA lifecycle dates into
+DATETIME columns and indexes them (and the status) for range filters.
+
+Revision ID: a161f69b3b64
+Revises: 6ecfe9799e30
+Create Date: 2026-10-18 13:21:44.873527
+
+"""
+import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a161f69b3b64'
+down_revision = '6ecfe9799e30'
+branch_labels = None
+depends_on = None
+
+DATE_COLUMNS = ['to_be_revised_date', 'to_be_sent_date', 'sent_date', 'returned_date', 'resolved_date',
+                'unresolved_date']
+STRING_LENGTHS = {'to_be_revised_date': 60}
+DATE_FORMAT = '%d-%m-%Y %H:%M'
+BATCH_SIZE = 1000
+
+
+def _parse(value):
+    try:
+        return datetime.datetime.strptime(value.strip(), DATE_FORMAT) if value else None
+    except ValueError:
+        return None
+
+
+def _format(value):
+    return value.strftime(DATE_FORMAT) if value else None
+
+
+def _copy_columns(source_suffix, target_suffix, source_type, target_type, convert):
+    # Done in Python, id range by id range, so that unparseable legacy values
+    # become NULL on every database instead of aborting a strict-mode UPDATE.
+    bind = op.get_bind()
+    rma_cases = sa.table('rma_cases', sa.column('id', sa.Integer),
+                         *[sa.column(column + source_suffix, source_type) for column in DATE_COLUMNS] +
+                         [sa.column(column + target_suffix, target_type) for column in DATE_COLUMNS])
+    update = rma_cases.update().where(rma_cases.c.id == sa.bindparam('row_id')).values(
+        {column + target_suffix: sa.bindparam('value_' + column) for column in DATE_COLUMNS})
+
+    last_id = 0
+    while True:
+        rows = bind.execute(sa.select([rma_cases.c.id] + [rma_cases.c[column + source_suffix]
+                                                          for column in DATE_COLUMNS]).where(
+            rma_cases.c.id > last_id).order_by(rma_cases.c.id).limit(BATCH_SIZE)).fetchall()
+        if not rows:
+            break
+
+        bind.execute(update, [dict({'row_id': row[0]}, **{'value_' + column: convert(value)
+                                                         for column, value in zip(DATE_COLUMNS, row[1:])})
+                              for row in rows])
+        last_id = rows[-1][0]
+
+
+def upgrade():
+    with op.batch_alter_table('rma_cases') as batch_op:
+        for column in DATE_COLUMNS:
+            batch_op.add_column(sa.Column(column + '_dt', sa.DateTime(), nullable=True))
+
+    _copy_columns('', '_dt', sa.String(), sa.DateTime(), _parse)
+
+    with op.batch_alter_table('rma_cases') as batch_op:
+        for column in DATE_COLUMNS:
+            batch_op.drop_column(column)
+            batch_op.alter_column(column + '_dt', new_column_name=column, existing_type=sa.DateTime(),
+                                  existing_nullable=True)
+
+    for column in DATE_COLUMNS:
+        op.create_index(op.f('ix_rma_cases_' + column), 'rma_cases', [column], unique=False)
+    op.create_index(op.f('ix_rma_cases_status'), 'rma_cases', ['status'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_rma_cases_status'), table_name='rma_cases')
+    for column in DATE_COLUMNS:
+        op.drop_index(op.f('ix_rma_cases_' + column), table_name='rma_cases')
+
+    with op.batch_alter_table('rma_cases') as batch_op:
+        for column in DATE_COLUMNS:
+            batch_op.add_column(sa.Column(column + '_str', sa.String(length=STRING_LENGTHS.get(column, 18)),
+                                          nullable=True))
+
+    _copy_columns('', '_str', sa.DateTime(), sa.String(), _format)
+
+    with op.batch_alter_table('rma_cases') as batch_op:
+        for column in DATE_COLUMNS:
+            batch_op.drop_column(column)
+            batch_op.alter_column(column + '_str', new_column_name=column,
+                                  existing_type=sa.String(length=STRING_LENGTHS.get(column, 18)),
+                                  existing_nullable=True)
@@ -0,0 +1,130 @@
+"""rma status events
+
+Status history of the RMA cases, replacing the <status>_date / <status>_by
+columns of rma_cases. Every pair with a date becomes an event, linked to
+the user whose name matches the _by column.
+
+The columns did not always hold what their names say. The original
+status endpoint wrote to_be_sent into sent_date, and sent, returned,
+resolved and unresolved into returned_date (each one overwriting the
+last). Only the later transition code writes the matching pair.
+The pairs are mapped back to the status they recorded, see _status_of.
+Every case also gets an event for its current status, in case neither
+shape had one.
+
+Revision ID: f3d063e5821b
+Revises: 383d71290c82
+Create Date: 2026-10-18 13:48:47.651320
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3d063e5821b'
+down_revision = '383d71290c82'
+branch_labels = None
+depends_on = None
+
+STATUSES = ['to_be_revised', 'to_be_sent', 'sent', 'returned', 'resolved', 'unresolved']
+
+rma_cases = sa.table('rma_cases', sa.column('id', sa.Integer), sa.column('status', sa.String),
+                     *[sa.column(status + '_date', sa.DateTime) for status in STATUSES] +
+                     [sa.column(status + '_by', sa.String) for status in STATUSES])
+rma_status_events = sa.table('rma_status_events', sa.column('id', sa.Integer), sa.column('case_id', sa.Integer),
+                             sa.column('status', sa.String), sa.column('at', sa.DateTime),
+                             sa.column('user_id', sa.Integer), sa.column('user_name', sa.String))
+users = sa.table('users', sa.column('id', sa.Integer), sa.column('first_name', sa.String),
+                 sa.column('last_name', sa.String))
+
+
+def _status_of(status):
+    # The status a <status>_date / <status>_by pair was written for.
+    c = rma_cases.c
+    if status == 'sent':
+        # The original endpoint's to_be_sent, unless to_be_sent has a pair
+        # of its own.
+        return sa.case([(c.to_be_sent_date.isnot(None), 'sent')], else_='to_be_sent')
+    if status == 'returned':
+        # The original endpoint's last transition: the current status, when
+        # it has no pair of its own.
+        return sa.case([(c.status == 'sent', 'sent'),
+                        (sa.and_(c.status == 'resolved', c.resolved_date.is_(None)), 'resolved'),
+                        (sa.and_(c.status == 'unresolved', c.unresolved_date.is_(None)), 'unresolved')],
+                       else_='returned')
+    return sa.literal(status)
+
+
+def upgrade():
+    op.create_table('rma_status_events',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('case_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=60), nullable=False),
+    sa.Column('at', sa.DateTime(), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('user_name', sa.String(length=121), nullable=True),
+    sa.ForeignKeyConstraint(['case_id'], ['rma_cases.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_rma_status_events_case_id_status', 'rma_status_events', ['case_id', 'status'], unique=False)
+    op.create_index('ix_rma_status_events_status_at', 'rma_status_events', ['status', 'at'], unique=False)
+
+    transitions = []
+    for step, status in enumerate(STATUSES):
+        date = rma_cases.c[status + '_date']
+        name = rma_cases.c[status + '_by']
+        user_id = sa.select([sa.func.min(users.c.id)]).where(
+            users.c.first_name + ' ' + users.c.last_name == name).as_scalar()
+        transitions.append(sa.select([rma_cases.c.id.label('case_id'), _status_of(status).label('status'),
+                                      date.label('at'), user_id.label('user_id'), name.label('user_name'),
+                                      sa.literal(step).label('step')]).where(date.isnot(None)))
+    transitions = sa.union_all(*transitions).alias('transitions')
+
+    # In chronological order, as the history is read in id order.
+    op.execute(rma_status_events.insert().from_select(
+        ['case_id', 'status', 'at', 'user_id', 'user_name'],
+        sa.select([transitions.c.case_id, transitions.c.status, transitions.c.at, transitions.c.user_id,
+                   transitions.c.user_name]).order_by(transitions.c.at, transitions.c.step, transitions.c.case_id)))
+
+    # The current status of the cases that have no event for it, at their
+    # last known date (or now, for cases without any).
+    events = rma_status_events.alias('events')
+    last_at = sa.select([sa.func.max(events.c.at)]).where(events.c.case_id == rma_cases.c.id).as_scalar()
+    op.execute(rma_status_events.insert().from_select(
+        ['case_id', 'status', 'at'],
+        sa.select([rma_cases.c.id, rma_cases.c.status, sa.func.coalesce(last_at, sa.func.now())]).where(
+            rma_cases.c.status.isnot(None)).where(~sa.exists().where(events.c.case_id == rma_cases.c.id).where(
+                events.c.status == rma_cases.c.status)).order_by(rma_cases.c.id)))
+
+    for status in STATUSES:
+        op.drop_index('ix_rma_cases_{}_date'.format(status), table_name='rma_cases')
+
+    with op.batch_alter_table('rma_cases') as batch_op:
+        for status in STATUSES:
+            batch_op.drop_column(status + '_date')
+            batch_op.drop_column(status + '_by')
+
+
+def downgrade():
+    with op.batch_alter_table('rma_cases') as batch_op:
+        for status in STATUSES:
+            batch_op.add_column(sa.Column(status + '_date', sa.DateTime(), nullable=True))
+            batch_op.add_column(sa.Column(status + '_by', sa.String(length=60), nullable=True))
+
+    # The last time each case went into each status.
+    def last(column, status):
+        return sa.select([column]).where(rma_status_events.c.case_id == rma_cases.c.id).where(
+            rma_status_events.c.status == status).order_by(rma_status_events.c.id.desc()).limit(1).as_scalar()
+
+    op.execute(rma_cases.update().values(dict(
+        [(status + '_date', last(rma_status_events.c.at, status)) for status in STATUSES] +
+        [(status + '_by', sa.func.substr(last(rma_status_events.c.user_name, status), 1, 60))
+         for status in STATUSES])))
+
+    for status in STATUSES:
+        op.create_index('ix_rma_cases_{}_date'.format(status), 'rma_cases', [status + '_date'], unique=False)
+
+    op.drop_index('ix_rma_status_events_status_at', table_name='rma_status_events')
+    op.drop_index('ix_rma_status_events_case_id_status', table_name='rma_status_events')
+    op.drop_table('rma_status_events')
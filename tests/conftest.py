@@ -0,0 +1,67 @@
+# conftest.py
+#
+# Runs the app against a throw-away SQLite database, or the one in
+# SUKKIRI_TEST_DATABASE_URI (all its tables are dropped). main reads its
+# configuration when imported, so this has to come first.
+import os
+import tempfile
+
+import pytest
+
+from benchmarks.seed import load_app, make_token, seed
+
+app = load_app(os.getenv('SUKKIRI_TEST_DATABASE_URI') or
+               'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'sukkiri_test.db'))
+
+from lib import search  # noqa: E402
+from lib.ean_cache import clear_ean_cache  # noqa: E402
+from lib.invoice_cache import init_invoice_cache  # noqa: E402
+from lib.models import db  # noqa: E402
+from lib.replica import REPLICA_BIND  # noqa: E402
+from lib.stats import init_stats_cache  # noqa: E402
+
+
+def reset_database():
+    # An empty database, and caches that know nothing about the last test.
+    # Must run inside an app context.
+    db.drop_all()
+    db.create_all()
+    clear_ean_cache()
+    init_invoice_cache(max_bytes=32 * 1024 * 1024)
+    init_stats_cache(ttl=5)
+    search.init_search_index(ttl=300)
+
+
+@pytest.fixture
+def database():
+    with app.app_context():
+        reset_database()
+        yield db
+        db.session.remove()
+
+
+@pytest.fixture
+def admin_public_id(database):
+    return seed(users=2, dist_companies=3, products=20, rma_cases=20)
+
+
+@pytest.fixture
+def client():
+    return app.test_client()
+
+
+@pytest.fixture
+def headers(admin_public_id):
+    return {'x-access-token': make_token(app, admin_public_id)}
+
+
+@pytest.fixture
+def replica(database):
+    # A second SQLite file as the replica, with the schema and none of the
+    # rows: a replica that has not caught up with anything.
+    app.config['SQLALCHEMY_BINDS'] = {REPLICA_BIND: 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'replica.db')}
+    engine = db.get_engine(app, bind=REPLICA_BIND)
+    db.metadata.create_all(bind=engine)
+    yield engine
+    db.metadata.drop_all(bind=engine)
+    del app.config['SQLALCHEMY_BINDS']
@@ -0,0 +1,45 @@
+# test_bulk.py
+from io import BytesIO
+
+from lib.models import Product, db
+
+PRODUCT = {'brand': 'acme', 'model': 'b-1', 'description': 'a product', 'stock': 1, 'stock_under_control': False,
+           'distribution_company': None, 'ean': None}
+
+
+def test_rows_that_are_not_text_are_rejected(client, headers):
+    rows = [dict(PRODUCT, brand=42), dict(PRODUCT, description=None), dict(PRODUCT, distribution_company=[1]),
+            PRODUCT]
+    response = client.post('/api/products/bulk', json=rows, headers=headers)
+    assert response.status_code == 200
+
+    results = response.get_json()['results']
+    assert [result['result'] for result in results] == ['rejected', 'rejected', 'rejected', 'created']
+    assert results[0]['message'] == 'brand must be text!'
+
+
+def test_a_csv_that_is_not_utf8_is_a_bad_request(client, headers):
+    csv = 'brand,model,description,stock,stock_under_control,distribution_company,ean\n' \
+          'ACME,B-2,Café,1,false,,\n'
+    for data, kwargs in [({'file': (BytesIO(csv.encode('latin-1')), 'products.csv')}, {}),
+                         (csv.encode('latin-1'), {'content_type': 'text/csv'})]:
+        response = client.post('/api/products/bulk', data=data, headers=headers, **kwargs)
+        assert response.status_code == 400
+        assert 'UTF-8' in response.get_json()['message']
+
+    response = client.post('/api/products/bulk', data=b'\xef\xbb\xbf' + csv.encode('utf-8'),
+                           content_type='text/csv', headers=headers)
+    assert response.get_json()['summary'] == {'created': 1, 'updated': 0, 'rejected': 0}
+
+
+def test_legacy_mixed_case_products_are_updated(client, headers):
+    legacy = Product(brand='Acme', model='b-1', description='Legacy', stock=0, stock_under_control=False)
+    db.session.add(legacy)
+    db.session.commit()
+    legacy_id = legacy.id
+    count = Product.query.count()
+
+    response = client.post('/api/products/bulk', json=[PRODUCT], headers=headers)
+    assert response.get_json()['summary'] == {'created': 0, 'updated': 1, 'rejected': 0}
+    assert Product.query.count() == count
+    assert db.session.query(Product.description).filter(Product.id == legacy_id).scalar() == 'A Product'
@@ -0,0 +1,55 @@
+# test_db_pool.py
+import os
+import tempfile
+
+from sqlalchemy import create_engine
+
+from conftest import app
+from lib.db_pool import InstrumentedQueuePool, pool_stats, watch_engine
+
+
+def _request(client, method, url, headers, **kwargs):
+    # In an app context of its own, like outside the tests: the session is
+    # removed, and its connections checked in, when the request ends.
+    with app.app_context():
+        return client.open(url, method=method, headers=headers, **kwargs)
+
+
+def _pools(client, headers):
+    response = _request(client, 'GET', '/api/db/pool', headers)
+    assert response.status_code == 200
+    return response.get_json()['pools']
+
+
+def test_each_bind_has_its_own_stats(client, headers, replica):
+    before = _pools(client, headers)
+    assert sorted(before) == ['primary', 'replica']
+
+    _request(client, 'GET', '/api/products/count', headers)
+    after = _pools(client, headers)
+    assert after['replica']['checkouts'] > before['replica']['checkouts']
+    assert after['primary']['checkouts'] == before['primary']['checkouts']
+
+    _request(client, 'PUT', '/api/rma_cases/status/resolved', headers, json={'ids': [1]})
+    before, after = after, _pools(client, headers)
+    assert after['primary']['checkouts'] > before['primary']['checkouts']
+    assert after['replica']['checkouts'] == before['replica']['checkouts']
+
+
+def test_only_the_primary_without_a_replica(client, headers):
+    assert list(_pools(client, headers)) == ['primary']
+
+
+def test_a_disposed_queue_pool_keeps_its_stats():
+    engine = create_engine('sqlite:///' + os.path.join(tempfile.mkdtemp(), 'pool.db'),
+                           poolclass=InstrumentedQueuePool)
+    watch_engine(engine)
+
+    engine.execute('SELECT 1')
+    engine.dispose()
+    engine.execute('SELECT 1')
+
+    stats = pool_stats(engine)
+    assert stats['class'] == 'InstrumentedQueuePool'
+    assert (stats['connects'], stats['checkouts'], stats['checkins']) == (2, 2, 2)
+    assert stats['checkout_wait']['count'] == 2
@@ -0,0 +1,45 @@
+# test_dist_companies.py
+from lib.models import DistributionCompany, Product, RMACase, RMACaseEvent, db
+
+
+def _company_body(company, **changes):
+    body = {'name': company.name, 'email': company.email, 'address': company.address, 'hours': company.hours,
+            'contact_name': company.contact_name, 'phone': company.phone}
+    body.update(changes)
+    return body
+
+
+def test_a_rename_reaches_the_products_feed_and_the_cases(client, headers):
+    company = DistributionCompany.query.join(Product, Product.distribution_company_id == DistributionCompany.id).first()
+    since = client.get('/api/products/changes?fields=id', headers=headers).get_json()['revision']
+    case_ids = [case_id for case_id, in db.session.query(RMACase.id).filter(
+        RMACase.distribution_company_id == company.id)]
+    last_event = db.session.query(db.func.max(RMACaseEvent.id)).scalar() or 0
+
+    response = client.put('/api/dist_companies/{}'.format(company.id), json=_company_body(company, name='Renamed'),
+                          headers=headers)
+    assert response.status_code == 200
+
+    changed = client.get('/api/products/changes?fields=id,distribution_company&since={}'.format(since),
+                         headers=headers).get_json()['products']
+    product_ids = [product_id for product_id, in db.session.query(Product.id).filter(
+        Product.distribution_company_id == company.id)]
+    assert product_ids and sorted(product['id'] for product in changed) == sorted(product_ids)
+    assert all(product['distribution_company'] == 'Renamed' for product in changed)
+
+    events = db.session.query(RMACaseEvent.case_id).filter(RMACaseEvent.id > last_event,
+                                                           RMACaseEvent.type == 'modified')
+    assert case_ids and sorted(case_id for case_id, in events) == sorted(case_ids)
+
+
+def test_a_product_keeps_its_company_when_the_body_omits_it(client, headers):
+    product = Product.query.filter(Product.distribution_company_id.isnot(None)).first()
+    company_id = product.distribution_company_id
+
+    response = client.put('/api/products/{}'.format(product.id), json={
+        'brand': product.brand, 'model': product.model, 'description': 'Edited', 'stock': 1,
+        'stock_under_control': False, 'ean': product.ean}, headers=headers)
+    assert response.status_code == 200
+
+    db.session.expire_all()
+    assert Product.query.get(product.id).distribution_company_id == company_id
@@ -0,0 +1,20 @@
+# test_ean_cache.py
+from lib.models import Product, db
+
+
+def _products(client, headers, ean):
+    response = client.post('/api/products/ean/batch?fields=id,ean', json={'eans': [ean]}, headers=headers)
+    assert response.status_code == 200
+    return response.get_json()['products'][ean]
+
+
+def test_unknown_eans_are_not_cached(client, headers):
+    ean = '7790000088888'
+    assert _products(client, headers, ean) == []
+
+    # Created by another worker, which cannot invalidate this one's cache.
+    product = Product(brand='ACME', model='EAN-1', description='d', stock=1, stock_under_control=False, ean=ean)
+    db.session.add(product)
+    db.session.commit()
+
+    assert _products(client, headers, ean) == [{'id': product.id, 'ean': ean}]
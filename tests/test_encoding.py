@@ -0,0 +1,61 @@
+# test_encoding.py
+import gzip
+
+import pytest
+
+from lib.models import RMACase, db
+
+
+def _get(client, url, headers, encoding):
+    return client.get(url, headers=dict(headers, **{'Accept-Encoding': encoding}))
+
+
+def test_json_is_gzipped(client, headers):
+    plain = client.get('/api/products', headers=headers)
+    response = _get(client, '/api/products', headers, 'gzip')
+
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert gzip.decompress(response.data) == plain.data
+
+
+def test_json_is_brotli_compressed_when_preferred(client, headers):
+    brotli = pytest.importorskip('brotli')
+    plain = client.get('/api/products', headers=headers)
+    response = _get(client, '/api/products', headers, 'gzip;q=0.5, br')
+
+    assert response.headers['Content-Encoding'] == 'br'
+    assert brotli.decompress(response.data) == plain.data
+
+
+def test_a_compressed_response_has_a_weak_etag(client, headers):
+    etag, weak = client.get('/api/products', headers=headers).get_etag()
+    assert not weak
+
+    response = _get(client, '/api/products', headers, 'gzip')
+    assert response.get_etag() == (etag, True)
+
+    response = client.get('/api/products', headers=dict(headers, **{'Accept-Encoding': 'gzip',
+                                                                     'If-None-Match': 'W/"{}"'.format(etag)}))
+    assert response.status_code == 304
+
+
+def test_invoices_are_sent_as_they_are(client, headers):
+    dist_company_id = db.session.query(RMACase.distribution_company_id).filter(
+        RMACase.status == 'to_be_revised').filter(RMACase.distribution_company_id.isnot(None)).first()[0]
+    response = _get(client, '/api/rma_cases/invoice/{}'.format(dist_company_id), headers, 'gzip')
+
+    assert response.mimetype == 'application/pdf'
+    assert 'Content-Encoding' not in response.headers
+    assert response.data.startswith(b'%PDF')
+
+
+@pytest.mark.parametrize('url', ['/api/products/export', '/api/rma_cases/export?format=csv'])
+def test_exports_are_gzipped_as_they_stream(client, headers, url):
+    plain = client.get(url, headers=headers)
+    response = _get(client, url, headers, 'gzip')
+
+    assert response.is_streamed
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Content-Length' not in response.headers
+    assert gzip.decompress(response.data) == plain.data
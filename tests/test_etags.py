@@ -0,0 +1,90 @@
+# test_etags.py
+from lib.models import DistributionCompany, Product, RMACase, db
+
+DIST_COMPANY_FIELDS = ['name', 'email', 'address', 'hours', 'contact_name', 'phone']
+
+
+def _etag(client, url, headers):
+    response = client.get(url, headers=headers)
+    assert response.status_code == 200
+    return response.get_etag()[0]
+
+
+def _modify_product(client, headers):
+    product = Product.query.order_by(Product.id).first()
+    data = {'brand': product.brand, 'model': product.model, 'description': 'Changed', 'stock': product.stock,
+            'stock_under_control': product.stock_under_control, 'ean': product.ean}
+    response = client.put('/api/products/{}'.format(product.id), json=data, headers=headers)
+    assert response.status_code == 200
+
+
+def _modify_dist_company(client, headers):
+    dist_company = DistributionCompany.query.order_by(DistributionCompany.id).first()
+    data = {field: getattr(dist_company, field) for field in DIST_COMPANY_FIELDS}
+    data['email'] = 'changed@example.com'
+    response = client.put('/api/dist_companies/{}'.format(dist_company.id), json=data, headers=headers)
+    assert response.status_code == 200
+
+
+def test_a_matching_etag_is_not_modified(client, headers):
+    etag = _etag(client, '/api/products', headers)
+
+    response = client.get('/api/products', headers=dict(headers, **{'If-None-Match': '"{}"'.format(etag)}))
+    assert response.status_code == 304
+    assert response.data == b''
+    assert response.get_etag()[0] == etag
+
+
+def test_a_write_changes_the_list_etag(client, headers):
+    etag = _etag(client, '/api/products', headers)
+    _modify_product(client, headers)
+
+    response = client.get('/api/products', headers=dict(headers, **{'If-None-Match': '"{}"'.format(etag)}))
+    assert response.status_code == 200
+    assert response.get_etag()[0] != etag
+
+
+def test_product_etags_follow_the_dist_companies_too(client, headers):
+    products, dist_companies = _etag(client, '/api/products', headers), _etag(client, '/api/dist_companies', headers)
+
+    _modify_product(client, headers)
+    assert _etag(client, '/api/dist_companies', headers) == dist_companies
+    products, previous = _etag(client, '/api/products', headers), products
+    assert products != previous
+
+    # Products show their company, so a company write changes both.
+    _modify_dist_company(client, headers)
+    assert _etag(client, '/api/dist_companies', headers) != dist_companies
+    assert _etag(client, '/api/products', headers) != products
+
+
+def _invoice_company_id():
+    return db.session.query(RMACase.distribution_company_id).filter(RMACase.status == 'to_be_revised').filter(
+        RMACase.distribution_company_id.isnot(None)).first()[0]
+
+
+def test_an_unchanged_invoice_is_not_modified(client, headers):
+    url = '/api/rma_cases/invoice/{}'.format(_invoice_company_id())
+    response = client.get(url, headers=headers)
+    assert response.mimetype == 'application/pdf'
+    etag = response.get_etag()[0]
+
+    response = client.get(url, headers=dict(headers, **{'If-None-Match': '"{}"'.format(etag)}))
+    assert response.status_code == 304
+    assert response.get_etag()[0] == etag
+
+
+def test_a_status_change_changes_the_invoice_etag(client, headers):
+    dist_company_id = _invoice_company_id()
+    url = '/api/rma_cases/invoice/{}'.format(dist_company_id)
+    etag = client.get(url, headers=headers).get_etag()[0]
+
+    case_id = db.session.query(RMACase.id).filter(RMACase.distribution_company_id == dist_company_id,
+                                                  RMACase.status == 'to_be_revised').first()[0]
+    response = client.put('/api/rma_cases/{}/status/to_be_sent'.format(case_id), headers=headers)
+    assert response.get_json()['message'] == 'RMA case modified successfully!'
+
+    response = client.get(url, headers=dict(headers, **{'If-None-Match': '"{}"'.format(etag)}))
+    assert response.status_code == 200
+    assert response.mimetype == 'application/pdf'
+    assert response.get_etag()[0] != etag
@@ -0,0 +1,121 @@
+# test_events.py
+import datetime
+import threading
+import time
+
+import pytest
+
+from conftest import app
+from lib import events
+from lib.models import RMACaseEvent, db
+
+CASE = {'brand': 'ACME', 'model': 'B-1', 'problem': 'Broken', 'distribution_company_id': 1}
+
+
+class ManualBroadcaster(events.Broadcaster):
+    # Never polls the table, the tests publish the events themselves.
+    def subscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.add(subscriber)
+
+
+@pytest.fixture
+def settings(monkeypatch):
+    monkeypatch.setattr(events, '_broadcaster', ManualBroadcaster(app, 1, datetime.timedelta(hours=1)))
+    monkeypatch.setitem(events._settings, 'max_streams', 1)
+    monkeypatch.setitem(events._settings, 'poll_wait', 0.1)
+    return events._settings
+
+
+def _last_event_id():
+    return db.session.query(db.func.max(RMACaseEvent.id)).scalar() or 0
+
+
+def _poll(client, headers, **args):
+    response = client.get('/api/rma_cases/events', query_string=args, headers=headers)
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_streams_are_limited(client, headers, settings):
+    first = client.get('/api/rma_cases/stream', headers=headers, buffered=False)
+    assert first.status_code == 200
+
+    second = client.get('/api/rma_cases/stream', headers=headers, buffered=False)
+    assert second.status_code == 503
+    assert second.headers['Retry-After']
+    second.close()
+
+    first.close()
+    third = client.get('/api/rma_cases/stream', headers=headers, buffered=False)
+    assert third.status_code == 200
+    third.close()
+
+
+def test_a_poll_returns_the_events_after_the_given_one(client, headers, settings):
+    since = _last_event_id()
+    client.post('/api/rma_cases', json=CASE, headers=headers)
+    client.post('/api/rma_cases', json=dict(CASE, distribution_company_id=2), headers=headers)
+
+    body = _poll(client, headers, last_event_id=since)
+    assert [event['type'] for event in body['events']] == ['created', 'created']
+    assert body['last_event_id'] == since + 2
+
+    company = body['events'][1]['distribution_company']
+    body = _poll(client, headers, last_event_id=since, distribution_company=company)
+    assert [event['event_id'] for event in body['events']] == [since + 2]
+
+
+def test_a_poll_with_nothing_new_waits_and_keeps_the_cursor(client, headers, settings):
+    client.post('/api/rma_cases', json=CASE, headers=headers)
+    since = _last_event_id()
+
+    started = time.time()
+    assert _poll(client, headers, last_event_id=since) == {'reset': False, 'events': [], 'last_event_id': since}
+    assert time.time() - started >= settings['poll_wait']
+    # Without an id it starts from the latest event.
+    assert _poll(client, headers)['last_event_id'] == since
+
+
+def test_a_poll_returns_as_soon_as_an_event_is_published(client, headers, settings):
+    settings['poll_wait'] = 30
+    since = _last_event_id()
+    event = {'event_id': since + 1, 'id': 1, 'type': 'status', 'status': 'sent', 'distribution_company': 'ACME',
+             'distribution_company_id': 1, 'at': '2019-10-01T10:00:00'}
+
+    def publish():
+        # Once the poll is waiting.
+        while not events._broadcaster._subscribers:
+            time.sleep(0.01)
+        events._broadcaster.publish([event])
+
+    thread = threading.Thread(target=publish)
+    thread.start()
+    started = time.time()
+    assert _poll(client, headers, last_event_id=since) == {'reset': False, 'events': [event],
+                                                           'last_event_id': since + 1}
+    assert time.time() - started < 5
+    thread.join()
+
+
+def test_a_poll_does_not_wait_without_a_free_slot(client, headers, settings):
+    settings['poll_wait'] = 30
+    stream = client.get('/api/rma_cases/stream', headers=headers, buffered=False)
+    try:
+        started = time.time()
+        assert _poll(client, headers)['events'] == []
+        assert time.time() - started < 5
+    finally:
+        stream.close()
+
+
+def test_a_client_too_far_behind_reloads(client, headers, settings):
+    client.post('/api/rma_cases', json=CASE, headers=headers)
+    client.post('/api/rma_cases', json=CASE, headers=headers)
+    oldest = db.session.query(db.func.min(RMACaseEvent.id)).scalar()
+    RMACaseEvent.query.filter(RMACaseEvent.id == oldest).delete()
+    db.session.commit()
+
+    assert _poll(client, headers, last_event_id=oldest - 1) == {'reset': True, 'events': [], 'last_event_id': None}
+    response = client.get('/api/rma_cases/events?last_event_id=x', headers=headers)
+    assert response.status_code == 400
@@ -0,0 +1,72 @@
+# test_history.py
+import datetime
+
+from lib.models import DistributionCompany, RMACase, RMAStatusEvent, db
+
+CASE = {'brand': 'ACME', 'model': 'B-1', 'problem': 'Broken', 'distribution_company_id': 1}
+START = datetime.datetime(2019, 10, 1, 9, 0)
+
+
+def test_the_history_lists_the_transitions_in_order(client, headers):
+    client.post('/api/rma_cases', json=CASE, headers=headers)
+    case_id = db.session.query(db.func.max(RMACase.id)).scalar()
+
+    for status in ('to_be_sent', 'sent', 'resolved'):
+        response = client.put('/api/rma_cases/{}/status/{}'.format(case_id, status), headers=headers)
+        assert response.get_json()['message'] == 'RMA case modified successfully!'
+    # Not from resolved, so not in the history.
+    client.put('/api/rma_cases/{}/status/returned'.format(case_id), headers=headers)
+
+    history = client.get('/api/rma_cases/{}/history'.format(case_id), headers=headers).get_json()['history']
+    assert [event['status'] for event in history] == ['to_be_revised', 'to_be_sent', 'sent', 'resolved']
+    assert set(event['by'] for event in history) == {'Bench Admin'}
+
+    assert client.get('/api/rma_cases/{}/history'.format(case_id + 1), headers=headers).get_json() == {
+        'message': 'No RMA case found!'}
+
+
+def test_time_in_status_averages_the_finished_statuses(client, headers):
+    dist_company = DistributionCompany(name='TIMED')
+    db.session.add(dist_company)
+    db.session.flush()
+    first, second = RMACase(status='sent', distribution_company_id=dist_company.id), \
+        RMACase(status='to_be_sent', distribution_company_id=dist_company.id)
+    db.session.add_all([first, second])
+    db.session.flush()
+
+    # (case, status, hours after START), in the order they happened.
+    transitions = [(first, 'to_be_revised', 0), (second, 'to_be_revised', 1), (first, 'to_be_sent', 2),
+                   (second, 'to_be_sent', 5), (first, 'sent', 26)]
+    db.session.add_all([RMAStatusEvent(case_id=case.id, status=status, at=START + datetime.timedelta(hours=hours),
+                                       user_id=1, user_name='Bench Admin') for case, status, hours in transitions])
+    db.session.commit()
+
+    rows = client.get('/api/rma_cases/stats/time_in_status', headers=headers).get_json()['time_in_status']
+    assert [row for row in rows if row['distribution_company_id'] == dist_company.id] == [
+        # 2 and 4 hours.
+        {'distribution_company_id': dist_company.id, 'distribution_company': 'TIMED', 'status': 'to_be_revised',
+         'average_seconds': 3 * 3600.0, 'cases': 2},
+        # The status each case is in now does not count.
+        {'distribution_company_id': dist_company.id, 'distribution_company': 'TIMED', 'status': 'to_be_sent',
+         'average_seconds': 24 * 3600.0, 'cases': 1},
+    ]
+
+
+def test_returned_date_comes_from_the_status_dates(client, headers):
+    case_id = db.session.query(RMACase.id).filter(RMACase.status == 'sent').order_by(RMACase.id).first()[0]
+    url = '/api/rma_cases/{}'.format(case_id)
+    before = client.get(url, headers=headers).get_json()['rma_case']
+    assert (before['returned_date'], before['returned_by']) == (None, None)
+
+    client.put('/api/rma_cases/{}/status/returned'.format(case_id), headers=headers)
+    client.put('/api/rma_cases/{}/status/resolved'.format(case_id), headers=headers)
+
+    rma_case = client.get(url, headers=headers).get_json()['rma_case']
+    today = datetime.date.today().strftime('%d-%m-%Y')
+    assert rma_case['status'] == 'resolved'
+    assert rma_case['returned_date'].startswith(today) and rma_case['returned_by'] == 'Bench Admin'
+    assert rma_case['sent_date'] == before['sent_date']
+
+    response = client.get('/api/rma_cases?fields=id,returned_date&returned_date_from=' + today, headers=headers)
+    assert [(row['id'], row['returned_date']) for row in response.get_json()['rma_cases']] == [
+        (case_id, rma_case['returned_date'])]
@@ -0,0 +1,106 @@
+# test_instrumentation.py
+import re
+import time
+from collections import OrderedDict
+
+from lib import instrumentation
+from lib.instrumentation import SamplingProfiler
+
+SAMPLE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(.*)\})? (\S+)$')
+LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+SUFFIXES = ('_bucket', '_sum', '_count')
+
+
+def _parse_metrics(text):
+    # {family: {'type': type, 'samples': [(name, labels, value)]}}, checking
+    # the text exposition format on the way: every sample comes after its
+    # family's TYPE, and a family's samples are not split.
+    families = OrderedDict()
+    current = None
+    for line in text.splitlines():
+        if line.startswith('# HELP '):
+            continue
+        if line.startswith('# TYPE '):
+            _, _, family, metric_type = line.split(' ')
+            assert family not in families, family
+            families[family] = {'type': metric_type, 'samples': []}
+            current = family
+            continue
+
+        name, labels, value = SAMPLE.match(line).groups()
+        family = name
+        if families[current]['type'] == 'histogram' and name.endswith(SUFFIXES):
+            family = name[:name.rindex('_')]
+        assert family == current, line
+        families[family]['samples'].append((name, dict(LABEL.findall(labels or '')), float(value)))
+    return families
+
+
+def _histograms(family):
+    # {labels without le: ({le: count}, sum, count)}
+    series = {}
+    for name, labels, value in family['samples']:
+        key = tuple(sorted((label, value) for label, value in labels.items() if label != 'le'))
+        buckets, total, count = series.get(key, (OrderedDict(), None, None))
+        if name.endswith('_bucket'):
+            buckets[labels['le']] = value
+        elif name.endswith('_sum'):
+            total = value
+        else:
+            count = value
+        series[key] = (buckets, total, count)
+    return series
+
+
+def test_the_metrics_are_valid_prometheus_text(client, headers):
+    for _ in range(3):
+        assert client.get('/api/products', headers=headers).status_code == 200
+
+    response = client.get('/api/metrics', headers=headers)
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+    families = _parse_metrics(response.get_data(as_text=True))
+
+    latency = families['sukkiri_request_duration_seconds']
+    assert latency['type'] == 'histogram'
+    for labels, (buckets, total, count) in _histograms(latency).items():
+        counts = list(buckets.values())
+        assert counts == sorted(counts) and list(buckets)[-1] == '+Inf'
+        assert counts[-1] == count and total >= 0
+    products = dict(_histograms(latency))[(('method', 'GET'), ('route', '/api/products'), ('status', '200'))]
+    assert products[2] >= 3
+
+    assert families['sukkiri_sql_statements_total']['type'] == 'counter'
+    for family in ('sukkiri_db_pool_checkout_wait_seconds', 'sukkiri_db_pool_checkouts_total'):
+        assert set(labels['bind'] for _, labels, _ in families[family]['samples']) == {'primary'}
+
+
+def test_every_response_has_server_timing(client, headers):
+    response = client.get('/api/products', headers=headers)
+
+    entries = OrderedDict()
+    for entry in response.headers['Server-Timing'].split(', '):
+        name, *params = entry.split(';')
+        entries[name] = dict(param.split('=', 1) for param in params)
+
+    assert list(entries)[0] == 'db' and list(entries)[-1] == 'total'
+    assert re.match(r'^"\d+ queries"$', entries['db']['desc'])
+    assert 'json' in entries
+    durations = {name: float(params['dur']) for name, params in entries.items()}
+    assert all(duration >= 0 for duration in durations.values())
+    assert durations['total'] >= durations['db']
+
+
+def test_the_profiler_keeps_the_slowest_requests(client, headers, monkeypatch):
+    profiler = SamplingProfiler(interval=0.001, keep=2)
+    for seconds in (0.02, 0.06, 0.04):
+        profiler.start_request()
+        time.sleep(seconds)
+        profiler.finish_request('/api/test', 'GET', '/api/test?sleep={}'.format(seconds), seconds)
+
+    profiles = profiler.slowest()
+    assert [profile['path'] for profile in profiles] == ['/api/test?sleep=0.06', '/api/test?sleep=0.04']
+    assert all(profile['samples'] > 0 and profile['stacks'] for profile in profiles)
+
+    monkeypatch.setattr(instrumentation, '_profiler', profiler)
+    assert client.get('/api/metrics/profiles', headers=headers).get_json()['profiles'] == profiles
@@ -0,0 +1,48 @@
+# test_invoice.py
+from collections import namedtuple
+from io import BytesIO
+
+from reportlab.platypus import Table
+
+from lib import invoice
+from lib.invoice import HEADER_ROW, generate_large_invoice
+
+Case = namedtuple('Case', ['id', 'brand', 'model', 'problem', 'serial_number'])
+
+
+def _drawn_tables(monkeypatch, rows):
+    # (page, table) for every table drawn, in order.
+    drawn = []
+    document = invoice._document
+
+    def recording_document(output):
+        doc = document(output)
+        doc.afterFlowable = lambda flowable: drawn.append((doc.page, getattr(flowable, '_table', flowable)))
+        return doc
+
+    monkeypatch.setattr(invoice, '_document', recording_document)
+    pdf = generate_large_invoice(rows, 'ACME', BytesIO()).getvalue()
+    assert pdf.startswith(b'%PDF')
+    return [(page, table) for page, table in drawn
+            if isinstance(table, Table) and len(table._cellvalues[0]) == len(HEADER_ROW)]
+
+
+def test_the_header_row_is_only_at_the_top_of_each_page(monkeypatch):
+    # Problems of different lengths, so the chunks end anywhere on a page.
+    rows = [Case(index, 'BRAND', 'MODEL', 'Does not turn on ' * (index % 7), 'SN{}'.format(index))
+            for index in range(1, 351)]
+    tables = _drawn_tables(monkeypatch, rows)
+
+    pages = sorted(set(page for page, _ in tables))
+    assert len(pages) > 1
+    for page in pages:
+        on_page = [table for drawn_page, table in tables if drawn_page == page]
+        assert [table._cellvalues[0] == HEADER_ROW for table in on_page] == [True] + [False] * (len(on_page) - 1)
+
+    printed = [row[0] for _, table in tables for row in table._cellvalues if row != HEADER_ROW]
+    assert printed == list(range(1, 351))
+
+
+def test_an_empty_invoice_still_has_the_header(monkeypatch):
+    tables = _drawn_tables(monkeypatch, [])
+    assert [table._cellvalues for _, table in tables] == [[HEADER_ROW]]
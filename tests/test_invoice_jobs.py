@@ -0,0 +1,105 @@
+# test_invoice_jobs.py
+import threading
+from concurrent.futures import Future
+
+import pytest
+
+from conftest import app
+from lib import invoice_jobs
+from lib.invoice_cache import invoice_fingerprint
+from lib.invoice_jobs import finished_invoice_pdf, get_invoice_job, render_invoice, submit_invoice_job
+from lib.models import InvoiceJob, RMACase, db
+
+FINGERPRINT = 'f' * 40
+
+
+class QueuedExecutor(object):
+    # Keeps the renders instead of running them, the tests run them when
+    # they need to.
+    def __init__(self):
+        self.renders = []
+
+    def submit(self, fn, *args):
+        self.renders.append((fn, args))
+        return Future()
+
+
+@pytest.fixture
+def executor(monkeypatch):
+    executor = QueuedExecutor()
+    monkeypatch.setattr(invoice_jobs, '_get_executor', lambda: executor)
+    return executor
+
+
+@pytest.fixture
+def dist_company_id(admin_public_id):
+    return db.session.query(RMACase.distribution_company_id).filter(RMACase.status == 'to_be_revised').filter(
+        RMACase.distribution_company_id.isnot(None)).first()[0]
+
+
+def test_identical_contents_share_a_job(executor, dist_company_id):
+    job_id = submit_invoice_job(dist_company_id, 'ACME', FINGERPRINT, 1)
+
+    assert submit_invoice_job(dist_company_id, 'ACME', FINGERPRINT, 1) == job_id
+    assert submit_invoice_job(dist_company_id, 'ACME', 'e' * 40, 1) != job_id
+    assert len(executor.renders) == 2
+
+
+def test_concurrent_submissions_insert_a_single_job(executor, dist_company_id):
+    barrier = threading.Barrier(4)
+    job_ids = []
+
+    def submit():
+        with app.app_context():
+            barrier.wait()
+            job_ids.append(submit_invoice_job(dist_company_id, 'ACME', FINGERPRINT, 1))
+
+    threads = [threading.Thread(target=submit) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(set(job_ids)) == 1 and len(job_ids) == 4
+    assert InvoiceJob.query.count() == 1
+    assert len(executor.renders) == 1
+
+
+def test_a_failed_job_is_retried(executor, dist_company_id):
+    job_id = submit_invoice_job(dist_company_id, 'ACME', FINGERPRINT, 1)
+    with db.engine.connect() as connection:
+        invoice_jobs._finish(connection, job_id, status='failed')
+
+    assert submit_invoice_job(dist_company_id, 'ACME', FINGERPRINT, 1) != job_id
+    assert len(executor.renders) == 2
+
+
+def test_the_job_keeps_the_fingerprint_it_was_submitted_for(executor, dist_company_id):
+    job_id = submit_invoice_job(dist_company_id, 'ACME', FINGERPRINT, 1)
+    render, args = executor.renders[0]
+    render(*args)
+
+    job = get_invoice_job(job_id)
+    assert job['status'] == 'done'
+    assert job['fingerprint'] == FINGERPRINT
+    rows = db.session.query(*invoice_jobs.INVOICE_COLUMNS).filter(
+        *invoice_jobs.invoice_criteria(dist_company_id)).order_by(RMACase.id)
+    assert job['rendered_fingerprint'] == invoice_fingerprint('ACME', rows)
+    assert finished_invoice_pdf(dist_company_id, FINGERPRINT).pdf.startswith(b'%PDF')
+
+
+def test_a_lagging_replica_does_not_requeue_the_render(executor, replica, client, headers, dist_company_id,
+                                                       monkeypatch):
+    monkeypatch.setitem(app.config, 'INVOICE_ASYNC_ROWS', 1)
+    url = '/api/rma_cases/invoice/{}'.format(dist_company_id)
+
+    response = client.get(url, headers=headers)
+    assert response.status_code == 202
+    assert client.get(url, headers=headers).get_json()['job'] == response.get_json()['job']
+    assert len(executor.renders) == 1
+
+    render_invoice(*executor.renders[0][1])
+    response = client.get(url, headers=headers)
+    assert response.status_code == 200
+    assert response.mimetype == 'application/pdf'
+    assert len(executor.renders) == 1
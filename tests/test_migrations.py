@@ -0,0 +1,81 @@
+# test_migrations.py
+import os
+
+import flask_migrate
+import pytest
+import sqlalchemy as sa
+
+from conftest import app
+from lib.models import db
+
+MIGRATIONS = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'migrations')
+
+
+@pytest.fixture
+def empty_database():
+    # Nothing at all, not even alembic_version, before and after.
+    def drop_everything():
+        metadata = sa.MetaData()
+        metadata.reflect(bind=db.engine, only=lambda name, _: name != 'sqlite_sequence')
+        metadata.drop_all(bind=db.engine)
+
+    with app.app_context():
+        drop_everything()
+        yield db.engine
+        db.session.remove()
+        drop_everything()
+
+
+def _history(engine):
+    history = {}
+    for case_id, status, user_id in engine.execute(
+            'SELECT case_id, status, user_id FROM rma_status_events ORDER BY id'):
+        history.setdefault(case_id, []).append((status, user_id))
+    return history
+
+
+def test_status_events_from_baseline_rows(empty_database):
+    engine = empty_database
+    flask_migrate.upgrade(MIGRATIONS, revision='6ecfe9799e30')
+
+    engine.execute("INSERT INTO users (id, public_id, first_name, last_name) VALUES (1, 'a', 'Ana', 'Gomez')")
+    columns = ['id', 'status', 'to_be_revised_date', 'to_be_revised_by', 'to_be_sent_date', 'to_be_sent_by',
+               'sent_date', 'sent_by', 'returned_date', 'returned_by', 'resolved_date', 'resolved_by']
+    by = 'Ana Gomez'
+    rows = [
+        # As the original status endpoint wrote them: to_be_sent into
+        # sent_date, everything after it into returned_date.
+        (1, 'to_be_revised', '01-03-2019 10:00', by, None, None, None, None, None, None, None, None),
+        (2, 'to_be_sent', '01-03-2019 10:01', by, None, None, '02-03-2019 10:00', by, None, None, None, None),
+        (3, 'sent', '01-03-2019 10:02', by, None, None, '02-03-2019 10:01', by, '03-03-2019 10:00', by,
+         None, None),
+        (4, 'returned', '01-03-2019 10:03', by, None, None, '02-03-2019 10:02', by, '04-03-2019 10:00', by,
+         None, None),
+        (5, 'resolved', '01-03-2019 10:04', by, None, None, None, None, '05-03-2019 10:00', 'Gone User',
+         None, None),
+        # No dates at all.
+        (6, 'unresolved', None, None, None, None, None, None, None, None, None, None),
+        # As the batch transitions write them, every status in its own pair.
+        (7, 'resolved', '01-03-2019 10:05', by, '02-03-2019 10:03', by, '03-03-2019 10:01', by,
+         '04-03-2019 10:01', by, '05-03-2019 10:01', by),
+    ]
+    for row in rows:
+        engine.execute('INSERT INTO rma_cases ({}) VALUES ({})'.format(
+            ', '.join(columns), ', '.join('?' if engine.dialect.paramstyle == 'qmark' else '%s' for _ in row)),
+            row)
+
+    flask_migrate.upgrade(MIGRATIONS, revision='f3d063e5821b')
+
+    history = _history(engine)
+    assert history[1] == [('to_be_revised', 1)]
+    assert history[2] == [('to_be_revised', 1), ('to_be_sent', 1)]
+    assert history[3] == [('to_be_revised', 1), ('to_be_sent', 1), ('sent', 1)]
+    assert history[4] == [('to_be_revised', 1), ('to_be_sent', 1), ('returned', 1)]
+    assert history[5] == [('to_be_revised', 1), ('resolved', None)]
+    assert history[6] == [('unresolved', None)]
+    assert history[7] == [('to_be_revised', 1), ('to_be_sent', 1), ('sent', 1), ('returned', 1), ('resolved', 1)]
+
+    # Every case has an event for the status it is in.
+    statuses = dict(engine.execute('SELECT id, status FROM rma_cases').fetchall())
+    assert all(statuses[case_id] in [status for status, _ in events] for case_id, events in history.items())
+    assert set(history) == set(statuses)
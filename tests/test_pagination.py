@@ -0,0 +1,98 @@
+# test_pagination.py
+import datetime
+
+from lib.history import rebuild_status_dates
+from lib.models import RMACase, RMAStatusEvent, db
+from lib.pagination import DEFAULT_LIMIT, _decode_cursor, _encode_cursor
+
+
+def _walk(client, headers, url):
+    # Every id on every page, following next_cursor to the end.
+    ids = []
+    cursor = None
+    for _ in range(100):
+        response = client.get(url + ('&after=' + cursor if cursor else ''), headers=headers)
+        assert response.status_code == 200
+        body = response.get_json()
+        ids.extend(rma_case['id'] for rma_case in body['rma_cases'])
+        if body['next_cursor'] is None:
+            return ids
+        assert body['next_cursor'] != cursor
+        cursor = body['next_cursor']
+    raise AssertionError('The pages never end')
+
+
+def test_cursor_keeps_microseconds():
+    column = RMAStatusEvent.at
+    value = datetime.datetime(2019, 10, 1, 10, 0, 0, 123456)
+    assert _decode_cursor(_encode_cursor([value, 7]), [column, RMAStatusEvent.id]) == [value, 7]
+    # Cursors from before the microseconds still work.
+    assert _decode_cursor('2019-10-01T10:00:00,7', [column, RMAStatusEvent.id]) == [
+        datetime.datetime(2019, 10, 1, 10, 0), 7]
+
+
+def test_sub_second_dates_do_not_repeat_rows(database, client, headers):
+    start = datetime.datetime(2019, 10, 1, 10, 0, 0)
+    for index in range(12):
+        db.session.add(RMACase(id=100 + index, brand='SUBSECOND', model='M', problem='p', status='to_be_revised'))
+    db.session.flush()
+    for index in range(12):
+        db.session.add(RMAStatusEvent(case_id=100 + index, status='to_be_sent',
+                                      at=start + datetime.timedelta(microseconds=1000 * (index % 4)), user_name='A'))
+    db.session.flush()
+    rebuild_status_dates()
+    db.session.commit()
+
+    ids = _walk(client, headers, '/api/rma_cases?brand=SUBSECOND&sort=to_be_sent_date&fields=id&limit=5')
+    assert sorted(ids) == list(range(100, 112))
+    assert len(ids) == len(set(ids))
+
+
+def test_batch_transition_pages_end(database, client, headers):
+    # A batch transition stamps every case with the same time, to the
+    # microsecond, more of them than fit in a page.
+    ids = [rma_case.id for rma_case in RMACase.query.filter_by(status='to_be_revised').limit(8)]
+    response = client.put('/api/rma_cases/status/to_be_sent', json={'ids': ids}, headers=headers)
+    assert sorted(response.get_json()['updated']) == sorted(ids)
+
+    paged = _walk(client, headers, '/api/rma_cases?sort=to_be_sent_date&order=desc&fields=id&limit=3')
+    assert len(paged) == len(set(paged))
+    assert set(ids) <= set(paged)
+
+
+def test_date_ranges_include_the_last_fraction_of_a_second(database, client, headers):
+    times = [datetime.datetime(2019, 10, 1, 23, 59, 59, 500000), datetime.datetime(2019, 10, 2, 0, 0, 0),
+             datetime.datetime(2019, 10, 1, 10, 30, 59, 900000), datetime.datetime(2019, 10, 1, 10, 31, 0)]
+    for index, at in enumerate(times):
+        db.session.add(RMACase(id=200 + index, brand='BOUNDS', model='M', problem='p', status='sent'))
+        db.session.flush()
+        db.session.add(RMAStatusEvent(case_id=200 + index, status='sent', at=at, user_name='A'))
+    db.session.flush()
+    rebuild_status_dates()
+    db.session.commit()
+
+    def ids(query):
+        response = client.get('/api/rma_cases?brand=BOUNDS&fields=id&' + query, headers=headers)
+        assert response.status_code == 200
+        return sorted(rma_case['id'] for rma_case in response.get_json()['rma_cases'])
+
+    assert ids('sent_date_from=01-10-2019&sent_date_to=01-10-2019') == [200, 202, 203]
+    assert ids('sent_date_from=02-10-2019&sent_date_to=02-10-2019') == [201]
+    assert ids('sent_date_from=01-10-2019 10:30&sent_date_to=01-10-2019 10:30') == [202]
+
+
+def test_lists_without_limit_or_cursor_are_not_paginated(database, client, headers):
+    db.session.bulk_insert_mappings(RMACase, [{'brand': 'LEGACY', 'model': 'M', 'problem': 'p',
+                                               'status': 'to_be_revised'} for _ in range(DEFAULT_LIMIT + 5)])
+    db.session.commit()
+
+    body = client.get('/api/rma_cases?brand=LEGACY&fields=id', headers=headers).get_json()
+    assert len(body['rma_cases']) == DEFAULT_LIMIT + 5 and body['next_cursor'] is None
+
+    body = client.get('/api/rma_cases?brand=LEGACY&fields=id&limit={}'.format(DEFAULT_LIMIT),
+                      headers=headers).get_json()
+    assert len(body['rma_cases']) == DEFAULT_LIMIT and body['next_cursor'] is not None
+    assert len(_walk(client, headers, '/api/rma_cases?brand=LEGACY&fields=id&limit=40')) == DEFAULT_LIMIT + 5
+    # A cursor alone pages with the default limit.
+    body = client.get('/api/rma_cases?brand=LEGACY&fields=id&after=0', headers=headers).get_json()
+    assert len(body['rma_cases']) == DEFAULT_LIMIT
@@ -0,0 +1,107 @@
+# test_query_plans.py
+#
+# Query-plan regression checks for the hot endpoints. Each one calls the
+# endpoint through the test client and checks that the request issues the
+# expected number of SQL statements, and that their plans (EXPLAIN QUERY
+# PLAN on SQLite, EXPLAIN on MySQL) use the index the endpoint was built
+# around and never scan a whole table. Run them against MySQL with
+# SUKKIRI_TEST_DATABASE_URI.
+from collections import namedtuple
+
+import pytest
+from sqlalchemy import event
+
+from benchmarks.seed import make_token, seed
+from conftest import app, reset_database
+from lib.ean_cache import clear_ean_cache
+from lib.models import db
+
+# The primary key, whatever the dialect calls it.
+PRIMARY_KEY = {'sqlite': 'INTEGER PRIMARY KEY', 'mysql': 'PRIMARY'}
+
+# name, url, statements per (warm) request, main table, index its SELECTs
+# must use (None for the cached endpoints, which issue none), and whether
+# the EAN cache is emptied before the request. The token lookup is cached
+# after the warm-up call, so it does not count. Versioned endpoints add the
+# table_versions lookup behind their ETag.
+Check = namedtuple('Check', ['name', 'url', 'statements', 'table', 'index', 'cold'])
+CHECKS = [
+    Check('rma case by id', '/api/rma_cases/42', 1, 'rma_cases', PRIMARY_KEY, False),
+    Check('rma cases by status', '/api/rma_cases?status=sent&limit=50', 1, 'rma_cases', 'ix_rma_cases_status', False),
+    Check('rma cases sent last month', '/api/rma_cases?sort=sent_date&sent_date_from=01-03-2019&'
+          'sent_date_to=31-03-2019', 1, 'rma_status_dates', 'ix_rma_status_dates_status_at_case_id', False),
+    Check('rma cases by sent date', '/api/rma_cases?sort=sent_date&order=desc&limit=50', 1, 'rma_status_dates',
+          'ix_rma_status_dates_status_at_case_id', False),
+    Check('rma case history', '/api/rma_cases/42/history', 2, 'rma_status_events',
+          'ix_rma_status_events_case_id_status', False),
+    Check('invoice', '/api/rma_cases/invoice/3', 3, 'rma_cases', 'ix_rma_cases_distribution_company_id_status',
+          False),
+    Check('product by ean', '/api/products/ean/7790000000042', 2, 'products', 'ix_products_ean', True),
+    Check('product by ean (cached)', '/api/products/ean/7790000000042', 2, 'products', PRIMARY_KEY, False),
+    Check('product by id', '/api/products/42', 2, 'products', PRIMARY_KEY, False),
+    Check('product count (cached)', '/api/products/count', 0, 'products', None, False),
+    Check('rma stats (cached)', '/api/rma_cases/stats', 0, 'rma_case_counts', None, False),
+]
+
+
+@pytest.fixture(scope='module')
+def headers():
+    # Enough rows for the planner to prefer the indexes, seeded once for
+    # the whole module.
+    with app.app_context():
+        reset_database()
+        public_id = seed(users=5, dist_companies=20, products=2000, rma_cases=5000)
+        if db.engine.dialect.name == 'sqlite':
+            db.session.execute('ANALYZE')
+        else:
+            for table in ('rma_cases', 'rma_status_events', 'rma_status_dates', 'products', 'users', 'dist_companies'):
+                db.session.execute('ANALYZE TABLE ' + table)
+        db.session.commit()
+        db.session.remove()
+    return {'x-access-token': make_token(app, public_id)}
+
+
+def _explain(connection, statement, parameters):
+    # The steps of the plan, as (description, whether it reads every row).
+    if connection.dialect.name == 'sqlite':
+        rows = connection.execute('EXPLAIN QUERY PLAN ' + statement, parameters)
+        return [(row[-1], row[-1].startswith('SCAN ') and 'INDEX' not in row[-1]) for row in rows]
+
+    rows = connection.execute('EXPLAIN ' + statement, parameters)
+    return [('{}:{}'.format(row['table'], row['key']), row['type'] == 'ALL') for row in rows]
+
+
+@pytest.mark.parametrize('check', CHECKS, ids=[check.name for check in CHECKS])
+def test_query_plan(check, headers):
+    client = app.test_client()
+    with app.app_context():
+        engine = db.engine
+
+    client.get(check.url, headers=headers)
+    if check.cold:
+        clear_ean_cache()
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    event.listen(engine, 'before_cursor_execute', record)
+    try:
+        response = client.get(check.url, headers=headers)
+    finally:
+        event.remove(engine, 'before_cursor_execute', record)
+
+    assert response.status_code == 200
+    assert len(statements) == check.statements
+
+    index = check.index.get(engine.dialect.name) if isinstance(check.index, dict) else check.index
+    selects = [(statement, parameters) for statement, parameters in statements
+               if statement.lstrip().upper().startswith('SELECT') and check.table in statement]
+    assert bool(selects) == (index is not None)
+    with engine.connect() as connection:
+        for statement, parameters in selects:
+            plan = _explain(connection, statement, parameters)
+            steps = ' | '.join(step for step, _ in plan)
+            assert index in steps, steps
+            assert not any(full_scan for _, full_scan in plan), steps
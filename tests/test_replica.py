@@ -0,0 +1,39 @@
+# test_replica.py
+from conftest import app
+from lib.models import Product
+from lib.replica import WROTE_AT_COOKIE, WROTE_AT_HEADER
+
+
+def _product_ids(client, headers):
+    response = client.get('/api/products?fields=id&limit=1000', headers=headers)
+    assert response.status_code == 200
+    return [product['id'] for product in response.get_json()['products']]
+
+
+def test_reads_go_to_the_replica(replica, client, headers):
+    assert Product.query.count() > 0
+    assert _product_ids(client, headers) == []
+
+
+def test_the_writer_reads_its_writes(replica, client, headers):
+    response = client.post('/api/products', json={'brand': 'ACME', 'model': 'RYW-1', 'description': 'd',
+                                                  'stock': 1, 'stock_under_control': False, 'ean': '7790000099999'},
+                           headers=headers)
+    assert response.status_code == 200
+    wrote_at = response.headers[WROTE_AT_HEADER]
+    product_id = Product.query.filter_by(model='RYW-1').one().id
+
+    # The client that wrote carries the marker in its cookie, any process
+    # serving its next request sends it to the primary.
+    assert product_id in _product_ids(client, headers)
+
+    # Another client has no marker and reads the replica.
+    assert _product_ids(app.test_client(), headers) == []
+
+    # Clients without cookies send the header back instead.
+    assert product_id in _product_ids(app.test_client(), dict(headers, **{WROTE_AT_HEADER: wrote_at}))
+
+
+def test_the_marker_expires(replica, client, headers):
+    client.set_cookie('localhost', WROTE_AT_COOKIE, '1000.000')
+    assert _product_ids(client, headers) == []
@@ -0,0 +1,59 @@
+# test_search.py
+import pytest
+
+from lib import search
+from lib.models import Product, db
+
+PRODUCTS = [('HP', 'LASERJET 1020', 'Printer'), ('ACME', 'HPX-2', 'Laser Printer'), ('ACME', 'P-3', 'Hp Printer'),
+            ('LEXMARK', 'E120', 'Laser printer')]
+
+
+@pytest.fixture
+def product_ids(admin_public_id):
+    products = [Product(brand=brand, model=model, description=description, stock=0, stock_under_control=False)
+                for brand, model, description in PRODUCTS]
+    db.session.add_all(products)
+    db.session.commit()
+    # Loaded again from this test's database.
+    search.product_index.invalidate()
+    return [product.id for product in products]
+
+
+def _search(client, headers, query):
+    response = client.get('/api/products/search?q={}'.format(query), headers=headers)
+    assert response.status_code == 200
+    return [(product['id'], product['score']) for product in response.get_json()['products']]
+
+
+def test_brand_and_model_matches_rank_first(client, headers, product_ids):
+    hp, hpx, acme_hp, lexmark = product_ids
+
+    # An exact brand token, then a model prefix, then a description token.
+    assert _search(client, headers, 'hp') == [(hp, 3.0), (hpx, 1.5), (acme_hp, 1.0)]
+    # Every term has to match.
+    assert [product_id for product_id, _ in _search(client, headers, 'laser printer')] == [hp, hpx, lexmark]
+    assert _search(client, headers, 'laser canon') == []
+
+
+def test_the_index_follows_writes(client, headers, product_ids):
+    hp, hpx, acme_hp, lexmark = product_ids
+    _search(client, headers, 'hp')
+
+    assert client.delete('/api/products/{}'.format(hp), headers=headers).status_code == 200
+    data = {'brand': 'LEXMARK', 'model': 'HP-COMPATIBLE', 'description': 'Toner', 'stock': 0,
+            'stock_under_control': False, 'ean': None}
+    assert client.put('/api/products/{}'.format(lexmark), json=data, headers=headers).status_code == 200
+
+    assert [product_id for product_id, _ in _search(client, headers, 'hp')] == [lexmark, hpx, acme_hp]
+
+
+def test_short_terms_fall_back_to_like(product_ids):
+    # Terms under innodb_ft_min_token_size are matched with LIKE at the start
+    # of a word, which any dialect runs, and ranked like prefix matches.
+    hp, hpx, acme_hp, lexmark = product_ids
+
+    rows = search._mysql_query(['hp'], 4, 10).all()
+    assert [(product_id, float(score)) for product_id, score in rows] == [(hp, 1.5), (hpx, 1.5), (acme_hp, 0.5)]
+    rows = search._mysql_query(['hp', 'la'], 4, 10).all()
+    assert [product_id for product_id, _ in rows] == [hp, hpx]
+    assert search._mysql_query(['50%'], 4, 10).all() == []
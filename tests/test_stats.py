@@ -0,0 +1,59 @@
+# test_stats.py
+from sqlalchemy import func
+
+from conftest import app
+from lib.models import RMACase, RMACaseCount, db
+
+
+def _counters():
+    db.session.expire_all()
+    return {(dist_company_id, status): count for dist_company_id, status, count in db.session.query(
+        RMACaseCount.distribution_company_id, RMACaseCount.status, RMACaseCount.count).filter(
+        RMACaseCount.count != 0)}
+
+
+def _grouped():
+    return {(dist_company_id, status): count for dist_company_id, status, count in db.session.query(
+        func.coalesce(RMACase.distribution_company_id, 0), RMACase.status, func.count(RMACase.id)).group_by(
+        RMACase.distribution_company_id, RMACase.status)}
+
+
+def _case_ids(status, count):
+    return [case_id for case_id, in db.session.query(RMACase.id).filter(RMACase.status == status).order_by(
+        RMACase.id).limit(count)]
+
+
+def test_the_counters_follow_every_write(client, headers):
+    assert _counters() == _grouped()
+
+    for data in ({'brand': 'ACME', 'model': 'B-1', 'problem': 'Broken', 'distribution_company_id': 2},
+                 {'brand': 'ACME', 'model': 'B-2', 'problem': 'Broken', 'distribution_company': 'N/A'}):
+        response = client.post('/api/rma_cases', json=data, headers=headers)
+        assert response.get_json()['message'] == 'New RMA case created!'
+    assert _counters() == _grouped()
+
+    case_id, = _case_ids('to_be_revised', 1)
+    client.put('/api/rma_cases/{}/status/to_be_sent'.format(case_id), headers=headers)
+    assert _counters() == _grouped()
+
+    case_ids = _case_ids('to_be_sent', 3) + _case_ids('resolved', 1)
+    response = client.put('/api/rma_cases/status/sent', json={'ids': case_ids}, headers=headers)
+    assert len(response.get_json()['updated']) == 3
+    assert _counters() == _grouped()
+
+    stats = client.get('/api/rma_cases/stats', headers=headers).get_json()
+    assert stats['total'] == RMACase.query.count()
+    assert stats['by_status']['sent'] == RMACase.query.filter(RMACase.status == 'sent').count()
+
+
+def test_the_cli_command_repairs_drifted_counters(client, headers):
+    db.session.query(RMACaseCount).filter(RMACaseCount.status == 'sent').update(
+        {RMACaseCount.count: RMACaseCount.count + 7}, synchronize_session=False)
+    db.session.execute(RMACaseCount.__table__.insert().values(distribution_company_id=0, status='lost', count=3))
+    db.session.commit()
+    assert _counters() != _grouped()
+
+    result = app.test_cli_runner().invoke(args=['rebuild-rma-stats'])
+    assert result.exit_code == 0, result.output
+    assert 'Rebuilt' in result.output
+    assert _counters() == _grouped()
@@ -0,0 +1,42 @@
+# test_status.py
+from lib.models import RMACase, RMAStatusEvent, db
+from lib.status import MAX_TRANSITIONS
+
+
+def _case_id(status):
+    return db.session.query(RMACase.id).filter(RMACase.status == status).order_by(RMACase.id).first()[0]
+
+
+def _status(case_id):
+    db.session.expire_all()
+    return db.session.query(RMACase.status).filter(RMACase.id == case_id).scalar()
+
+
+def test_a_batch_transition_reports_why_each_case_was_skipped(client, headers):
+    to_be_sent, sent = _case_id('to_be_sent'), _case_id('sent')
+    to_be_revised = _case_id('to_be_revised')
+    missing = db.session.query(db.func.max(RMACase.id)).scalar() + 1
+    events = RMAStatusEvent.query.count()
+
+    response = client.put('/api/rma_cases/status/sent', json={'ids': [missing, sent, to_be_revised, to_be_sent]},
+                          headers=headers)
+    assert response.status_code == 200
+
+    body = response.get_json()
+    assert body['updated'] == [to_be_sent]
+    assert sorted(body['skipped'], key=lambda skip: skip['id']) == sorted([
+        {'id': missing, 'reason': 'not_found'},
+        {'id': sent, 'reason': 'already_in_status', 'status': 'sent'},
+        {'id': to_be_revised, 'reason': 'invalid_transition', 'status': 'to_be_revised'},
+    ], key=lambda skip: skip['id'])
+    assert (_status(to_be_sent), _status(sent), _status(to_be_revised)) == ('sent', 'sent', 'to_be_revised')
+    assert RMAStatusEvent.query.count() == events + 1
+
+
+def test_a_batch_transition_is_limited(client, headers):
+    resolved = RMACase.query.filter(RMACase.status == 'resolved').count()
+
+    response = client.put('/api/rma_cases/status/resolved', json={'ids': list(range(1, MAX_TRANSITIONS + 2))},
+                          headers=headers)
+    assert response.status_code == 400
+    assert RMACase.query.filter(RMACase.status == 'resolved').count() == resolved
@@ -0,0 +1,67 @@
+# test_stock.py
+import threading
+
+from conftest import app
+from lib.models import Product, db
+from lib.versions import get_versions
+
+
+def _product(stock, stock_under_control):
+    product = Product(brand='ACME', model='STOCK-{}-{}'.format(stock, stock_under_control), description='d',
+                      stock=stock, stock_under_control=stock_under_control, ean=None)
+    db.session.add(product)
+    db.session.commit()
+    return product.id
+
+
+def _stock(product_id):
+    db.session.expire_all()
+    return db.session.query(Product.stock).filter(Product.id == product_id).scalar()
+
+
+def test_concurrent_adjustments_both_apply(client, headers):
+    product_id = _product(10, True)
+    barrier = threading.Barrier(2)
+    statuses = []
+
+    def adjust(delta):
+        barrier.wait()
+        response = app.test_client().post('/api/products/{}/stock'.format(product_id), json={'delta': delta},
+                                          headers=headers)
+        statuses.append(response.status_code)
+
+    threads = [threading.Thread(target=adjust, args=(delta,)) for delta in (-3, 5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert statuses == [200, 200]
+    assert _stock(product_id) == 12
+
+
+def test_stock_under_control_never_goes_negative(client, headers):
+    product_id = _product(1, True)
+
+    response = client.post('/api/products/{}/stock'.format(product_id), json={'delta': -2}, headers=headers)
+    assert response.status_code == 409
+    assert _stock(product_id) == 1
+
+    uncontrolled_id = _product(1, False)
+    response = client.post('/api/products/{}/stock'.format(uncontrolled_id), json={'delta': -2}, headers=headers)
+    assert response.get_json()['stock'] == -1
+
+
+def test_a_batch_that_applies_nothing_keeps_the_revision(client, headers):
+    product_id = _product(0, True)
+    revision = get_versions('products')[0]
+    etag = client.get('/api/products?limit=10', headers=headers).headers['ETag']
+
+    response = client.post('/api/products/stock', json={'adjustments': [{'id': product_id, 'delta': -1},
+                                                                        {'id': 999999, 'delta': 1}]},
+                           headers=headers)
+    assert [skip['reason'] for skip in response.get_json()['skipped']] == ['insufficient_stock', 'not_found']
+
+    db.session.expire_all()
+    assert get_versions('products')[0] == revision
+    assert client.get('/api/products?limit=10', headers=headers).headers['ETag'] == etag
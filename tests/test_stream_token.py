@@ -0,0 +1,39 @@
+# test_stream_token.py
+import datetime
+
+import jwt
+
+from conftest import app
+
+
+def _open_stream(client, url, headers=None):
+    # Only the status: the body would stream until SUKKIRI_EVENTS_MAX_SECONDS.
+    response = client.get(url, headers=headers, buffered=False)
+    response.close()
+    return response.status_code
+
+
+def test_the_stream_takes_only_stream_tokens_from_the_query_string(client, headers):
+    assert _open_stream(client, '/api/rma_cases/stream?token=' + headers['x-access-token']) == 401
+
+    response = client.post('/api/rma_cases/stream/token', headers=headers)
+    assert response.status_code == 200
+    stream_token = response.get_json()['token']
+    assert _open_stream(client, '/api/rma_cases/stream?token=' + stream_token) == 200
+    assert _open_stream(client, '/api/rma_cases/stream', headers=headers) == 200
+
+
+def test_stream_tokens_open_nothing_else(client, headers):
+    stream_token = client.post('/api/rma_cases/stream/token', headers=headers).get_json()['token']
+
+    assert client.get('/api/products', headers={'x-access-token': stream_token}).status_code == 401
+    assert client.post('/api/rma_cases/stream/token', headers={'x-access-token': stream_token}).status_code == 401
+
+
+def test_stream_tokens_expire(client, headers):
+    public_id = jwt.decode(headers['x-access-token'], app.config['SECRET_KEY'])['public_id']
+    expired = jwt.encode({'public_id': public_id, 'scope': 'stream',
+                          'exp': datetime.datetime.utcnow() - datetime.timedelta(seconds=1)},
+                         app.config['SECRET_KEY']).decode('UTF-8')
+
+    assert _open_stream(client, '/api/rma_cases/stream?token=' + expired) == 401
@@ -0,0 +1,76 @@
+# test_sync.py
+from lib.models import DistributionCompany, Product
+
+COMPANY = {'name': 'SYNCED', 'email': 'sync@example.com', 'address': 'Street', 'hours': '9 to 18',
+           'contact_name': 'Contact', 'phone': '555'}
+
+
+def _sync(client, headers, table, since, limit):
+    # Every page from since on, as the client would fetch them.
+    pages = []
+    while True:
+        response = client.get('/api/{}/changes?since={}&limit={}'.format(table, since, limit), headers=headers)
+        assert response.status_code == 200
+        page = response.get_json()
+        pages.append(page)
+        assert page['revision'] >= since
+        since = page['revision']
+        if not page['more']:
+            return pages
+
+
+def _modify_product(client, headers, product):
+    data = {'brand': product.brand, 'model': product.model, 'description': 'Synced', 'stock': product.stock,
+            'stock_under_control': product.stock_under_control, 'ean': product.ean}
+    assert client.put('/api/products/{}'.format(product.id), json=data, headers=headers).status_code == 200
+
+
+def test_paging_resumes_after_the_last_revision(client, headers):
+    pages = _sync(client, headers, 'products', 0, 7)
+    # The seeded products share a revision, which is never split.
+    assert len(pages) == 1
+    assert len(pages[0]['products']) == Product.query.count()
+    since = pages[0]['revision']
+
+    products = Product.query.order_by(Product.id).limit(5).all()
+    for product in products:
+        _modify_product(client, headers, product)
+
+    pages = _sync(client, headers, 'products', since, 2)
+    assert [len(page['products']) for page in pages] == [2, 2, 1]
+    revisions = [product['revision'] for page in pages for product in page['products']]
+    assert revisions == list(range(since + 1, since + 6))
+    assert [product['id'] for page in pages for product in page['products']] == [product.id for product in products]
+    assert _sync(client, headers, 'products', pages[-1]['revision'], 2) == [
+        {'products': [], 'deleted': [], 'revision': pages[-1]['revision'], 'more': False}]
+
+
+def test_a_deleted_product_leaves_a_single_tombstone(client, headers):
+    since = _sync(client, headers, 'products', 0, 100)[-1]['revision']
+    deleted, modified = Product.query.order_by(Product.id).limit(2).all()
+    deleted_id = deleted.id
+
+    assert client.delete('/api/products/{}'.format(deleted_id), headers=headers).status_code == 200
+    _modify_product(client, headers, modified)
+
+    pages = _sync(client, headers, 'products', since, 1)
+    assert [tombstone for page in pages for tombstone in page['deleted']] == [
+        {'id': deleted_id, 'revision': since + 1}]
+    assert [product['id'] for page in pages for product in page['products']] == [modified.id]
+
+    pages = _sync(client, headers, 'products', pages[-1]['revision'], 1)
+    assert pages[0]['deleted'] == [] and pages[0]['products'] == []
+
+
+def test_a_deleted_dist_company_leaves_a_single_tombstone(client, headers):
+    since = _sync(client, headers, 'dist_companies', 0, 100)[-1]['revision']
+    assert client.post('/api/dist_companies', json=COMPANY, headers=headers).status_code == 200
+    dist_company_id = DistributionCompany.query.filter_by(name='SYNCED').one().id
+
+    pages = _sync(client, headers, 'dist_companies', since, 1)
+    assert [company['id'] for page in pages for company in page['dist_companies']] == [dist_company_id]
+
+    assert client.delete('/api/dist_companies/{}'.format(dist_company_id), headers=headers).status_code == 200
+    pages = _sync(client, headers, 'dist_companies', since, 1)
+    assert [page['dist_companies'] for page in pages] == [[]]
+    assert pages[0]['deleted'] == [{'id': dist_company_id, 'revision': since + 2}]
@@ -0,0 +1,25 @@
+# test_users.py
+from benchmarks.seed import make_token
+from conftest import app
+from lib.models import User, db
+
+
+def _user_headers():
+    public_id = db.session.query(User.public_id).filter(User.role == 'user').first()[0]
+    return public_id, {'x-access-token': make_token(app, public_id)}
+
+
+def test_a_deleted_user_is_refused_right_away(client, headers):
+    public_id, user_headers = _user_headers()
+    assert client.get('/api/products?limit=1', headers=user_headers).status_code == 200
+
+    assert client.delete('/api/users/' + public_id, headers=headers).status_code == 200
+    assert client.get('/api/products?limit=1', headers=user_headers).status_code == 401
+
+
+def test_a_role_change_applies_right_away(client, headers):
+    public_id, user_headers = _user_headers()
+    assert client.get('/api/users', headers=user_headers).get_json() == {'message': 'Invalid permissions'}
+
+    assert client.put('/api/users/' + public_id, json={'role': 'admin'}, headers=headers).status_code == 200
+    assert 'users' in client.get('/api/users', headers=user_headers).get_json()